@@ -1,14 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse
-from typing import Dict, List, Any
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from typing import Dict, List, Any, Optional
+import asyncio
 import time
+from sqlalchemy import text
+from app.core.config import settings
+from app.services.metrics_registry import CONTENT_TYPE_LATEST
 from app.services.monitoring_service import monitoring_service
+from app.services.profiler import ProfilerBusyError, profiler
+from app.services.tracing import ring_exporter, tracer
 from app.services.cache_service import cache_service
-from app.core.database import check_db_connection
-from app.core.security import get_current_user
-from app.models.user import User
+from app.services.job_queue import job_queue
 
 router = APIRouter()
+# Rotas que exigem autenticação: main.py inclui este router com Depends(get_current_user)
+protected_router = APIRouter()
+
+async def check_db_connection() -> bool:
+    """SELECT 1 no engine assíncrono da aplicação (o mesmo da fila de jobs)"""
+    try:
+        async with job_queue.engine.connect() as conn:
+            await asyncio.wait_for(conn.execute(text("SELECT 1")), timeout=5)
+        return True
+    except Exception:
+        return False
 
 @router.get("/health")
 async def health_check():
@@ -19,7 +34,7 @@ async def health_check():
         "status": "healthy",
         "timestamp": time.time(),
         "services": {
-            "database": check_db_connection(),
+            "database": await check_db_connection(),
             "cache": cache_service.is_available(),
             "monitoring": True
         }
@@ -44,7 +59,7 @@ async def detailed_health_check():
     
     # Adiciona informações dos serviços
     system_health["services"] = {
-        "database": check_db_connection(),
+        "database": await check_db_connection(),
         "cache": cache_service.is_available(),
         "monitoring": True
     }
@@ -68,32 +83,15 @@ async def detailed_health_check():
 @router.get("/metrics")
 async def get_metrics():
     """
-    Obtém métricas do sistema
+    Exposição das métricas no formato texto do Prometheus
     """
-    metrics = {}
-    
-    # Métricas do sistema
-    for metric_name in [
-        'system.cpu_usage',
-        'system.memory_usage',
-        'system.disk_usage',
-        'system.memory_available',
-        'system.disk_available',
-        'api.response_time_avg',
-        'api.error_rate'
-    ]:
-        latest = monitoring_service.get_latest_metric(metric_name)
-        if latest:
-            metrics[metric_name] = {
-                "value": latest.value,
-                "timestamp": latest.timestamp.isoformat(),
-                "labels": latest.labels
-            }
+    if not settings.PROMETHEUS_ENABLED:
+        raise HTTPException(status_code=404, detail="Métricas Prometheus desabilitadas")
     
-    return {
-        "metrics": metrics,
-        "timestamp": time.time()
-    }
+    return Response(
+        content=monitoring_service.render_prometheus(),
+        media_type=CONTENT_TYPE_LATEST
+    )
 
 @router.get("/metrics/{metric_name}")
 async def get_metric_history(metric_name: str, minutes: int = 60):
@@ -115,6 +113,18 @@ async def get_metric_history(metric_name: str, minutes: int = 60):
         "count": len(metrics)
     }
 
+@router.get("/metrics/{metric_name}/history")
+async def get_metric_rollup_history(metric_name: str, minutes: int = 1440, resolution: int = None):
+    """
+    Histórico agregado de uma métrica (min/max/avg por bucket), persistido em disco
+
+    A resolução (10, 60 ou 3600 segundos) é escolhida pelo período se omitida.
+    """
+    try:
+        return monitoring_service.get_metric_history(metric_name, minutes, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/performance")
 async def get_performance_summary():
     """
@@ -122,6 +132,79 @@ async def get_performance_summary():
     """
     return monitoring_service.get_performance_summary()
 
+@router.get("/runtime")
+async def get_runtime_metrics():
+    """
+    Métricas do runtime do processo (memória, GC, event loop) e custo do coletor
+    """
+    return monitoring_service.collector.snapshot()
+
+@protected_router.get("/loop-stalls")
+async def get_loop_stalls(limit: int = 20):
+    """
+    Bloqueios do event loop agregados por ponto de chamada (pilhas com caminhos
+    de arquivo; requer autenticação)
+    """
+    return monitoring_service.loop_monitor.report(limit=limit)
+
+@protected_router.delete("/loop-stalls")
+async def reset_loop_stalls(limit: int = 20):
+    """
+    Zera os bloqueios agregados, devolvendo o relatório anterior (requer autenticação)
+    """
+    report = monitoring_service.loop_monitor.report(limit=limit)
+    monitoring_service.loop_monitor.reset()
+    return report
+
+@protected_router.get("/profile")
+async def profile_process(
+    seconds: float = 10,
+    hz: int = None,
+    top: int = 20,
+    format: str = "json",
+    include_idle: bool = False
+):
+    """
+    Profile estatístico do processo por N segundos (requer autenticação)
+
+    `format=collapsed` retorna só as pilhas em texto, prontas para flamegraph.
+    """
+    if seconds <= 0 or seconds > profiler.max_seconds:
+        raise HTTPException(status_code=400, detail=f"seconds deve estar entre 0 e {profiler.max_seconds}")
+    try:
+        result = await asyncio.to_thread(profiler.profile, seconds, hz, include_idle)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "collapsed":
+        return PlainTextResponse(result.collapsed())
+    return {
+        **result.summary(),
+        "top": result.top(top),
+        "collapsed": result.collapsed()
+    }
+
+@protected_router.get("/traces")
+async def get_traces(limit: int = 50, min_duration_ms: float = 0.0):
+    """
+    Traces amostrados mais recentes (buffer em memória; requer autenticação)
+    """
+    return {
+        "sample_rate": tracer.sample_rate,
+        "enabled": tracer.enabled,
+        "traces": ring_exporter.traces(limit=limit, min_duration_ms=min_duration_ms)
+    }
+
+@protected_router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """
+    Spans de um trace, em ordem de início (atributos incluem SQL e IDs; requer autenticação)
+    """
+    spans = ring_exporter.get(trace_id)
+    if spans is None:
+        raise HTTPException(status_code=404, detail="Trace não encontrado")
+    return {"trace_id": trace_id, "spans": spans}
+
 @router.get("/alerts")
 async def get_alerts(active_only: bool = True):
     """
@@ -140,15 +223,40 @@ async def get_alerts(active_only: bool = True):
                 "message": alert.message,
                 "timestamp": alert.timestamp.isoformat(),
                 "resolved": alert.resolved,
-                "metadata": alert.metadata
+                "metadata": alert.metadata,
+                "fingerprint": alert.fingerprint,
+                "labels": alert.labels
             }
             for alert in alerts
         ],
         "count": len(alerts)
     }
 
-@router.post("/alerts/{alert_id}/resolve")
-async def resolve_alert(alert_id: str, current_user: User = Depends(get_current_user)):
+@router.get("/alerts/rules")
+async def get_alert_rules():
+    """
+    Lista as regras de alerta carregadas e as séries gravadas
+    """
+    engine = monitoring_service.rule_engine
+    return {
+        "rules": [
+            {
+                "name": rule.name,
+                "type": "record" if rule.record else "alert",
+                "expr": rule.expr,
+                "for_seconds": rule.for_seconds,
+                "labels": rule.labels
+            }
+            for rule in engine.rules
+        ],
+        "recorded": [
+            {"name": name, "labels": labels, "value": value}
+            for name, labels, value in engine.recorded
+        ]
+    }
+
+@protected_router.post("/alerts/{alert_id}/resolve")
+async def resolve_alert(alert_id: str):
     """
     Marca um alerta como resolvido
     """
@@ -162,34 +270,29 @@ async def get_cache_status():
     """
     return {
         "available": cache_service.is_available(),
-        "redis_url": "configured" if cache_service.redis_client else "not configured"
+        "redis_url": "configured" if cache_service.redis_client else "not configured",
+        **cache_service.stats()
     }
 
-@router.post("/cache/clear")
-async def clear_cache(current_user: User = Depends(get_current_user)):
+@protected_router.post("/cache/clear")
+async def clear_cache(
+    tags: Optional[List[str]] = Query(None, description="Tags a invalidar (ex.: project:42); vazio = tudo")
+):
     """
-    Limpa todo o cache (requer autenticação)
+    Limpa o cache inteiro ou só as entradas das tags informadas (requer autenticação)
     """
     if not cache_service.is_available():
         raise HTTPException(status_code=503, detail="Cache não disponível")
     
-    # Limpa todos os padrões conhecidos
-    patterns = [
-        "project:*",
-        "user:*",
-        "projects:list:*",
-        "users:list:*",
-        "dashboard:*"
-    ]
-    
-    cleared_count = 0
-    for pattern in patterns:
-        if cache_service.delete_pattern(pattern):
-            cleared_count += 1
+    # Sem SCAN: incrementa a geração e as entradas antigas expiram pelo TTL
+    if tags:
+        generations = await cache_service.invalidate_tags(*tags)
+    else:
+        generations = {"*": await cache_service.invalidate_all()}
     
     return {
         "message": "Cache limpo",
-        "patterns_cleared": cleared_count
+        "tags_invalidated": generations
     }
 
 @router.get("/system/info")
@@ -208,19 +311,3 @@ async def get_system_info():
         "disk_total": psutil.disk_usage('/').total / (1024**3),  # GB
         "uptime": time.time() - psutil.boot_time()
     }
-
-# Middleware para registrar tempo de resposta
-@router.middleware("http")
-async def add_monitoring_middleware(request: Request, call_next):
-    start_time = time.time()
-    
-    response = await call_next(request)
-    
-    duration = time.time() - start_time
-    monitoring_service.record_request_time(
-        endpoint=str(request.url.path),
-        method=request.method,
-        duration=duration
-    )
-    
-    return response 
\ No newline at end of file
@@ -9,12 +9,13 @@ from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
+from app.core.responses import FastJSONResponse
 from app.core.security import get_current_user
 from app.models.user import User
 from app.models.task import Task
 from app.services.task_service import TaskService
 
-router = APIRouter(prefix="/projects/{project_id}/tasks", tags=["Tasks"])
+router = APIRouter(prefix="/projects/{project_id}/tasks", tags=["Tasks"], default_response_class=FastJSONResponse)
 
 class TaskBase(BaseModel):
     title: str = Field(..., min_length=3, max_length=255)
@@ -1,8 +1,9 @@
 from fastapi import APIRouter
 
+from app.core.responses import FastJSONResponse
 from app.api.v1.endpoints import auth, conversations, projects, documents, quality_gates, deployments, dashboards
 
-api_router = APIRouter()
+api_router = APIRouter(default_response_class=FastJSONResponse)
 
 # Incluir endpoints
 api_router.include_router(auth.router, prefix="/auth", tags=["Authentication"])
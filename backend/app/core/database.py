@@ -5,6 +5,7 @@ from sqlalchemy.pool import StaticPool
 import structlog
 
 from app.core.config import settings
+from app.services.tracing import instrument_sqlalchemy
 
 logger = structlog.get_logger()
 
@@ -15,6 +16,7 @@ engine = create_engine(
     pool_pre_ping=True,
     echo=settings.DEBUG
 )
+instrument_sqlalchemy(engine)
 
 # Configuração da sessão
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -43,6 +45,18 @@ async def init_db():
         logger.error("Error creating database tables", error=str(e))
         raise
 
+def get_pool_stats() -> dict:
+    """Estatísticas do pool de conexões (exportadas em /metrics)"""
+    stats = {}
+    for attr in ("size", "checkedin", "checkedout", "overflow"):
+        getter = getattr(engine.pool, attr, None)
+        if callable(getter):
+            try:
+                stats[attr] = getter()
+            except Exception:
+                continue
+    return stats
+
 def check_db_connection():
     """Verificar conexão com banco"""
     try:
@@ -0,0 +1,93 @@
+"""
+ETags e GET condicional para leituras de projeto
+
+Todas as funções que alteram um projeto (inclusive as RPCs de work items e
+subtarefas) atualizam `projects.updated_at`, então ele serve de versão da
+linha para o projeto, os work items e as métricas. A versão conhecida de cada
+projeto fica no cache (mapa de versões, tag `project:<id>`): com ela, um
+`If-None-Match` que ainda confere é respondido com 304 sem ir ao banco.
+
+O mapa pode estar atrasado em relação ao banco, e nesse intervalo um 304
+velho é possível:
+- escrita feita por esta API, em outro worker: até CACHE_L1_TTL_SECONDS
+  (5 s), o tempo que a geração da tag leva para ser relida do Redis;
+- escrita feita fora da API (SQL direto, painel do Supabase, outro serviço):
+  até HTTP_CACHE_VERSION_TTL_SECONDS (15 s, mais o jitter do TTL), pois
+  nada invalida a tag.
+Quem escreve por fora e precisa de efeito imediato chama
+`invalidate_project`.
+"""
+
+import hashlib
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+
+from app.core.config import settings
+from app.services.cache_service import cache_service
+
+# Cache-Control por tipo de recurso: "no-cache" guarda a resposta mas exige
+# revalidação (barata, via 304); métricas toleram alguns segundos de atraso.
+CACHE_POLICIES: Dict[str, str] = {
+    "project": "private, no-cache",
+    "work_items": "private, no-cache",
+    "metrics": "private, max-age=30, must-revalidate",
+}
+
+
+def project_tag(project_id: str) -> str:
+    return f"project:{project_id}"
+
+
+def make_etag(resource: str, key: str, version: Any) -> str:
+    """ETag forte para a representação `resource` na versão informada"""
+    digest = hashlib.sha1(f"{resource}:{key}:{version}".encode("utf-8")).hexdigest()[:27]
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Compara com If-None-Match (comparação fraca, como pede a RFC 9110)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def cache_headers(resource: str, etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_POLICIES[resource], "Vary": "Authorization"}
+
+
+def not_modified(resource: str, etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(resource, etag))
+
+
+def apply_headers(response: Response, resource: str, etag: str):
+    response.headers.update(cache_headers(resource, etag))
+
+
+async def project_version(project_id: str) -> Optional[str]:
+    """Última versão conhecida do projeto (None se fora do cache)"""
+    return await cache_service.get(f"etag:version:{project_id}", tags=[project_tag(project_id)])
+
+
+async def remember_version(project_id: str, version: Any):
+    if version is None:
+        return
+    await cache_service.set(
+        f"etag:version:{project_id}", str(version),
+        ttl=settings.HTTP_CACHE_VERSION_TTL_SECONDS, tags=[project_tag(project_id)]
+    )
+
+
+async def invalidate_project(project_id: str):
+    """Chamar após qualquer escrita no projeto feita por esta API"""
+    await cache_service.invalidate_tags(project_tag(project_id))
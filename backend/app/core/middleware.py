@@ -0,0 +1,256 @@
+"""
+Middlewares ASGI: métricas das requisições HTTP e compressão das respostas
+"""
+
+import time
+import zlib
+from typing import Any, Dict, Optional
+from weakref import WeakKeyDictionary
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from app.services.monitoring_service import monitoring_service
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+# router -> (quantidade de rotas, {endpoint: template})
+_templates: "WeakKeyDictionary[Any, tuple]" = WeakKeyDictionary()
+
+
+def _endpoint_templates(router) -> Dict[Any, Optional[str]]:
+    cached = _templates.get(router)
+    if cached is not None and cached[0] == len(router.routes):
+        return cached[1]
+    templates: Dict[Any, Optional[str]] = {}
+    for route in router.routes:
+        endpoint = getattr(route, "endpoint", None)
+        if endpoint is None:
+            continue
+        # Mesmo endpoint em mais de uma rota: resolve por match
+        templates[endpoint] = None if endpoint in templates else getattr(route, "path", None)
+    _templates[router] = (len(router.routes), templates)
+    return templates
+
+
+def route_template(scope: Dict[str, Any]) -> Optional[str]:
+    """
+    Template da rota que atendeu a requisição (ex.: /api/v1/projects/{project_id})
+
+    Chamar depois que o router processou o scope: o endpoint escolhido fica em
+    `scope["endpoint"]` e o template sai de um dicionário endpoint -> path, sem
+    refazer o match das rotas.
+    """
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", None)
+    router = getattr(scope.get("app"), "router", None)
+    if router is None:
+        return None
+    endpoint = scope.get("endpoint")
+    if endpoint is not None:
+        template = _endpoint_templates(router).get(endpoint)
+        if template is not None:
+            return template
+    for candidate in router.routes:
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return getattr(candidate, "path", None)
+    return None
+
+
+class RequestMetricsMiddleware:
+    """
+    Registra contagem, latência e requisições em andamento por template de rota
+
+    ASGI puro (sem BaseHTTPMiddleware): não cria tasks nem filas por
+    requisição, e a latência vai até o envio do último byte do corpo —
+    inclui respostas em streaming.
+    """
+
+    def __init__(self, app, monitoring=None):
+        self.app = app
+        self.monitoring = monitoring or monitoring_service
+        self.in_flight = self.monitoring.registry.gauge(
+            'http_requests_in_flight', 'Requisições HTTP em andamento', multiprocess_mode='sum'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+        finished = 0.0
+
+        async def send_wrapper(message):
+            nonlocal status_code, finished
+            await send(message)
+            message_type = message["type"]
+            if message_type == "http.response.start":
+                status_code = message["status"]
+            elif message_type == "http.response.body" and not message.get("more_body", False):
+                finished = time.perf_counter()
+
+        in_flight = self.in_flight
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            self.monitoring.record_request_time(
+                route_template(scope) or UNMATCHED_ROUTE,
+                scope["method"],
+                (finished or time.perf_counter()) - started,
+                status_code
+            )
+
+
+# Tipos que valem a compressão; imagens, PDFs e arquivos já vêm comprimidos.
+# text/event-stream fica de fora: compressor intermediário atrasa os eventos.
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/problem+json", "application/x-ndjson",
+    "application/javascript", "application/xml", "image/svg+xml", "text/csv",
+    "text/html", "text/plain", "text/css"
+)
+
+
+def negotiate_encoding(accept_encoding: str, available=("br", "gzip")) -> Optional[str]:
+    """
+    Codificação escolhida a partir do Accept-Encoding (respeita q=; em caso de
+    empate vale a ordem de `available`)
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # 31: cabeçalho gzip
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self._brotli is not None:
+            out = self._brotli.process(data) if data else b""
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data) if data else b""
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    Compressão gzip/brotli negociada pelo Accept-Encoding
+
+    Corpos menores que `minimum_size` seguem sem compressão (o ganho não paga
+    a CPU). Respostas em streaming são comprimidas pedaço a pedaço, com flush
+    a cada pedaço. ETags fortes viram fracos, já que os bytes mudam com a
+    codificação (a comparação do If-None-Match é fraca, então continuam
+    valendo para 304).
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4,
+                 monitoring=None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.available = ("br", "gzip") if brotli is not None else ("gzip",)
+        monitoring = monitoring or monitoring_service
+        self.bytes_total = monitoring.registry.counter(
+            'http_response_compression_bytes_total',
+            'Bytes de corpo antes e depois da compressão', ('encoding', 'stage')
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.available)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+        original = self.bytes_total.labels(encoding, 'original')
+        compressed = self.bytes_total.labels(encoding, 'compressed')
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            message_type = message["type"]
+            if message_type == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+                if (
+                    "content-encoding" in headers
+                    or content_type not in COMPRESSIBLE_TYPES
+                    or message["status"] < 200 or message["status"] in (204, 304)
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Segura o início até ver o primeiro pedaço do corpo
+                    start_message = message
+                return
+            if message_type != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers["Content-Encoding"] = encoding
+                etag = headers.get("etag")
+                if etag and etag.startswith('"'):
+                    headers["ETag"] = "W/" + etag
+                if more_body:
+                    del headers["Content-Length"]
+                    await send(start_message)
+                    start_message = None
+
+            data = compressor.compress(body, final=not more_body)
+            original.inc(len(body))
+            compressed.inc(len(data))
+            if start_message is not None:
+                MutableHeaders(raw=start_message["headers"])["Content-Length"] = str(len(data))
+                await send(start_message)
+                start_message = None
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,72 @@
+"""
+Resposta JSON padrão da API, serializada com orjson
+
+orjson serializa datetime, date, UUID, dataclasses e enums nativamente (em
+Rust); Decimal, sets e modelos pydantic passam por `_default`. Sem orjson
+instalado, cai no json da biblioteca padrão com o mesmo tratamento.
+"""
+
+import dataclasses
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson está em requirements.txt
+    orjson = None
+
+ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        # Inteiros continuam inteiros; o resto vira float (como o jsonable_encoder)
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    raise TypeError(f"Tipo não serializável em JSON: {type(value).__name__}")
+
+
+def _stdlib_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    return _default(value)
+
+
+def dumps(content: Any) -> bytes:
+    """Serializa para bytes JSON (UTF-8, sem espaços)"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(
+        content, default=_stdlib_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse com orjson
+
+    Usada como `default_response_class`. Para listas grandes, devolver
+    `FastJSONResponse(dados)` direto da rota também evita o
+    `jsonable_encoder` do FastAPI, que percorre o payload em Python puro.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,25 +1,74 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from typing import List, Optional, Dict, Any
 import os
+import asyncio
 import json
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
+import httpx
 import openai
 from supabase import create_client, Client
 import logging
 
+from app.api.v1.endpoints import monitoring
+from app.core import http_cache
+from app.core.config import settings
+from app.core.middleware import CompressionMiddleware, RequestMetricsMiddleware
+from app.core.responses import FastJSONResponse
+from app.services.metrics_registry import CONTENT_TYPE_LATEST
+from app.services.analytics_reports import validate_report
+from app.services.analytics_rollup import analytics_rollup_job
+from app.services.analytics_service import AnalyticsService
+from app.services.cache_service import cache_service
+from app.services.dashboard_executor import dashboard_executor
+from app.services.dashboard_snapshots import dashboard_snapshots
+from app.services.job_queue import QUEUED, SUCCEEDED, async_database_url, job_queue, public_job
+from app.services.job_tasks import job_upload_path
+from app.services.kpi_aggregation import ACTIVE_STATUSES
+from app.services.monitoring_service import monitoring_service
+from app.services.realtime_stream import performance_channel
+from app.services.tracing import TracedSupabaseClient, TracingMiddleware, TracingTransport, tracer
+from app.services.warmup_service import cache_warmer
+
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicia e encerra serviços de background junto com a aplicação"""
+    await monitoring_service.start_monitoring()
+    # Sessões próprias por widget: dashboards calculam os widgets em paralelo
+    dashboard_engine = create_async_engine(async_database_url(settings.DATABASE_URL), pool_pre_ping=True)
+    dashboard_sessions = async_sessionmaker(dashboard_engine, expire_on_commit=False)
+    dashboard_executor.configure(dashboard_sessions)
+    # Dashboards executivos dos usuários mais ativos entram no aquecimento (/ready espera por eles)
+    AnalyticsService.register_warmup(cache_warmer, dashboard_sessions)
+    cache_warmer.start()
+    analytics_rollup_job.start()
+    yield
+    await performance_channel.stop()
+    await analytics_rollup_job.stop()
+    await cache_warmer.stop()
+    await monitoring_service.stop_monitoring()
+    await cache_service.close()
+    await job_queue.close()
+    dashboard_executor.configure(None)
+    await dashboard_engine.dispose()
+
 # Configuração do FastAPI
 app = FastAPI(
     title="MILAPP Backend API",
     description="Backend para o sistema MILAPP com integração IA",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # CORS para frontend
@@ -31,14 +80,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli negociado, acima de settings.RESPONSE_COMPRESSION_MIN_BYTES
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES,
+    gzip_level=settings.RESPONSE_GZIP_LEVEL,
+    brotli_quality=settings.RESPONSE_BROTLI_QUALITY
+)
+
+# Span raiz por requisição (amostragem em settings.TRACING_SAMPLE_RATE)
+app.add_middleware(TracingMiddleware)
+
+# Contagem/latência por template de rota (mais externo: mede toda a pilha)
+app.add_middleware(RequestMetricsMiddleware)
+
 # Configuração das APIs
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
 # Inicialização dos clientes
-openai_client = openai.OpenAI(api_key=OPENAI_API_KEY)
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+openai_client = openai.OpenAI(
+    api_key=OPENAI_API_KEY,
+    http_client=httpx.Client(transport=TracingTransport(peer="openai"))
+)
+supabase: Client = TracedSupabaseClient(create_client(SUPABASE_URL, SUPABASE_KEY))
 
 # Security
 security = HTTPBearer()
@@ -110,14 +176,26 @@ async def get_projects(user = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail="Erro interno do servidor")
 
 @app.get("/api/v1/projects/{project_id}")
-async def get_project(project_id: str, user = Depends(get_current_user)):
+async def get_project(project_id: str, request: Request, response: Response, user = Depends(get_current_user)):
     """Buscar projeto específico com work items"""
+    version = await http_cache.project_version(project_id)
+    if version is not None:
+        etag = http_cache.make_etag("project", project_id, version)
+        if http_cache.etag_matches(request, etag):
+            return http_cache.not_modified("project", etag)
     try:
-        response = supabase.table("projects").select("*").eq("id", project_id).single().execute()
-        return response.data
+        result = supabase.table("projects").select("*").eq("id", project_id).single().execute()
     except Exception as e:
         logger.error(f"Erro ao buscar projeto: {e}")
         raise HTTPException(status_code=404, detail="Projeto não encontrado")
+    version = result.data.get("updated_at")
+    if version is not None:
+        await http_cache.remember_version(project_id, version)
+        etag = http_cache.make_etag("project", project_id, version)
+        if http_cache.etag_matches(request, etag):
+            return http_cache.not_modified("project", etag)
+        http_cache.apply_headers(response, "project", etag)
+    return result.data
 
 @app.post("/api/v1/projects")
 async def create_project(project_data: Dict[str, Any], user = Depends(get_current_user)):
@@ -128,6 +206,7 @@ async def create_project(project_data: Dict[str, Any], user = Depends(get_curren
         project_data["updated_at"] = datetime.utcnow().isoformat()
         
         response = supabase.table("projects").insert(project_data).execute()
+        await dashboard_snapshots.mark_dirty(user.id, "projects")
         return response.data[0]
     except Exception as e:
         logger.error(f"Erro ao criar projeto: {e}")
@@ -135,14 +214,28 @@ async def create_project(project_data: Dict[str, Any], user = Depends(get_curren
 
 # Rotas de work items
 @app.get("/api/v1/projects/{project_id}/work-items")
-async def get_work_items(project_id: str, user = Depends(get_current_user)):
+async def get_work_items(project_id: str, request: Request, user = Depends(get_current_user)):
     """Buscar work items de um projeto"""
+    version = await http_cache.project_version(project_id)
+    if version is not None:
+        etag = http_cache.make_etag("work_items", project_id, version)
+        if http_cache.etag_matches(request, etag):
+            return http_cache.not_modified("work_items", etag)
     try:
-        response = supabase.table("projects").select("work_items").eq("id", project_id).single().execute()
-        return {"work_items": response.data.get("work_items", [])}
+        result = supabase.table("projects").select("work_items, updated_at").eq("id", project_id).single().execute()
     except Exception as e:
         logger.error(f"Erro ao buscar work items: {e}")
         raise HTTPException(status_code=500, detail="Erro interno do servidor")
+    headers = {}
+    version = result.data.get("updated_at")
+    if version is not None:
+        await http_cache.remember_version(project_id, version)
+        etag = http_cache.make_etag("work_items", project_id, version)
+        if http_cache.etag_matches(request, etag):
+            return http_cache.not_modified("work_items", etag)
+        headers = http_cache.cache_headers("work_items", etag)
+    # Lista grande: FastJSONResponse direto evita o jsonable_encoder
+    return FastJSONResponse({"work_items": result.data.get("work_items", [])}, headers=headers)
 
 @app.post("/api/v1/projects/{project_id}/work-items")
 async def create_work_item(
@@ -159,6 +252,8 @@ async def create_work_item(
                 'p_work_item_data': work_item.dict()
             }
         ).execute()
+        await http_cache.invalidate_project(project_id)
+        await dashboard_snapshots.mark_dirty(user.id, "tasks")
         
         return result.data
     except Exception as e:
@@ -182,6 +277,8 @@ async def update_work_item(
                 'p_work_item_data': work_item.dict(exclude_unset=True)
             }
         ).execute()
+        await http_cache.invalidate_project(project_id)
+        await dashboard_snapshots.mark_dirty(user.id, "tasks")
         
         return result.data
     except Exception as e:
@@ -203,6 +300,8 @@ async def delete_work_item(
                 'p_work_item_id': work_item_id
             }
         ).execute()
+        await http_cache.invalidate_project(project_id)
+        await dashboard_snapshots.mark_dirty(user.id, "tasks")
         
         return {"success": True}
     except Exception as e:
@@ -227,6 +326,8 @@ async def create_subtask(
                 'p_subtask_data': subtask.dict()
             }
         ).execute()
+        await http_cache.invalidate_project(project_id)
+        await dashboard_snapshots.mark_dirty(user.id, "tasks")
         
         return result.data
     except Exception as e:
@@ -252,6 +353,8 @@ async def update_subtask(
                 'p_subtask_data': subtask.dict(exclude_unset=True)
             }
         ).execute()
+        await http_cache.invalidate_project(project_id)
+        await dashboard_snapshots.mark_dirty(user.id, "tasks")
         
         return result.data
     except Exception as e:
@@ -275,6 +378,8 @@ async def delete_subtask(
                 'p_subtask_id': subtask_id
             }
         ).execute()
+        await http_cache.invalidate_project(project_id)
+        await dashboard_snapshots.mark_dirty(user.id, "tasks")
         
         return {"success": True}
     except Exception as e:
@@ -313,17 +418,27 @@ async def chat_with_ai(
         """
 
         # Chamada para OpenAI
-        response = openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": message.content}
-            ],
-            max_tokens=1000,
-            temperature=0.7
-        )
+        with tracer.span("openai.chat.completions", 'client', model="gpt-4") as span:
+            response = openai_client.chat.completions.create(
+                model="gpt-4",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": message.content}
+                ],
+                max_tokens=1000,
+                temperature=0.7
+            )
+            if response.usage:
+                span.set_attributes({
+                    'ai.prompt_tokens': response.usage.prompt_tokens,
+                    'ai.completion_tokens': response.usage.completion_tokens
+                })
 
         ai_response = response.choices[0].message.content
+        if response.usage:
+            monitoring_service.record_ai_usage(
+                response.model, response.usage.prompt_tokens, response.usage.completion_tokens
+            )
 
         # Extrair work items sugeridos da resposta da IA
         work_items = []
@@ -345,86 +460,182 @@ async def chat_with_ai(
         logger.error(f"Erro no chat com IA: {e}")
         raise HTTPException(status_code=500, detail="Erro na comunicação com IA")
 
-@app.post("/api/v1/ai/analyze-file")
+@app.post("/api/v1/ai/analyze-file", status_code=202)
 async def analyze_file(
     file: UploadFile = File(...),
     project_id: Optional[str] = Form(None),
     user = Depends(get_current_user)
 ):
-    """Analisar arquivo com IA (PDF, Word, Excel, etc.)"""
+    """Analisar arquivo com IA (PDF, Word, Excel, etc.); a análise roda no worker (fila ai)"""
     try:
-        # Salvar arquivo temporariamente
-        file_path = f"/tmp/{file.filename}"
+        # Nome gerado: o nome enviado não decide o caminho no disco
+        file_path = job_upload_path(uuid.uuid4().hex, file.filename or "upload")
         with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-
-        # Extrair texto do arquivo (implementação básica)
-        file_content = ""
-        if file.filename.endswith('.txt'):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                file_content = f.read()
-        elif file.filename.endswith('.pdf'):
-            # Implementar extração de PDF
-            file_content = "Conteúdo extraído do PDF"
-        elif file.filename.endswith(('.doc', '.docx')):
-            # Implementar extração de Word
-            file_content = "Conteúdo extraído do Word"
-        else:
-            file_content = "Arquivo não suportado para extração de texto"
-
-        # Analisar com OpenAI
-        system_prompt = """
-        Analise o conteúdo do arquivo fornecido e extraia:
-        1. Requisitos funcionais
-        2. Requisitos não funcionais
-        3. Processos de negócio
-        4. Entidades e relacionamentos
-        5. Work items sugeridos
-        
-        Forneça uma análise estruturada e detalhada.
-        """
+            while chunk := await file.read(1024 * 1024):
+                buffer.write(chunk)
 
-        response = openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Analise este arquivo: {file_content}"}
-            ],
-            max_tokens=1500,
-            temperature=0.7
+        job_id = await job_queue.enqueue(
+            "analyze_file",
+            {"path": str(file_path), "filename": file.filename, "project_id": project_id},
+            queue="ai", created_by=user.id
         )
-
-        analysis = response.choices[0].message.content
-
-        # Limpar arquivo temporário
-        os.remove(file_path)
-
-        return {
-            "filename": file.filename,
-            "analysis": analysis,
-            "work_items_suggested": []  # Extrair work items da análise
-        }
+        return {"job_id": job_id, "status": QUEUED, "status_url": f"/api/v1/jobs/{job_id}"}
 
     except Exception as e:
-        logger.error(f"Erro na análise de arquivo: {e}")
+        logger.error(f"Erro ao enfileirar análise de arquivo: {e}")
         raise HTTPException(status_code=500, detail="Erro na análise do arquivo")
 
+class ReportJobCreate(BaseModel):
+    report_type: str
+    format: str = "csv"
+    filters: Dict[str, Any] = {}
+
+@app.post("/api/v1/analytics/reports", status_code=202)
+async def create_report_job(report: ReportJobCreate, user = Depends(get_current_user)):
+    """Gera o relatório em background; o arquivo sai em /api/v1/jobs/{job_id}/download"""
+    try:
+        validate_report(report.report_type, report.format, report.filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job_id = await job_queue.enqueue(
+        "generate_report",
+        {"user_id": user.id, "report_type": report.report_type, "format": report.format, "filters": report.filters},
+        queue="reports", created_by=user.id
+    )
+    return {"job_id": job_id, "status": QUEUED, "status_url": f"/api/v1/jobs/{job_id}"}
+
+async def load_own_job(job_id: str, user) -> Dict[str, Any]:
+    try:
+        job = await job_queue.get(str(uuid.UUID(job_id)))
+    except ValueError:
+        job = None
+    if job is None or job["created_by"] != user.id:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+@app.get("/api/v1/jobs/{job_id}")
+async def get_job(job_id: str, user = Depends(get_current_user)):
+    """Status do job (queued, running, succeeded, failed) e resultado quando concluído"""
+    return public_job(await load_own_job(job_id, user))
+
+@app.get("/api/v1/jobs/{job_id}/download")
+async def download_job_result(job_id: str, user = Depends(get_current_user)):
+    """Arquivo gerado por um job de relatório concluído"""
+    job = await load_own_job(job_id, user)
+    result = job["result"] or {}
+    if job["status"] != SUCCEEDED or "path" not in result:
+        raise HTTPException(status_code=409, detail="Job sem arquivo disponível")
+    return FileResponse(result["path"], media_type=result["media_type"], filename=result["filename"])
+
 # Rotas de métricas e analytics
+async def load_project_metrics(project_id: str, version: Optional[str]) -> Any:
+    """Métricas do projeto via cache (a versão na chave evita servir cálculo antigo)"""
+    def calculate():
+        return supabase.rpc('calculate_project_metrics', {'p_project_id': project_id}).execute().data
+
+    return await cache_service.get_or_set(
+        f"project_metrics:{project_id}:{version}",
+        lambda: asyncio.to_thread(calculate),
+        ttl=settings.PROJECT_METRICS_CACHE_TTL_SECONDS,
+        tags=[http_cache.project_tag(project_id)]
+    )
+
 @app.get("/api/v1/projects/{project_id}/metrics")
-async def get_project_metrics(project_id: str, user = Depends(get_current_user)):
+async def get_project_metrics(project_id: str, request: Request, response: Response, user = Depends(get_current_user)):
     """Buscar métricas do projeto"""
     try:
-        result = supabase.rpc(
-            'calculate_project_metrics',
-            {'p_project_id': project_id}
-        ).execute()
-        
-        return result.data
+        # Versão antes do cálculo: se o If-None-Match confere, a RPC nem roda
+        version = await http_cache.project_version(project_id)
+        if version is None:
+            row = supabase.table("projects").select("updated_at").eq("id", project_id).single().execute()
+            version = row.data.get("updated_at")
+            await http_cache.remember_version(project_id, version)
+        if version is not None:
+            etag = http_cache.make_etag("metrics", project_id, version)
+            if http_cache.etag_matches(request, etag):
+                return http_cache.not_modified("metrics", etag)
+            http_cache.apply_headers(response, "metrics", etag)
+
+        return await load_project_metrics(project_id, version)
     except Exception as e:
         logger.error(f"Erro ao buscar métricas: {e}")
         raise HTTPException(status_code=500, detail="Erro interno do servidor")
 
+# Aquecimento do cache: projetos alterados mais recentemente
+async def discover_hot_projects(limit: int) -> List[Dict[str, Any]]:
+    result = await asyncio.to_thread(
+        lambda: supabase.table("projects").select("id, updated_at")
+        .order("updated_at", desc=True).limit(limit).execute()
+    )
+    return result.data or []
+
+async def warm_project(project: Dict[str, Any]):
+    await http_cache.remember_version(project["id"], project.get("updated_at"))
+    await load_project_metrics(project["id"], project.get("updated_at"))
+
+cache_warmer.register("project_metrics", discover_hot_projects, warm_project, limit=settings.WARMUP_TOP_PROJECTS)
+
+# Rollup incremental de analytics_events nas tabelas fato (diárias/horárias)
+async def refresh_analytics_rollups(batch_size: int) -> Dict[str, Any]:
+    result = await asyncio.to_thread(
+        lambda: supabase.rpc('refresh_analytics_rollups', {'p_batch_size': batch_size}).execute()
+    )
+    if (result.data or {}).get("events"):
+        # Fatos novos: widgets alimentados pelo rollup ficam sujos para todos
+        await dashboard_snapshots.mark_dirty(None, "events")
+    return result.data or {}
+
+analytics_rollup_job.configure(refresh_analytics_rollups)
+
+# Performance em tempo real: um cálculo por tick para todas as conexões
+async def count_active_automations() -> int:
+    def count():
+        return supabase.table("projects").select("id", count="exact") \
+            .in_("status", list(ACTIVE_STATUSES)).limit(1).execute().count or 0
+
+    return await cache_service.get_or_set(
+        "realtime:active_automations",
+        lambda: asyncio.to_thread(count),
+        ttl=settings.REALTIME_AUTOMATIONS_CACHE_SECONDS
+    )
+
+performance_channel.configure(count_active_automations)
+
+@app.get("/api/v1/analytics/realtime")
+async def get_realtime_performance(user = Depends(get_current_user)):
+    """Snapshot atual de vazão, taxa de erro, latência e automações ativas"""
+    return await performance_channel.get_current()
+
+stream_security = HTTPBearer(auto_error=False)
+
+async def get_stream_user(
+    access_token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(stream_security)
+):
+    """
+    Usuário de um stream SSE: o EventSource do navegador não envia cabeçalhos,
+    então o access token do Supabase (curta duração) também vale em
+    `?access_token=`. O cabeçalho Authorization, quando presente, tem precedência.
+    """
+    token = credentials.credentials if credentials else access_token
+    if not token:
+        raise HTTPException(status_code=401, detail="Token ausente")
+    return await get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+
+@app.get("/api/v1/analytics/realtime/stream")
+async def stream_realtime_performance(user = Depends(get_stream_user)):
+    """
+    Server-Sent Events: snapshot completo e depois deltas a cada tick (sem polling)
+
+    No navegador: `new EventSource(url + "?access_token=" + session.access_token)`;
+    reconecte com o token renovado quando o Supabase o atualizar.
+    """
+    return StreamingResponse(
+        performance_channel.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Health check
 @app.get("/health")
 async def health_check():
@@ -435,6 +646,29 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Pronta para receber tráfego: aquecimento do cache concluído ou expirado"""
+    status = cache_warmer.status()
+    return FastJSONResponse(status, status_code=200 if status["ready"] else 503)
+
+# Métricas Prometheus (scrape em monitoring/prometheus.yml)
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Exposição das métricas no formato texto do Prometheus"""
+    if not settings.PROMETHEUS_ENABLED:
+        raise HTTPException(status_code=404, detail="Métricas Prometheus desabilitadas")
+    return Response(content=monitoring_service.render_prometheus(), media_type=CONTENT_TYPE_LATEST)
+
+# Monitoramento (saúde, runtime, histórico); traces, bloqueios do loop, profile e ações exigem token
+app.include_router(monitoring.router, prefix="/api/v1/monitoring", tags=["monitoring"])
+app.include_router(
+    monitoring.protected_router,
+    prefix="/api/v1/monitoring",
+    tags=["monitoring"],
+    dependencies=[Depends(get_current_user)]
+)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -6,6 +6,8 @@ from langchain.chat_models import ChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage
 
 from app.core.config import settings
+from app.services.monitoring_service import monitoring_service
+from app.services.tracing import tracer
 
 logger = structlog.get_logger()
 
@@ -36,7 +38,18 @@ class AIService:
                 HumanMessage(content=message)
             ]
             
-            response = await self.chat_model.agenerate([messages])
+            with tracer.span("langchain.chat.agenerate", 'client', model=self.chat_model.model_name) as span:
+                response = await self.chat_model.agenerate([messages])
+                usage = (response.llm_output or {}).get("token_usage") or {}
+                span.set_attributes({
+                    'ai.prompt_tokens': usage.get("prompt_tokens", 0),
+                    'ai.completion_tokens': usage.get("completion_tokens", 0)
+                })
+            monitoring_service.record_ai_usage(
+                self.chat_model.model_name,
+                usage.get("prompt_tokens", 0),
+                usage.get("completion_tokens", 0)
+            )
             
             return {
                 "response": response.generations[0][0].text,
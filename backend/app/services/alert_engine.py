@@ -0,0 +1,305 @@
+"""
+Armazenamento indexado de alertas e avaliação de regras no formato Prometheus
+"""
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.services.rule_expressions import (
+    Evaluator, ExpressionError, RangeHistory, Sample, parse_duration, parse_expression
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Alert:
+    """Alerta do sistema"""
+    id: str
+    severity: str  # 'info', 'warning', 'error', 'critical'
+    message: str
+    timestamp: datetime
+    resolved: bool = False
+    metadata: Dict[str, Any] = None
+    fingerprint: str = ""
+    labels: Dict[str, str] = field(default_factory=dict)
+    last_seen: float = 0.0
+    resolved_at: Optional[datetime] = None
+
+
+def fingerprint(alert_id: str, labels: Optional[Dict[str, str]] = None) -> str:
+    """Identificador estável de um alerta (nome + labels)"""
+    if not labels:
+        return alert_id
+    raw = alert_id + "\x00" + "\x00".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class AlertStore:
+    """
+    Alertas indexados por fingerprint
+
+    Ativos e resolvidos ficam em OrderedDicts separados ordenados pela última
+    atualização: criar, renovar e resolver são O(1), e a limpeza percorre só
+    o início de cada dicionário até encontrar um item ainda válido.
+    """
+
+    def __init__(self, expire_after: float = 900, resolved_retention: float = 3600,
+                 max_active: int = 500, max_resolved: int = 1000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.expire_after = expire_after
+        self.resolved_retention = resolved_retention
+        self.max_active = max_active
+        self.max_resolved = max_resolved
+        self._clock = clock
+        self._active: "OrderedDict[str, Alert]" = OrderedDict()
+        self._resolved: "OrderedDict[str, Alert]" = OrderedDict()
+        self._by_id: Dict[str, Dict[str, None]] = {}
+
+    def upsert(self, alert_id: str, severity: str, message: str,
+               metadata: Optional[Dict[str, Any]] = None,
+               labels: Optional[Dict[str, str]] = None) -> Tuple[Alert, bool]:
+        """Cria ou renova um alerta ativo; retorna (alerta, criado)"""
+        key = fingerprint(alert_id, labels)
+        now = self._clock()
+        alert = self._active.get(key)
+        if alert is not None:
+            alert.last_seen = now
+            alert.message = message
+            self._active.move_to_end(key)
+            return alert, False
+
+        self._resolved.pop(key, None)
+        alert = Alert(
+            id=alert_id,
+            severity=severity,
+            message=message,
+            timestamp=datetime.now(),
+            metadata=metadata or {},
+            fingerprint=key,
+            labels=dict(labels or {}),
+            last_seen=now
+        )
+        self._active[key] = alert
+        self._by_id.setdefault(alert_id, {})[key] = None
+        if len(self._active) > self.max_active:
+            _, oldest = self._active.popitem(last=False)
+            self._mark_resolved(oldest)
+        return alert, True
+
+    def resolve(self, alert_id: str, labels: Optional[Dict[str, str]] = None) -> List[Alert]:
+        """
+        Resolve o alerta com esses labels; sem labels, todas as instâncias do id
+        """
+        if labels is not None:
+            keys = [fingerprint(alert_id, labels)]
+        else:
+            keys = list(self._by_id.get(alert_id, ()))
+        resolved = []
+        for key in keys:
+            alert = self._active.pop(key, None)
+            if alert is not None:
+                self._mark_resolved(alert)
+                resolved.append(alert)
+        return resolved
+
+    def _mark_resolved(self, alert: Alert):
+        alert.resolved = True
+        alert.resolved_at = datetime.now()
+        alert.last_seen = self._clock()
+        instances = self._by_id.get(alert.id)
+        if instances is not None:
+            instances.pop(alert.fingerprint, None)
+            if not instances:
+                del self._by_id[alert.id]
+        self._resolved[alert.fingerprint] = alert
+        self._resolved.move_to_end(alert.fingerprint)
+        if len(self._resolved) > self.max_resolved:
+            self._resolved.popitem(last=False)
+
+    def prune(self) -> List[Alert]:
+        """
+        Resolve ativos não renovados dentro de `expire_after` e descarta
+        resolvidos mais antigos que `resolved_retention`
+        """
+        now = self._clock()
+        expired = []
+        while self._active:
+            key, alert = next(iter(self._active.items()))
+            if now - alert.last_seen < self.expire_after:
+                break
+            del self._active[key]
+            self._mark_resolved(alert)
+            expired.append(alert)
+        while self._resolved:
+            key, alert = next(iter(self._resolved.items()))
+            if now - alert.last_seen < self.resolved_retention:
+                break
+            del self._resolved[key]
+        return expired
+
+    def get(self, alert_id: str, labels: Optional[Dict[str, str]] = None) -> Optional[Alert]:
+        key = fingerprint(alert_id, labels)
+        return self._active.get(key) or self._resolved.get(key)
+
+    def is_active(self, alert_id: str) -> bool:
+        return alert_id in self._by_id
+
+    def active(self) -> List[Alert]:
+        return list(self._active.values())
+
+    def all(self) -> List[Alert]:
+        return list(self._active.values()) + list(self._resolved.values())
+
+    def __len__(self) -> int:
+        return len(self._active) + len(self._resolved)
+
+
+@dataclass
+class AlertRule:
+    """Regra de alerta (`alert:`) ou de gravação (`record:`)"""
+    name: str
+    expr: str
+    node: Any
+    for_seconds: float = 0.0
+    keep_firing_for: float = 0.0
+    labels: Dict[str, str] = field(default_factory=dict)
+    annotations: Dict[str, str] = field(default_factory=dict)
+    record: bool = False
+
+
+@dataclass
+class _RuleState:
+    """Estado de uma instância de regra (por conjunto de labels)"""
+    active_since: float
+    last_true: float
+    firing: bool = False
+
+
+class RuleEngine:
+    """
+    Avalia regras `alert`/`record` contra as séries do processo
+
+    Segue a semântica do Prometheus: a condição precisa se manter por `for`
+    antes de disparar (pending -> firing) e, como histerese, o alerta só é
+    resolvido após ficar falso por `keep_firing_for`.
+    """
+
+    def __init__(self, store: AlertStore, target_labels: Optional[Dict[str, str]] = None,
+                 default_keep_firing_for: float = 0.0, clock: Callable[[], float] = time.monotonic):
+        self.store = store
+        self.target_labels = target_labels or {}
+        self.default_keep_firing_for = default_keep_firing_for
+        self.rules: List[AlertRule] = []
+        self.recorded: List[Sample] = []
+        self._history = RangeHistory()
+        self._states: Dict[str, Dict[frozenset, _RuleState]] = {}
+        self._clock = clock
+
+    def load_rules(self, groups: Iterable[Dict[str, Any]]) -> int:
+        """Carrega regras a partir dos `groups` de um arquivo de regras"""
+        loaded = 0
+        for group in groups or []:
+            for raw in group.get("rules", []):
+                name = raw.get("alert") or raw.get("record")
+                try:
+                    rule = AlertRule(
+                        name=name,
+                        expr=raw["expr"],
+                        node=parse_expression(str(raw["expr"])),
+                        for_seconds=parse_duration(raw["for"]) if raw.get("for") else 0.0,
+                        keep_firing_for=(
+                            parse_duration(raw["keep_firing_for"]) if raw.get("keep_firing_for")
+                            else self.default_keep_firing_for
+                        ),
+                        labels={k: str(v) for k, v in (raw.get("labels") or {}).items()},
+                        annotations={k: str(v) for k, v in (raw.get("annotations") or {}).items()},
+                        record="record" in raw
+                    )
+                except (KeyError, ExpressionError) as e:
+                    logger.warning(f"Regra ignorada ({name}): {e}")
+                    continue
+                self.rules.append(rule)
+                loaded += 1
+        return loaded
+
+    def load_file(self, path: Path) -> int:
+        """Carrega um arquivo de regras YAML"""
+        import yaml
+
+        with open(path, "r", encoding="utf-8") as f:
+            content = yaml.safe_load(f) or {}
+        loaded = self.load_rules(content.get("groups", []))
+        logger.info(f"{loaded} regras carregadas de {path}")
+        return loaded
+
+    def evaluate(self, samples: List[Sample]) -> List[Alert]:
+        """Avalia todas as regras; retorna alertas que passaram a disparar"""
+        now = self._clock()
+        fired = []
+        recorded: List[Sample] = []
+        evaluator = Evaluator(samples, now, self._history, self.target_labels)
+        for rule in self.rules:
+            try:
+                result = evaluator.evaluate(rule.node)
+            except (ExpressionError, TypeError) as e:
+                logger.warning(f"Falha ao avaliar regra {rule.name}: {e}")
+                continue
+            if not isinstance(result, dict):
+                result = {frozenset(): result} if rule.record or result else {}
+
+            if rule.record:
+                for labels, value in result.items():
+                    sample = (rule.name, {k: v for k, v in labels if k != "__name__"}, value)
+                    recorded.append(sample)
+                    evaluator.add(*sample)
+                continue
+            fired.extend(self._update_alert(rule, result, now))
+
+        self.recorded = recorded
+        self.store.prune()
+        return fired
+
+    def _update_alert(self, rule: AlertRule, result: Dict[frozenset, float], now: float) -> List[Alert]:
+        states = self._states.setdefault(rule.name, {})
+        fired = []
+        for labels, value in result.items():
+            key = frozenset(item for item in labels if item[0] != "__name__")
+            state = states.get(key)
+            if state is None:
+                state = states[key] = _RuleState(active_since=now, last_true=now)
+            state.last_true = now
+            if now - state.active_since >= rule.for_seconds:
+                alert_labels = {**dict(key), **rule.labels}
+                alert, created = self.store.upsert(
+                    rule.name,
+                    rule.labels.get("severity", "warning"),
+                    rule.annotations.get("summary", rule.name),
+                    metadata={
+                        "description": rule.annotations.get("description"),
+                        "expr": rule.expr,
+                        "value": value
+                    },
+                    labels=alert_labels
+                )
+                if created:
+                    logger.warning(f"Alerta disparado: {rule.name} {alert_labels}")
+                    fired.append(alert)
+                state.firing = True
+
+        # Condição falsa: pending é descartado; firing aguarda keep_firing_for
+        for key, state in list(states.items()):
+            if state.last_true == now:
+                continue
+            if not state.firing or now - state.last_true >= rule.keep_firing_for:
+                if state.firing:
+                    self.store.resolve(rule.name, {**dict(key), **rule.labels})
+                    logger.info(f"Alerta resolvido: {rule.name} {dict(key)}")
+                del states[key]
+        return fired
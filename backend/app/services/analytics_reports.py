@@ -0,0 +1,91 @@
+"""
+Relatórios exportáveis de analytics (consultas sobre tabelas Core)
+
+As consultas usam as tabelas do SQLAlchemy Core já declaradas para o
+snapshot colunar (`projects`) e para os rollups (`analytics_daily_facts`),
+sem a camada de modelos ORM: o worker da fila gera os relatórios importando
+só este módulo.
+
+`validate_report` confere relatório, formato e filtros antes de a exportação
+começar. Na API isso vira 400 (ou um job que nem é enfileirado); no worker,
+um erro permanente. Um filtro inválido descoberto dentro do stream, depois
+dos cabeçalhos, só truncaria o arquivo.
+"""
+
+from datetime import datetime
+from typing import Any, Dict
+
+from sqlalchemy import select
+
+from app.services.analytics_rollup import TREND_METRICS, daily_facts
+from app.services.columnar_store import projects
+from app.services.kpi_aggregation import resolve_period
+from app.services.report_export import WRITERS, ReportSpec
+
+
+def projects_report_query(user_id: str, filters: Dict[str, Any]):
+    """Filtros: status (um ou vários) e period (ex.: 30d, 1y, all)"""
+    c = projects.c
+    query = select(
+        c.id, c.name, c.status, c.roi_actual, c.estimated_effort, c.actual_effort, c.created_at
+    ).where(c.created_by == user_id)
+    status = filters.get("status")
+    if status:
+        query = query.where(c.status.in_([status] if isinstance(status, str) else status))
+    if filters.get("period"):
+        query = query.where(*resolve_period(filters["period"]).conditions(c.created_at))
+    return query.order_by(c.created_at)
+
+
+def activity_report_query(user_id: str, filters: Dict[str, Any]):
+    """Fatos diários do usuário; filtros: metric e period"""
+    c = daily_facts.c
+    query = select(c.bucket, c.project_id, c.metric, c.value_sum, c.value_count).where(c.user_id == user_id)
+    if filters.get("metric"):
+        event_type, _ = TREND_METRICS.get(filters["metric"], (filters["metric"], "sum"))
+        query = query.where(c.metric == event_type)
+    window = resolve_period(filters.get("period", "90d"), datetime.utcnow())
+    if window.start is not None:
+        query = query.where(c.bucket >= window.start.date())
+    return query.order_by(c.bucket, c.metric)
+
+
+# Relatórios exportáveis por generate_report
+REPORTS = {
+    "projects": ReportSpec(
+        "projects",
+        (("id", "string"), ("name", "string"), ("status", "string"), ("roi_actual", "float"),
+         ("estimated_effort", "int"), ("actual_effort", "int"), ("created_at", "datetime")),
+        projects_report_query
+    ),
+    "activity": ReportSpec(
+        "activity",
+        (("date", "date"), ("project_id", "string"), ("metric", "string"), ("value_sum", "float"),
+         ("value_count", "int")),
+        activity_report_query
+    ),
+}
+
+
+def _is_text_list(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def validate_report(report_type: str, format: str, filters: Dict[str, Any]) -> ReportSpec:
+    """Spec do relatório; ValueError se relatório, formato ou filtros forem inválidos"""
+    spec = REPORTS.get(report_type)
+    if spec is None:
+        raise ValueError(f"Relatório desconhecido: {report_type} (use {', '.join(REPORTS)})")
+    if format not in WRITERS:
+        raise ValueError(f"Formato não suportado: {format} (use {', '.join(WRITERS)})")
+    if not isinstance(filters, dict):
+        raise ValueError("filters deve ser um objeto")
+    status = filters.get("status")
+    if status is not None and not isinstance(status, str) and not _is_text_list(status):
+        raise ValueError("status deve ser um texto ou uma lista de textos")
+    for key in ("period", "metric"):
+        if filters.get(key) is not None and not isinstance(filters[key], str):
+            raise ValueError(f"{key} deve ser um texto")
+    # Monta a consulta (sem executar): período inválido falha aqui, não no stream
+    spec.query("", filters)
+    return spec
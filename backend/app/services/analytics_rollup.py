@@ -0,0 +1,294 @@
+"""
+Tabelas fato de analytics (rollups diários e horários)
+
+`analytics_events` é agregado incrementalmente em `analytics_daily_facts` e
+`analytics_hourly_facts` (chave: métrica, usuário, projeto e bucket) pela
+função `refresh_analytics_rollups` (migrações 20250720000000 e
+20250722000000). O `AnalyticsRollupJob` chama essa função periodicamente;
+cada execução só lê os eventos de transações posteriores à marca d'água
+(id da transação, não created_at: uma transação que confirma tarde não fica
+para trás), então o custo acompanha o volume novo, não o histórico.
+
+As consultas de tendência viram varreduras por intervalo sobre as fatos
+(`fact_series`): 90 dias de uma métrica são no máximo 90 linhas por projeto.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import BigInteger, Column, Date, DateTime, MetaData, Numeric, String, Table, func, select
+
+from app.core.config import settings
+from app.services.monitoring_service import monitoring_service
+
+logger = logging.getLogger(__name__)
+
+# Dimensão ausente (evento sem usuário ou sem projeto)
+NO_DIMENSION = "00000000-0000-0000-0000-000000000000"
+
+metadata = MetaData()
+
+
+def _fact_table(name: str, bucket_type) -> Table:
+    return Table(
+        name, metadata,
+        Column("bucket", bucket_type, primary_key=True),
+        Column("user_id", String(36), primary_key=True),
+        Column("project_id", String(36), primary_key=True),
+        Column("metric", String(100), primary_key=True),
+        Column("value_sum", Numeric, nullable=False),
+        Column("value_count", BigInteger, nullable=False),
+        Column("value_min", Numeric),
+        Column("value_max", Numeric),
+        Column("updated_at", DateTime(timezone=True)),
+    )
+
+
+daily_facts = _fact_table("analytics_daily_facts", Date)
+hourly_facts = _fact_table("analytics_hourly_facts", DateTime(timezone=True))
+
+FACT_TABLES = {"day": daily_facts, "hour": hourly_facts}
+
+# Métricas de tendência expostas pela API: nome público -> (event_type nas fatos, agregação)
+# Outros nomes são lidos direto como event_type, somando event_value
+TREND_METRICS = {
+    "projects": ("project.created", "count"),
+    "completed_projects": ("project.completed", "count"),
+    "status_changes": ("project.status_changed", "count"),
+    "roi": ("project.roi_updated", "avg"),
+}
+
+
+@dataclass(frozen=True)
+class FactPoint:
+    bucket: Any
+    sum: float
+    count: int
+    min: Optional[float]
+    max: Optional[float]
+
+    @property
+    def avg(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def value(self, aggregate: str) -> Optional[float]:
+        """`aggregate`: sum | count | avg | min | max"""
+        return self.avg if aggregate == "avg" else getattr(self, aggregate)
+
+
+async def fact_series(db, metric: str, start: Optional[datetime], end: datetime,
+                      user_id: Optional[str] = None, project_id: Optional[str] = None,
+                      granularity: str = "day") -> List[FactPoint]:
+    """
+    Série de `metric` entre `start` e `end` (varredura no índice usuário/métrica/bucket),
+    somando os projetos do usuário quando `project_id` não é informado
+    """
+    table = FACT_TABLES[granularity]
+    c = table.c
+    query = select(
+        c.bucket,
+        func.sum(c.value_sum).label("sum"),
+        func.sum(c.value_count).label("count"),
+        func.min(c.value_min).label("min"),
+        func.max(c.value_max).label("max"),
+    ).where(c.metric == metric).group_by(c.bucket).order_by(c.bucket)
+    if user_id is not None:
+        query = query.where(c.user_id == user_id)
+    if project_id is not None:
+        query = query.where(c.project_id == project_id)
+    if granularity == "day":
+        start, end = (start.date() if start else None), end.date()
+    if start is not None:
+        query = query.where(c.bucket >= start)
+    query = query.where(c.bucket <= end)
+
+    result = await db.execute(query)
+    return [
+        FactPoint(
+            row.bucket, float(row.sum or 0), int(row.count or 0),
+            float(row.min) if row.min is not None else None,
+            float(row.max) if row.max is not None else None
+        )
+        for row in result.all()
+    ]
+
+
+async def fact_matrix(db, metric: str, start: date, end: date, aggregate: str = "sum",
+                      user_id: Optional[str] = None) -> Tuple[List[str], List[date], np.ndarray]:
+    """
+    Séries diárias de `metric` por projeto numa única consulta: devolve
+    (projetos, dias, matriz projetos × dias). Dias sem fatos valem 0, ou NaN
+    quando `aggregate` é "avg"
+    """
+    c = daily_facts.c
+    query = select(
+        c.project_id, c.bucket,
+        func.sum(c.value_sum).label("sum"),
+        func.sum(c.value_count).label("count"),
+    ).where(
+        c.metric == metric, c.bucket >= start, c.bucket <= end, c.project_id != NO_DIMENSION
+    ).group_by(c.project_id, c.bucket)
+    if user_id is not None:
+        query = query.where(c.user_id == user_id)
+    result = await db.execute(query)
+    rows = result.all()
+
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    projects = sorted({str(row.project_id) for row in rows})
+    matrix = np.full((len(projects), len(days)), np.nan if aggregate == "avg" else 0.0)
+    project_index = {project: i for i, project in enumerate(projects)}
+    for row in rows:
+        total, count = float(row.sum or 0), int(row.count or 0)
+        value = total / count if aggregate == "avg" else count if aggregate == "count" else total
+        if aggregate == "avg" and not count:
+            continue
+        matrix[project_index[str(row.project_id)], (row.bucket - start).days] = value
+    return projects, days, matrix
+
+
+def _period_start(day: date, unit: str) -> date:
+    if unit == "week":
+        return day - timedelta(days=day.weekday())
+    if unit == "month":
+        return day.replace(day=1)
+    if unit == "quarter":
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day
+
+
+def rebucket(points: List[FactPoint], unit: str) -> List[FactPoint]:
+    """Reagrupa pontos diários em semanas, meses ou trimestres (soma/contagem exatas)"""
+    groups: Dict[date, List[FactPoint]] = {}
+    for point in points:
+        day = point.bucket.date() if isinstance(point.bucket, datetime) else point.bucket
+        groups.setdefault(_period_start(day, unit), []).append(point)
+    merged = []
+    for bucket in sorted(groups):
+        group = groups[bucket]
+        mins = [p.min for p in group if p.min is not None]
+        maxs = [p.max for p in group if p.max is not None]
+        merged.append(FactPoint(
+            bucket, sum(p.sum for p in group), sum(p.count for p in group),
+            min(mins) if mins else None, max(maxs) if maxs else None
+        ))
+    return merged
+
+
+def period_starts(end: date, unit: str, count: int) -> List[date]:
+    """Início dos últimos `count` períodos (`unit`: week | month | quarter) até `end`, em ordem"""
+    starts = [_period_start(end, unit)]
+    while len(starts) < count:
+        starts.append(_period_start(starts[-1] - timedelta(days=1), unit))
+    return starts[::-1]
+
+
+def fill_days(points: List[FactPoint], start: date, end: date) -> List[FactPoint]:
+    """Completa os dias sem eventos com pontos vazios (sum 0, count 0)"""
+    by_day = {point.bucket: point for point in points}
+    days = []
+    day = start
+    while day <= end:
+        days.append(by_day.get(day) or FactPoint(day, 0.0, 0, None, None))
+        day += timedelta(days=1)
+    return days
+
+
+class AnalyticsRollupJob:
+    """Chama `refresh(batch_size)` a cada `interval` segundos até alcançar a marca d'água"""
+
+    def __init__(self, refresh: Optional[Callable[[int], Awaitable[Dict[str, Any]]]] = None,
+                 interval: float = 60.0, batch_size: int = 50000, enabled: bool = True,
+                 max_batches: int = 20, registry=None):
+        self.refresh = refresh
+        self.interval = interval
+        self.batch_size = batch_size
+        self.enabled = enabled
+        self.max_batches = max_batches  # Lotes por ciclo: limita a recuperação após uma parada longa
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+        registry = registry or monitoring_service.registry
+        self.events_total = registry.counter(
+            'milapp_analytics_rollup_events_total', 'Eventos agregados nas tabelas fato'
+        )
+        self.runs_total = registry.counter(
+            'milapp_analytics_rollup_runs_total', 'Execuções do rollup de analytics', ('result',)
+        )
+        self.lag_gauge = registry.gauge(
+            'milapp_analytics_rollup_lag_seconds', 'Atraso da marca d\'água do rollup em relação ao relógio',
+            multiprocess_mode='min'
+        )
+
+    def configure(self, refresh: Callable[[int], Awaitable[Dict[str, Any]]]):
+        self.refresh = refresh
+
+    def start(self):
+        """Inicia o loop em background (chamado no lifespan)"""
+        if not self.enabled or self.refresh is None or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop(), name="analytics-rollup")
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.runs_total.labels('error').inc()
+                logger.error(f"Erro no rollup de analytics: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Processa lotes até a função informar que não há mais eventos pendentes"""
+        started = time.perf_counter()
+        events, batches, result = 0, 0, {}
+        while batches < self.max_batches:
+            result = await self.refresh(self.batch_size) or {}
+            batches += 1
+            events += int(result.get("events") or 0)
+            if not result.get("more"):
+                break
+
+        self.events_total.inc(events)
+        self.runs_total.labels('ok').inc()
+        watermark = _parse_timestamp(result.get("to"))
+        if watermark is not None:
+            self.lag_gauge.set(max(0.0, time.time() - watermark.timestamp()))
+        self.last_run = {
+            "events": events,
+            "batches": batches,
+            "watermark": result.get("to"),
+            "pending": bool(result.get("more")),
+            "duration_seconds": round(time.perf_counter() - started, 3)
+        }
+        if events:
+            logger.info(f"Rollup de analytics: {events} eventos em {batches} lote(s)")
+        return self.last_run
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+analytics_rollup_job = AnalyticsRollupJob(
+    interval=settings.ANALYTICS_ROLLUP_INTERVAL_SECONDS,
+    batch_size=settings.ANALYTICS_ROLLUP_BATCH_SIZE,
+    enabled=settings.ANALYTICS_ROLLUP_ENABLED
+)
@@ -2,14 +2,45 @@
 Serviço de Analytics e Dashboards
 """
 
+from contextlib import nullcontext
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
+import numpy as np
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import JSON, Boolean, Column, MetaData, String, Table, Text, select, func, and_, or_
 from sqlalchemy.orm import selectinload
+from fastapi.responses import StreamingResponse
 
+from app.core.config import settings
 from app.models.project import Project
 from app.models.user import User
+from app.services import forecasting
+from app.services.analytics_reports import validate_report
+from app.services.analytics_rollup import (
+    TREND_METRICS, fact_matrix, fact_series, fill_days, period_starts, rebucket
+)
+from app.services.columnar_store import columnar_store
+from app.services.dashboard_executor import WidgetSpec, dashboard_executor
+from app.services.dashboard_snapshots import dashboard_snapshots
+from app.services.kpi_aggregation import (
+    ACTIVE_STATUSES, aggregate_kpis, completion_rate, productivity_kpis, project_kpis, resolve_period, roi_kpis
+)
+from app.services.realtime_stream import performance_channel
+from app.services.report_export import report_exporter
+
+MONTH_LABELS = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
+
+custom_dashboards = Table(
+    "analytics_dashboards", MetaData(),
+    Column("id", String(36), primary_key=True),
+    Column("name", String(255)),
+    Column("description", Text),
+    Column("dashboard_config", JSON),
+    Column("is_public", Boolean),
+    Column("is_active", Boolean),
+    Column("created_by", String(36)),
+)
+
 
 class AnalyticsService:
     """Serviço de analytics e dashboards"""
@@ -20,50 +51,44 @@ class AnalyticsService:
         user_id: str
     ) -> Dict[str, Any]:
         """Obter dashboard executivo"""
-        try:
-            # KPIs principais
-            kpis = await AnalyticsService._get_main_kpis(db, user_id)
-            
-            # Gráficos de tendência
-            trends = await AnalyticsService._get_trends_data(db, user_id)
-            
-            # Distribuição de projetos
-            project_distribution = await AnalyticsService._get_project_distribution(db, user_id)
-            
-            # ROI por período
-            roi_data = await AnalyticsService._get_roi_data(db, user_id)
-            
-            widgets = [
-                {
-                    "id": "main_kpis",
-                    "type": "metrics",
-                    "title": "KPIs Principais",
-                    "data": kpis
-                },
-                {
-                    "id": "trends_chart",
-                    "type": "line_chart",
-                    "title": "Tendências",
-                    "data": trends
-                },
-                {
-                    "id": "project_distribution",
-                    "type": "pie_chart",
-                    "title": "Distribuição de Projetos",
-                    "data": project_distribution
-                },
-                {
-                    "id": "roi_chart",
-                    "type": "bar_chart",
-                    "title": "ROI por Período",
-                    "data": roi_data
-                }
-            ]
-            
-            return {"widgets": widgets}
-            
-        except Exception as e:
-            raise e
+        return await dashboard_executor.run(EXECUTIVE_WIDGETS, user_id, db=db)
+    
+    @staticmethod
+    async def get_executive_dashboard_cached(
+        db: AsyncSession,
+        user_id: str
+    ) -> Dict[str, Any]:
+        """Dashboard executivo via snapshot (só os widgets afetados por mudanças são recalculados)"""
+        return await AnalyticsService.get_dashboard_snapshot(db, user_id, "executive")
+    
+    @staticmethod
+    async def get_dashboard_snapshot(
+        db: AsyncSession,
+        user_id: str,
+        dashboard_type: str
+    ) -> Dict[str, Any]:
+        """Dashboard executive/operational/technical a partir do snapshot do usuário"""
+        widgets = DASHBOARDS.get(dashboard_type)
+        if widgets is None:
+            raise ValueError(f"Dashboard desconhecido: {dashboard_type}")
+        return await dashboard_snapshots.get(dashboard_type, widgets, user_id, db=db)
+    
+    @staticmethod
+    def register_warmup(warmer, session_factory) -> None:
+        """
+        Registra o aquecimento dos dashboards executivos dos usuários mais
+        ativos; `session_factory()` deve devolver um AsyncSession usável com
+        `async with`
+        """
+        async def discover(limit: int) -> List[str]:
+            async with session_factory() as db:
+                return await AnalyticsService._get_most_active_users(db, limit)
+        
+        async def warm(user_id: str):
+            async with session_factory() as db:
+                await AnalyticsService.get_executive_dashboard_cached(db, user_id)
+        
+        warmer.register("executive_dashboard", discover, warm, limit=settings.WARMUP_TOP_USERS)
     
     @staticmethod
     async def get_operational_dashboard(
@@ -71,50 +96,7 @@ class AnalyticsService:
         user_id: str
     ) -> Dict[str, Any]:
         """Obter dashboard operacional"""
-        try:
-            # Status em tempo real
-            real_time_status = await AnalyticsService._get_real_time_status(db, user_id)
-            
-            # Performance por equipe
-            team_performance = await AnalyticsService._get_team_performance(db, user_id)
-            
-            # Alertas ativos
-            active_alerts = await AnalyticsService._get_active_alerts(db, user_id)
-            
-            # Métricas de qualidade
-            quality_metrics = await AnalyticsService._get_quality_metrics(db, user_id)
-            
-            widgets = [
-                {
-                    "id": "real_time_status",
-                    "type": "status_board",
-                    "title": "Status em Tempo Real",
-                    "data": real_time_status
-                },
-                {
-                    "id": "team_performance",
-                    "type": "table",
-                    "title": "Performance por Equipe",
-                    "data": team_performance
-                },
-                {
-                    "id": "active_alerts",
-                    "type": "alert_list",
-                    "title": "Alertas Ativos",
-                    "data": active_alerts
-                },
-                {
-                    "id": "quality_metrics",
-                    "type": "gauge_chart",
-                    "title": "Métricas de Qualidade",
-                    "data": quality_metrics
-                }
-            ]
-            
-            return {"widgets": widgets}
-            
-        except Exception as e:
-            raise e
+        return await dashboard_executor.run(OPERATIONAL_WIDGETS, user_id, db=db)
     
     @staticmethod
     async def get_technical_dashboard(
@@ -122,50 +104,7 @@ class AnalyticsService:
         user_id: str
     ) -> Dict[str, Any]:
         """Obter dashboard técnico"""
-        try:
-            # Métricas de desenvolvimento
-            dev_metrics = await AnalyticsService._get_development_metrics(db, user_id)
-            
-            # Testes e qualidade
-            test_metrics = await AnalyticsService._get_test_metrics(db, user_id)
-            
-            # Deploy e produção
-            deployment_metrics = await AnalyticsService._get_deployment_metrics(db, user_id)
-            
-            # Performance técnica
-            performance_metrics = await AnalyticsService._get_performance_metrics(db, user_id)
-            
-            widgets = [
-                {
-                    "id": "dev_metrics",
-                    "type": "metrics",
-                    "title": "Métricas de Desenvolvimento",
-                    "data": dev_metrics
-                },
-                {
-                    "id": "test_metrics",
-                    "type": "chart",
-                    "title": "Testes e Qualidade",
-                    "data": test_metrics
-                },
-                {
-                    "id": "deployment_metrics",
-                    "type": "chart",
-                    "title": "Deploy e Produção",
-                    "data": deployment_metrics
-                },
-                {
-                    "id": "performance_metrics",
-                    "type": "chart",
-                    "title": "Performance Técnica",
-                    "data": performance_metrics
-                }
-            ]
-            
-            return {"widgets": widgets}
-            
-        except Exception as e:
-            raise e
+        return await dashboard_executor.run(TECHNICAL_WIDGETS, user_id, db=db)
     
     @staticmethod
     async def get_custom_dashboard(
@@ -173,14 +112,31 @@ class AnalyticsService:
         dashboard_id: str,
         user_id: str
     ) -> Optional[Dict[str, Any]]:
-        """Obter dashboard customizado"""
-        try:
-            # Implementar busca de dashboard customizado
-            # Por enquanto, retorna None
+        """
+        Dashboard salvo em analytics_dashboards (próprio ou público). Cada
+        widget traz uma consulta (`query`, ver columnar_store.WidgetQuery)
+        executada sobre os snapshots colunares, nunca no banco principal; o
+        resultado informa de quando é o snapshot usado
+        """
+        c = custom_dashboards.c
+        row = (await db.execute(
+            select(c.id, c.name, c.description, c.dashboard_config).where(
+                c.id == dashboard_id, c.is_active.is_(True), or_(c.created_by == user_id, c.is_public.is_(True))
+            )
+        )).first()
+        if row is None:
             return None
-            
-        except Exception as e:
-            raise e
+        
+        widgets = [
+            WidgetSpec(
+                str(widget.get("id") or index), widget.get("type", "table"), widget.get("title", ""),
+                lambda _db, owner, query=widget.get("query") or {}: columnar_store.query(query, owner)
+            )
+            for index, widget in enumerate((row.dashboard_config or {}).get("widgets") or ())
+        ]
+        # Os widgets não usam sessão: uma "fábrica" vazia libera a execução em paralelo
+        result = await dashboard_executor.run(widgets, user_id, session_factory=nullcontext)
+        return {"id": str(row.id), "name": row.name, "description": row.description, **result}
     
     @staticmethod
     async def get_roi_metrics(
@@ -189,52 +145,25 @@ class AnalyticsService:
         period: str = "30d"
     ) -> Dict[str, Any]:
         """Obter métricas de ROI"""
-        try:
-            # Calcular período
-            end_date = datetime.now()
-            if period == "7d":
-                start_date = end_date - timedelta(days=7)
-            elif period == "30d":
-                start_date = end_date - timedelta(days=30)
-            elif period == "90d":
-                start_date = end_date - timedelta(days=90)
-            elif period == "1y":
-                start_date = end_date - timedelta(days=365)
-            else:
-                start_date = datetime.min
-            
-            # Buscar projetos no período
-            query = select(Project).where(
-                and_(
-                    Project.created_by == user_id,
-                    Project.created_at >= start_date,
-                    Project.created_at <= end_date
-                )
-            )
-            
-            result = await db.execute(query)
-            projects = result.scalars().all()
-            
-            # Calcular métricas
-            total_roi = sum(p.roi_actual or 0 for p in projects)
-            avg_roi = total_roi / len(projects) if projects else 0
-            total_investment = sum(p.estimated_effort or 0 for p in projects)
-            total_return = total_roi + total_investment
-            
-            roi_percentage = (total_roi / total_investment * 100) if total_investment > 0 else 0
-            
-            return {
-                "period": period,
-                "total_roi": total_roi,
-                "average_roi": avg_roi,
-                "total_investment": total_investment,
-                "total_return": total_return,
-                "roi_percentage": roi_percentage,
-                "project_count": len(projects)
-            }
-            
-        except Exception as e:
-            raise e
+        window = resolve_period(period)
+        kpis = await aggregate_kpis(
+            db, Project, roi_kpis(Project),
+            Project.created_by == user_id, *window.conditions(Project.created_at)
+        )
+        
+        project_count = kpis["project_count"]
+        total_roi = kpis["total_roi"]
+        total_investment = kpis["total_investment"]
+        
+        return {
+            "period": period,
+            "total_roi": total_roi,
+            "average_roi": total_roi / project_count if project_count else 0,
+            "total_investment": total_investment,
+            "total_return": total_roi + total_investment,
+            "roi_percentage": (total_roi / total_investment * 100) if total_investment > 0 else 0,
+            "project_count": project_count
+        }
     
     @staticmethod
     async def get_productivity_metrics(
@@ -243,52 +172,29 @@ class AnalyticsService:
         period: str = "30d"
     ) -> Dict[str, Any]:
         """Obter métricas de produtividade"""
-        try:
-            # Calcular período
-            end_date = datetime.now()
-            if period == "7d":
-                start_date = end_date - timedelta(days=7)
-            elif period == "30d":
-                start_date = end_date - timedelta(days=30)
-            elif period == "90d":
-                start_date = end_date - timedelta(days=90)
-            elif period == "1y":
-                start_date = end_date - timedelta(days=365)
-            else:
-                start_date = datetime.min
-            
-            # Buscar projetos no período
-            query = select(Project).where(
-                and_(
-                    Project.created_by == user_id,
-                    Project.created_at >= start_date,
-                    Project.created_at <= end_date
-                )
-            )
-            
-            result = await db.execute(query)
-            projects = result.scalars().all()
-            
-            # Calcular métricas de produtividade
-            total_projects = len(projects)
-            completed_projects = len([p for p in projects if p.status in ["deployed", "maintenance"]])
-            completion_rate = (completed_projects / total_projects * 100) if total_projects > 0 else 0
-            
-            avg_effort = sum(p.actual_effort or 0 for p in projects) / len(projects) if projects else 0
-            total_effort = sum(p.actual_effort or 0 for p in projects)
-            
-            return {
-                "period": period,
-                "total_projects": total_projects,
-                "completed_projects": completed_projects,
-                "completion_rate": completion_rate,
-                "average_effort": avg_effort,
-                "total_effort": total_effort,
-                "projects_per_month": total_projects / (period_days / 30) if period_days > 0 else 0
-            }
-            
-        except Exception as e:
-            raise e
+        window = resolve_period(period)
+        kpis = await aggregate_kpis(
+            db, Project, productivity_kpis(Project),
+            Project.created_by == user_id, *window.conditions(Project.created_at)
+        )
+        
+        total_projects = kpis["total_projects"]
+        total_effort = kpis["total_effort"]
+        period_days = window.days
+        first_created_at = kpis["first_created_at"]
+        if period_days is None and first_created_at is not None:
+            end = window.end if first_created_at.tzinfo is None else window.end.astimezone(first_created_at.tzinfo)
+            period_days = (end - first_created_at).total_seconds() / 86400
+        
+        return {
+            "period": period,
+            "total_projects": total_projects,
+            "completed_projects": kpis["completed_projects"],
+            "completion_rate": completion_rate(kpis),
+            "average_effort": total_effort / total_projects if total_projects else 0,
+            "total_effort": total_effort,
+            "projects_per_month": total_projects / (period_days / 30) if period_days else 0
+        }
     
     @staticmethod
     async def get_quality_metrics(
@@ -319,24 +225,28 @@ class AnalyticsService:
         metric: str,
         period: str = "90d"
     ) -> Dict[str, Any]:
-        """Obter análise de tendências"""
-        try:
-            # Implementar análise de tendências
-            # Por enquanto, retorna dados mock
-            return {
-                "metric": metric,
-                "period": period,
-                "trend": "up",
-                "change_percentage": 15.5,
-                "data_points": [
-                    {"date": "2025-01-01", "value": 100},
-                    {"date": "2025-01-15", "value": 115},
-                    {"date": "2025-01-30", "value": 130}
-                ]
-            }
-            
-        except Exception as e:
-            raise e
+        """Obter análise de tendências (varredura nas fatos diárias)"""
+        event_type, aggregate = TREND_METRICS.get(metric, (metric, "sum"))
+        window = resolve_period(period, datetime.utcnow())
+        points = await fact_series(db, event_type, window.start, window.end, user_id=user_id)
+        if aggregate != "avg" and window.start is not None:
+            points = fill_days(points, window.start.date(), window.end.date())
+        if window.days is None or window.days > 120:
+            points = rebucket(points, "week")
+        
+        data_points = [
+            {"date": point.bucket.isoformat(), "value": point.value(aggregate)}
+            for point in points if point.value(aggregate) is not None
+        ]
+        change = AnalyticsService._change_percentage([p["value"] for p in data_points])
+        
+        return {
+            "metric": metric,
+            "period": period,
+            "trend": "up" if change > 0 else "down" if change < 0 else "stable",
+            "change_percentage": round(change, 2),
+            "data_points": data_points
+        }
     
     @staticmethod
     async def get_predictions(
@@ -345,23 +255,70 @@ class AnalyticsService:
         metric: str,
         horizon: int = 30
     ) -> Dict[str, Any]:
-        """Obter previsões baseadas em IA"""
-        try:
-            # Implementar previsões com IA
-            # Por enquanto, retorna dados mock
-            return {
-                "metric": metric,
-                "horizon": horizon,
-                "predictions": [
-                    {"date": "2025-02-01", "value": 145, "confidence": 0.85},
-                    {"date": "2025-02-15", "value": 160, "confidence": 0.80},
-                    {"date": "2025-02-28", "value": 175, "confidence": 0.75}
-                ],
-                "model_accuracy": 0.87
-            }
-            
-        except Exception as e:
-            raise e
+        """Obter previsões (modelo escolhido por série entre linear, Holt e Holt-Winters)"""
+        event_type, aggregate = TREND_METRICS.get(metric, (metric, "sum"))
+        window = resolve_period("90d", datetime.utcnow())
+        start, end = window.start.date(), window.end.date()
+        points = {
+            point.bucket: point.value(aggregate)
+            for point in await fact_series(db, event_type, window.start, window.end, user_id=user_id)
+        }
+        # Dias sem fatos: zero para contagens/somas, último valor conhecido para médias
+        empty = np.nan if aggregate == "avg" else 0.0
+        values = [points.get(start + timedelta(days=i)) for i in range((end - start).days + 1)]
+        history = np.array([empty if value is None else value for value in values])
+        observed = np.flatnonzero(~np.isnan(history))
+        # Médias só começam no primeiro valor registrado
+        history = history[observed[0]:] if len(observed) else history[:0]
+        if len(history) < 3:
+            return {"metric": metric, "horizon": horizon, "model": None, "predictions": [], "model_accuracy": None}
+        
+        non_negative = aggregate != "avg"
+        result = forecasting.forecast(history, horizon, non_negative=non_negative)
+        model = str(result.model[0])
+        return {
+            "metric": metric,
+            "horizon": horizon,
+            "model": model,
+            "confidence_level": result.level,
+            "predictions": [
+                {
+                    "date": (end + timedelta(days=step + 1)).isoformat(),
+                    "value": round(float(result.mean[0, step]), 4),
+                    "lower": round(float(result.lower[0, step]), 4),
+                    "upper": round(float(result.upper[0, step]), 4)
+                }
+                for step in range(horizon)
+            ],
+            "model_accuracy": forecasting.accuracy(
+                history, min(horizon, 14), model=model, non_negative=non_negative
+            )
+        }
+    
+    @staticmethod
+    async def get_project_predictions(
+        db: AsyncSession,
+        user_id: str,
+        metric: str,
+        horizon: int = 30
+    ) -> Dict[str, Any]:
+        """Previsão por projeto: uma consulta e um ajuste em lote para todas as séries"""
+        event_type, aggregate = TREND_METRICS.get(metric, (metric, "sum"))
+        window = resolve_period("90d", datetime.utcnow())
+        projects, days, matrix = await fact_matrix(
+            db, event_type, window.start.date(), window.end.date(), aggregate, user_id=user_id
+        )
+        if not projects:
+            return {"metric": metric, "horizon": horizon, "projects": {}}
+        
+        result = forecasting.forecast(matrix, horizon, non_negative=aggregate != "avg")
+        return {
+            "metric": metric,
+            "horizon": horizon,
+            "start_date": (days[-1] + timedelta(days=1)).isoformat(),
+            "confidence_level": result.level,
+            "projects": {project: result.series(i) for i, project in enumerate(projects)}
+        }
     
     @staticmethod
     async def generate_report(
@@ -369,26 +326,14 @@ class AnalyticsService:
         user_id: str,
         report_type: str,
         filters: Dict[str, Any],
-        format: str = "json"
-    ) -> Dict[str, Any]:
-        """Gerar relatório personalizado"""
-        try:
-            # Implementar geração de relatórios
-            # Por enquanto, retorna dados mock
-            return {
-                "report_type": report_type,
-                "format": format,
-                "generated_at": datetime.now().isoformat(),
-                "data": {
-                    "summary": "Relatório gerado com sucesso",
-                    "metrics": {},
-                    "charts": {},
-                    "recommendations": []
-                }
-            }
-            
-        except Exception as e:
-            raise e
+        format: str = "csv"
+    ) -> StreamingResponse:
+        """
+        Relatório em streaming (csv, xlsx, parquet ou json em linhas), lido
+        direto de um cursor do servidor
+        """
+        spec = validate_report(report_type, format, filters or {})
+        return report_exporter.response(db, spec, user_id, filters or {}, format)
     
     @staticmethod
     async def get_alerts(
@@ -434,17 +379,14 @@ class AnalyticsService:
     ) -> Dict[str, Any]:
         """Obter KPIs principais"""
         try:
-            # Calcular KPIs principais
-            total_projects = await AnalyticsService._count_projects(db, user_id)
-            active_projects = await AnalyticsService._count_active_projects(db, user_id)
-            avg_roi = await AnalyticsService._calculate_average_roi(db, user_id)
-            completion_rate = await AnalyticsService._calculate_completion_rate(db, user_id)
+            # Calcular KPIs principais (uma consulta)
+            kpis = await AnalyticsService._get_project_kpis(db, user_id)
             
             return {
-                "total_projects": total_projects,
-                "active_projects": active_projects,
-                "average_roi": avg_roi,
-                "completion_rate": completion_rate,
+                "total_projects": kpis["total_projects"],
+                "active_projects": kpis["active_projects"],
+                "average_roi": kpis["average_roi"],
+                "completion_rate": completion_rate(kpis),
                 "productivity_score": 85.5,
                 "quality_score": 92.0
             }
@@ -457,50 +399,43 @@ class AnalyticsService:
         db: AsyncSession,
         user_id: str
     ) -> Dict[str, Any]:
-        """Obter métricas de performance em tempo real"""
-        try:
-            # Implementar métricas em tempo real
-            # Por enquanto, retorna dados mock
-            return {
-                "active_automations": 15,
-                "success_rate": 98.5,
-                "average_response_time": 2.3,
-                "throughput": 150,
-                "error_rate": 1.5,
-                "uptime": 99.9
-            }
-            
-        except Exception as e:
-            raise e
+        """
+        Métricas de performance em tempo real (último tick do canal; para
+        acompanhar continuamente, assine o stream SSE em vez de consultar)
+        """
+        return await performance_channel.get_current()
     
     # Métodos auxiliares privados
     @staticmethod
     async def _get_main_kpis(db: AsyncSession, user_id: str) -> Dict[str, Any]:
         """Obter KPIs principais"""
         try:
-            total_projects = await AnalyticsService._count_projects(db, user_id)
-            active_projects = await AnalyticsService._count_active_projects(db, user_id)
-            avg_roi = await AnalyticsService._calculate_average_roi(db, user_id)
+            kpis = await AnalyticsService._get_project_kpis(db, user_id)
             
             return {
-                "total_projects": total_projects,
-                "active_projects": active_projects,
-                "average_roi": avg_roi,
-                "completion_rate": 75.5
+                "total_projects": kpis["total_projects"],
+                "active_projects": kpis["active_projects"],
+                "average_roi": kpis["average_roi"],
+                "completion_rate": completion_rate(kpis)
             }
         except Exception as e:
             raise e
     
     @staticmethod
     async def _get_trends_data(db: AsyncSession, user_id: str) -> Dict[str, Any]:
-        """Obter dados de tendências"""
-        # Mock data
+        """Projetos criados por mês (últimos 6 meses)"""
+        months = period_starts(datetime.utcnow().date(), "month", 6)
+        points = await fact_series(
+            db, "project.created", datetime.combine(months[0], datetime.min.time()), datetime.utcnow(),
+            user_id=user_id
+        )
+        created = {point.bucket: point.count for point in rebucket(points, "month")}
         return {
-            "labels": ["Jan", "Fev", "Mar", "Abr", "Mai"],
+            "labels": [MONTH_LABELS[month.month - 1] for month in months],
             "datasets": [
                 {
                     "label": "Projetos",
-                    "data": [10, 15, 20, 25, 30]
+                    "data": [created.get(month, 0) for month in months]
                 }
             ]
         }
@@ -528,14 +463,19 @@ class AnalyticsService:
     
     @staticmethod
     async def _get_roi_data(db: AsyncSession, user_id: str) -> Dict[str, Any]:
-        """Obter dados de ROI"""
-        # Mock data
+        """ROI médio registrado por trimestre (últimos 4)"""
+        quarters = period_starts(datetime.utcnow().date(), "quarter", 4)
+        points = await fact_series(
+            db, "project.roi_updated", datetime.combine(quarters[0], datetime.min.time()), datetime.utcnow(),
+            user_id=user_id
+        )
+        roi = {point.bucket: point.avg for point in rebucket(points, "quarter")}
         return {
-            "labels": ["Q1", "Q2", "Q3", "Q4"],
+            "labels": [f"Q{(quarter.month - 1) // 3 + 1}/{quarter.year}" for quarter in quarters],
             "datasets": [
                 {
                     "label": "ROI (%)",
-                    "data": [15, 25, 30, 35]
+                    "data": [round(roi[q], 2) if roi.get(q) is not None else 0 for q in quarters]
                 }
             ]
         }
@@ -626,64 +566,71 @@ class AnalyticsService:
         }
     
     @staticmethod
-    async def _count_projects(db: AsyncSession, user_id: str) -> int:
-        """Contar total de projetos"""
-        try:
-            query = select(func.count(Project.id)).where(Project.created_by == user_id)
-            result = await db.execute(query)
-            return result.scalar()
-        except Exception as e:
-            raise e
-    
-    @staticmethod
-    async def _count_active_projects(db: AsyncSession, user_id: str) -> int:
-        """Contar projetos ativos"""
-        try:
-            query = select(func.count(Project.id)).where(
-                and_(
-                    Project.created_by == user_id,
-                    Project.status.in_(["development", "testing"])
-                )
-            )
-            result = await db.execute(query)
-            return result.scalar()
-        except Exception as e:
-            raise e
+    async def _get_most_active_users(db: AsyncSession, limit: int) -> List[str]:
+        """Usuários com mais projetos em andamento"""
+        query = select(Project.created_by).where(
+            Project.status.in_(ACTIVE_STATUSES)
+        ).group_by(Project.created_by).order_by(
+            func.count(Project.id).desc()
+        ).limit(limit)
+        result = await db.execute(query)
+        return [str(user_id) for user_id in result.scalars().all()]
     
     @staticmethod
-    async def _calculate_average_roi(db: AsyncSession, user_id: str) -> float:
-        """Calcular ROI médio"""
-        try:
-            query = select(func.avg(Project.roi_actual)).where(
-                and_(
-                    Project.created_by == user_id,
-                    Project.roi_actual.isnot(None)
-                )
-            )
-            result = await db.execute(query)
-            avg_roi = result.scalar()
-            return float(avg_roi) if avg_roi else 0.0
-        except Exception as e:
-            raise e
+    def _change_percentage(values: List[float]) -> float:
+        """Variação da média por ponto da segunda metade da série em relação à primeira"""
+        if len(values) < 2:
+            return 0.0
+        middle = len(values) // 2
+        first, second = values[:middle], values[middle:]
+        before, after = sum(first) / len(first), sum(second) / len(second)
+        if before == 0:
+            return 100.0 if after > 0 else 0.0
+        return (after - before) / abs(before) * 100
     
     @staticmethod
-    async def _calculate_completion_rate(db: AsyncSession, user_id: str) -> float:
-        """Calcular taxa de conclusão"""
-        try:
-            total_query = select(func.count(Project.id)).where(Project.created_by == user_id)
-            completed_query = select(func.count(Project.id)).where(
-                and_(
-                    Project.created_by == user_id,
-                    Project.status.in_(["deployed", "maintenance"])
-                )
-            )
-            
-            total_result = await db.execute(total_query)
-            completed_result = await db.execute(completed_query)
-            
-            total = total_result.scalar()
-            completed = completed_result.scalar()
-            
-            return (completed / total * 100) if total > 0 else 0.0
-        except Exception as e:
-            raise e 
\ No newline at end of file
+    async def _get_project_kpis(db: AsyncSession, user_id: str) -> Dict[str, Any]:
+        """Totais, ativos, concluídos e ROI médio do usuário em uma única consulta"""
+        return await aggregate_kpis(db, Project, project_kpis(Project), Project.created_by == user_id)
+
+
+# Widgets de cada dashboard: providers independentes, calculados em paralelo;
+# depends_on diz quais mudanças invalidam o widget no snapshot do usuário
+EXECUTIVE_WIDGETS = (
+    WidgetSpec("main_kpis", "metrics", "KPIs Principais", AnalyticsService._get_main_kpis,
+               depends_on=("projects",)),
+    WidgetSpec("trends_chart", "line_chart", "Tendências", AnalyticsService._get_trends_data,
+               depends_on=("events",)),
+    WidgetSpec("project_distribution", "pie_chart", "Distribuição de Projetos", AnalyticsService._get_project_distribution,
+               depends_on=("projects",)),
+    WidgetSpec("roi_chart", "bar_chart", "ROI por Período", AnalyticsService._get_roi_data,
+               depends_on=("events",)),
+)
+
+OPERATIONAL_WIDGETS = (
+    WidgetSpec("real_time_status", "status_board", "Status em Tempo Real", AnalyticsService._get_real_time_status,
+               depends_on=("deployments",)),
+    WidgetSpec("team_performance", "table", "Performance por Equipe", AnalyticsService._get_team_performance,
+               depends_on=("projects", "tasks")),
+    WidgetSpec("active_alerts", "alert_list", "Alertas Ativos", AnalyticsService._get_active_alerts,
+               depends_on=("projects", "tasks")),
+    WidgetSpec("quality_metrics", "gauge_chart", "Métricas de Qualidade", AnalyticsService._get_quality_metrics,
+               depends_on=("tasks", "deployments")),
+)
+
+TECHNICAL_WIDGETS = (
+    WidgetSpec("dev_metrics", "metrics", "Métricas de Desenvolvimento", AnalyticsService._get_development_metrics,
+               depends_on=("tasks",)),
+    WidgetSpec("test_metrics", "chart", "Testes e Qualidade", AnalyticsService._get_test_metrics,
+               depends_on=("tasks",)),
+    WidgetSpec("deployment_metrics", "chart", "Deploy e Produção", AnalyticsService._get_deployment_metrics,
+               depends_on=("deployments",)),
+    WidgetSpec("performance_metrics", "chart", "Performance Técnica", AnalyticsService._get_performance_metrics,
+               depends_on=("deployments",)),
+)
+
+DASHBOARDS = {
+    "executive": EXECUTIVE_WIDGETS,
+    "operational": OPERATIONAL_WIDGETS,
+    "technical": TECHNICAL_WIDGETS,
+}
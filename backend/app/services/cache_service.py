@@ -0,0 +1,547 @@
+"""
+Cache em dois níveis: LRU em processo (L1) na frente do Redis (L2)
+
+- TTL com jitter, para que chaves gravadas juntas não expirem juntas;
+- single-flight: quando uma chave quente expira, só uma task recalcula o
+  valor e as chamadas concorrentes aguardam o mesmo resultado;
+- invalidação por tag: a chave física embute a geração de cada tag
+  (`project:42#3.7`), então invalidar tudo de um projeto é um INCR e as
+  entradas antigas simplesmente expiram pelo TTL, sem SCAN no Redis;
+- serialização plugável (orjson, json ou msgpack);
+- falha aberta: se o Redis cair, o L1 e o loader continuam atendendo e o L2
+  é ignorado por alguns segundos antes de nova tentativa.
+"""
+
+import asyncio
+import fnmatch
+import inspect
+import json
+import logging
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from app.core.config import settings
+from app.services.monitoring_service import monitoring_service
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# Tag implícita em todas as chaves: incrementá-la invalida o namespace inteiro
+ALL_TAG = "*"
+
+TagsArg = Union[Sequence[str], Callable[..., Sequence[str]]]
+
+CACHE_LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+class JSONSerializer:
+    """JSON (usa orjson quando instalado, exceto com `use_orjson=False`)"""
+
+    name = "json"
+
+    def __init__(self, use_orjson: bool = True):
+        orjson = None
+        if use_orjson:
+            try:
+                import orjson
+            except ImportError:
+                pass
+        self._orjson = orjson
+        if orjson is not None:
+            self.name = "orjson"
+
+    def dumps(self, value: Any) -> bytes:
+        if self._orjson is not None:
+            return self._orjson.dumps(value, option=self._orjson.OPT_NON_STR_KEYS)
+        return json.dumps(value, default=str, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        if self._orjson is not None:
+            return self._orjson.loads(data)
+        return json.loads(data)
+
+
+class MsgpackSerializer:
+    """MessagePack (binário, menor para payloads numéricos)"""
+
+    name = "msgpack"
+
+    def __init__(self):
+        import msgpack
+
+        self._msgpack = msgpack
+
+    def dumps(self, value: Any) -> bytes:
+        return self._msgpack.packb(value, use_bin_type=True, default=str)
+
+    def loads(self, data: bytes) -> Any:
+        return self._msgpack.unpackb(data, raw=False)
+
+
+SERIALIZERS = {
+    "json": lambda: JSONSerializer(use_orjson=False),
+    "orjson": JSONSerializer,
+    "msgpack": MsgpackSerializer,
+}
+
+
+def get_serializer(name: str):
+    try:
+        return SERIALIZERS[name]()
+    except KeyError:
+        raise ValueError(f"Serializador desconhecido: {name} (use {sorted(SERIALIZERS)})")
+
+
+class LRUCache:
+    """LRU em memória com expiração por item"""
+
+    def __init__(self, maxsize: int = 2048, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self._clock = clock
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return _MISSING
+        expires_at, value = item
+        if expires_at <= self._clock():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        self._data[key] = (self._clock() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str) -> bool:
+        return self._data.pop(key, None) is not None
+
+    def delete_pattern(self, pattern: str) -> int:
+        keys = [key for key in self._data if fnmatch.fnmatchcase(key, pattern)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CacheService:
+    """
+    Cache L1 (processo) + L2 (Redis, `redis.asyncio`)
+
+    `redis_client` pode ser injetado (ex.: `fakeredis.FakeAsyncRedis()`);
+    sem ele, o cliente é criado a partir de `url` se o pacote redis existir.
+
+    As gerações das tags ficam no Redis (`<namespace>:tag:<tag>`) e são
+    lidas com MGET no máximo a cada `l1_ttl` segundos por processo; é o mesmo
+    atraso que outro worker já tolera pelo L1. A cópia local é um LRU de até
+    `tag_maxsize` tags. Com o Redis fora, até `max_unsynced` tags aguardam o
+    INCR remoto; acima disso a pendência vira uma invalidação do namespace
+    inteiro.
+    """
+
+    def __init__(self, redis_client=None, url: Optional[str] = None, serializer: str = "orjson",
+                 namespace: str = "milapp", default_ttl: float = 300, ttl_jitter: float = 0.1,
+                 l1_maxsize: int = 2048, l1_ttl: float = 5, retry_after: float = 5.0,
+                 tag_maxsize: int = 4096, max_unsynced: int = 1024,
+                 registry=None, clock: Callable[[], float] = time.monotonic):
+        self.serializer = get_serializer(serializer)
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        self.ttl_jitter = ttl_jitter
+        self.l1_ttl = l1_ttl
+        self.retry_after = retry_after
+        self.tag_maxsize = tag_maxsize
+        self.max_unsynced = max_unsynced
+        self.l1 = LRUCache(l1_maxsize, clock)
+        self._clock = clock
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # tag -> [geração, válida até], em ordem de uso (LRU)
+        self._tag_versions: "OrderedDict[str, List[float]]" = OrderedDict()
+        # Tags invalidadas só localmente (Redis fora) -> INCRs à espera do Redis
+        self._unsynced: Dict[str, int] = {}
+        self._retry_at = 0.0
+        self.redis_client = redis_client if redis_client is not None else self._create_client(url)
+
+        registry = registry or monitoring_service.registry
+        self.requests_total = registry.counter(
+            'milapp_cache_requests_total', 'Consultas ao cache por nível e resultado', ('tier', 'result')
+        )
+        self.operation_seconds = registry.histogram(
+            'milapp_cache_operation_seconds', 'Latência das operações do cache', ('operation',),
+            buckets=CACHE_LATENCY_BUCKETS
+        )
+        self.coalesced_total = registry.counter(
+            'milapp_cache_coalesced_total', 'Chamadas que aguardaram um recálculo em andamento'
+        )
+        self.loads_total = registry.counter(
+            'milapp_cache_loads_total', 'Recálculos de valores ausentes no cache'
+        )
+        self.invalidations_total = registry.counter(
+            'milapp_cache_tag_invalidations_total', 'Tags invalidadas (incremento de geração)'
+        )
+        self.l1_items = registry.gauge('milapp_cache_l1_items', 'Itens no cache L1', multiprocess_mode='sum')
+        self._l1_hit = self.requests_total.labels('l1', 'hit')
+        self._l1_miss = self.requests_total.labels('l1', 'miss')
+        self._l2_hit = self.requests_total.labels('l2', 'hit')
+        self._l2_miss = self.requests_total.labels('l2', 'miss')
+        self._l2_error = self.requests_total.labels('l2', 'error')
+
+    @staticmethod
+    def _create_client(url: Optional[str]):
+        if not url:
+            return None
+        try:
+            from redis import asyncio as aioredis
+        except ImportError:
+            logger.warning("Pacote redis não instalado: cache somente em memória")
+            return None
+        return aioredis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.namespace}:tag:{tag}"
+
+    def _local_generation(self, tag: str) -> int:
+        return int(self._tag_versions.get(tag, (0, 0.0))[0])
+
+    def _remember_tag(self, tag: str, generation: int, expires_at: float):
+        self._tag_versions[tag] = [generation, expires_at]
+        self._tag_versions.move_to_end(tag)
+        # Remove as menos usadas; as pendentes guardam o piso local e ficam
+        for _ in range(len(self._tag_versions) - self.tag_maxsize):
+            tag, entry = self._tag_versions.popitem(last=False)
+            if tag in self._unsynced:
+                self._tag_versions[tag] = entry
+
+    async def tag_versions(self, tags: Iterable[str]) -> Dict[str, int]:
+        """Geração atual de cada tag (0 se nunca invalidada)"""
+        now = self._clock()
+        tags = list(dict.fromkeys(tags))
+        if self._unsynced and self.is_available():
+            await self._sync_invalidations()
+        stale = []
+        for tag in tags:
+            entry = self._tag_versions.get(tag)
+            if entry is None or entry[1] <= now:
+                stale.append(tag)
+            else:
+                self._tag_versions.move_to_end(tag)
+        if stale and self.is_available():
+            started = time.perf_counter()
+            try:
+                values = await self.redis_client.mget([self._tag_key(tag) for tag in stale])
+            except Exception as e:
+                self._l2_failed("tag_versions", e)
+            else:
+                for tag, value in zip(stale, values):
+                    # A geração local é piso: uma invalidação feita com o Redis fora não volta atrás
+                    self._remember_tag(tag, max(int(value or 0), self._local_generation(tag)), now + self.l1_ttl)
+            finally:
+                self.operation_seconds.labels('tag_versions').observe(time.perf_counter() - started)
+        # Sem Redis, vale a última geração conhecida neste processo
+        return {tag: self._local_generation(tag) for tag in tags}
+
+    async def _versioned(self, key: str, tags: Sequence[str]) -> str:
+        ordered = (ALL_TAG,) + tuple(sorted(set(tags) - {ALL_TAG}))
+        versions = await self.tag_versions(ordered)
+        return f"{key}#{'.'.join(str(versions[tag]) for tag in ordered)}"
+
+    async def invalidate_tags(self, *tags: str) -> Dict[str, int]:
+        """
+        Invalida tudo que foi gravado com essas tags (um INCR por tag);
+        retorna a nova geração de cada uma
+        """
+        tags = list(dict.fromkeys(tags))
+        if not tags:
+            return {}
+        now = self._clock()
+        generations = None
+        if self.is_available():
+            try:
+                async with self.redis_client.pipeline(transaction=False) as pipe:
+                    for tag in tags:
+                        pipe.incr(self._tag_key(tag))
+                    generations = await pipe.execute()
+            except Exception as e:
+                self._l2_failed("invalidate_tags", e)
+        if generations is None:
+            # Só local por ora; os INCRs são repetidos quando o Redis voltar (_sync_invalidations)
+            for tag in tags:
+                self._unsynced[tag] = self._unsynced.get(tag, 0) + 1
+            generations = [self._local_generation(tag) + 1 for tag in tags]
+        for tag, generation in zip(tags, generations):
+            generation = max(int(generation), self._local_generation(tag) + 1)
+            self._remember_tag(tag, generation, now + self.l1_ttl)
+        if len(self._unsynced) > self.max_unsynced:
+            self._unsync_all(now)
+        self.invalidations_total.inc(len(tags))
+        return dict(zip(tags, (int(g) for g in generations)))
+
+    def _unsync_all(self, now: float):
+        """
+        Pendências demais com o Redis fora: troca todas por uma invalidação do
+        namespace inteiro (ALL_TAG entra em todas as chaves), já aplicada aqui
+        """
+        pending = self._unsynced.pop(ALL_TAG, 0)
+        for tag in self._unsynced:
+            # O piso de cada tag deixa de ser necessário; sem ele o processo volta às gerações do Redis
+            self._tag_versions.pop(tag, None)
+        self._unsynced = {ALL_TAG: pending + 1}
+        self._remember_tag(ALL_TAG, self._local_generation(ALL_TAG) + 1, now + self.l1_ttl)
+        logger.warning(f"Mais de {self.max_unsynced} tags invalidadas com o Redis fora: o namespace será invalidado")
+
+    async def _sync_invalidations(self):
+        """Repete no Redis os INCR das invalidações feitas enquanto ele estava fora"""
+        pending = dict(self._unsynced)
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for tag, count in pending.items():
+                    pipe.incrby(self._tag_key(tag), count)
+                generations = await pipe.execute()
+        except Exception as e:
+            self._l2_failed("sync_invalidations", e)
+            return
+        for tag, generation in zip(pending, generations):
+            remaining = self._unsynced.get(tag, 0) - pending[tag]
+            if remaining > 0:
+                self._unsynced[tag] = remaining
+            else:
+                self._unsynced.pop(tag, None)
+            self._remember_tag(tag, max(int(generation), self._local_generation(tag)), self._clock() + self.l1_ttl)
+
+    async def invalidate_all(self) -> int:
+        """Invalida o namespace inteiro; retorna a nova geração"""
+        return (await self.invalidate_tags(ALL_TAG))[ALL_TAG]
+
+    def _ttl(self, ttl: Optional[float]) -> float:
+        ttl = self.default_ttl if ttl is None else ttl
+        if self.ttl_jitter and ttl > 0:
+            ttl *= 1 + random.uniform(-self.ttl_jitter, self.ttl_jitter)
+        return ttl
+
+    def is_available(self) -> bool:
+        """Redis configurado e sem falha recente"""
+        return self.redis_client is not None and self._clock() >= self._retry_at
+
+    def _l2_failed(self, operation: str, error: Exception):
+        self._retry_at = self._clock() + self.retry_after
+        self._l2_error.inc()
+        logger.warning(f"Redis indisponível em {operation}: {error}")
+
+    async def ping(self) -> bool:
+        if self.redis_client is None:
+            return False
+        try:
+            await self.redis_client.ping()
+        except Exception as e:
+            self._l2_failed("ping", e)
+            return False
+        self._retry_at = 0.0
+        return True
+
+    async def get(self, key: str, default: Any = None, tags: Sequence[str] = ()) -> Any:
+        value = await self._get(await self._versioned(key, tags))
+        return default if value is _MISSING else value
+
+    async def _get(self, key: str) -> Any:
+        started = time.perf_counter()
+        value = self.l1.get(key)
+        if value is not _MISSING:
+            self._l1_hit.inc()
+            self.operation_seconds.labels('get_l1').observe(time.perf_counter() - started)
+            return value
+        self._l1_miss.inc()
+
+        if not self.is_available():
+            return _MISSING
+        try:
+            raw, remaining = await self._l2_get(self._key(key))
+        except Exception as e:
+            self._l2_failed("get", e)
+            return _MISSING
+        finally:
+            self.operation_seconds.labels('get_l2').observe(time.perf_counter() - started)
+        if raw is None:
+            self._l2_miss.inc()
+            return _MISSING
+        self._l2_hit.inc()
+        value = self.serializer.loads(raw)
+        self.l1.set(key, value, min(self.l1_ttl, remaining) if remaining > 0 else self.l1_ttl)
+        return value
+
+    async def _l2_get(self, full_key: str) -> Tuple[Optional[bytes], float]:
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.get(full_key)
+            pipe.pttl(full_key)
+            raw, pttl = await pipe.execute()
+        return raw, (pttl / 1000 if pttl and pttl > 0 else 0.0)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None, tags: Sequence[str] = ()):
+        await self._set(await self._versioned(key, tags), value, ttl)
+
+    async def _set(self, key: str, value: Any, ttl: Optional[float]):
+        ttl = self._ttl(ttl)
+        self.l1.set(key, value, min(self.l1_ttl, ttl))
+        self.l1_items.set(len(self.l1))
+        if not self.is_available() or ttl <= 0:
+            return
+        started = time.perf_counter()
+        try:
+            await self.redis_client.set(self._key(key), self.serializer.dumps(value), px=int(ttl * 1000))
+        except Exception as e:
+            self._l2_failed("set", e)
+        finally:
+            self.operation_seconds.labels('set').observe(time.perf_counter() - started)
+
+    async def delete(self, *keys: str, tags: Sequence[str] = ()) -> int:
+        keys = [await self._versioned(key, tags) for key in keys]
+        for key in keys:
+            self.l1.delete(key)
+        if not keys or not self.is_available():
+            return 0
+        try:
+            return await self.redis_client.delete(*(self._key(key) for key in keys))
+        except Exception as e:
+            self._l2_failed("delete", e)
+            return 0
+
+    async def delete_pattern(self, pattern: str, batch: int = 500) -> int:
+        """
+        Remove chaves físicas por padrão glob (SCAN + UNLINK); retorna quantas
+        foram removidas do Redis (ou do L1, sem Redis)
+
+        Percorre o keyspace inteiro: para invalidar dados da aplicação use
+        `invalidate_tags`, e deixe este método para manutenção.
+        """
+        deleted_l1 = self.l1.delete_pattern(pattern)
+        if not self.is_available():
+            return deleted_l1
+        deleted = 0
+        started = time.perf_counter()
+        try:
+            pending = []
+            async for full_key in self.redis_client.scan_iter(match=self._key(pattern), count=batch):
+                pending.append(full_key)
+                if len(pending) >= batch:
+                    deleted += await self.redis_client.unlink(*pending)
+                    pending = []
+            if pending:
+                deleted += await self.redis_client.unlink(*pending)
+        except Exception as e:
+            self._l2_failed("delete_pattern", e)
+        finally:
+            self.operation_seconds.labels('delete_pattern').observe(time.perf_counter() - started)
+        return deleted
+
+    async def get_or_set(self, key: str, loader: Callable[[], Union[Any, Awaitable[Any]]],
+                         ttl: Optional[float] = None, tags: Sequence[str] = ()) -> Any:
+        """
+        Valor do cache ou, na ausência, resultado de `loader` (gravado em L1/L2).
+        Chamadas concorrentes para a mesma chave compartilham um único loader,
+        que roda numa task própria: cancelar quem o disparou não cancela o
+        recálculo nem propaga o cancelamento a quem aguarda.
+        """
+        key = await self._versioned(key, tags)
+        value = await self._get(key)
+        if value is not _MISSING:
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = asyncio.create_task(self._load(key, loader, ttl), name=f"cache-load:{key}")
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda task: self._load_done(key, task))
+        else:
+            self.coalesced_total.inc()
+        return await asyncio.shield(inflight)
+
+    async def _load(self, key: str, loader: Callable[[], Union[Any, Awaitable[Any]]],
+                    ttl: Optional[float]) -> Any:
+        self.loads_total.inc()
+        started = time.perf_counter()
+        value = loader()
+        if inspect.isawaitable(value):
+            value = await value
+        self.operation_seconds.labels('load').observe(time.perf_counter() - started)
+        await self._set(key, value, ttl)
+        return value
+
+    def _load_done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Evita "exception was never retrieved" quando todos os que aguardavam foram cancelados
+        if not task.cancelled():
+            task.exception()
+
+    def cached(self, key: Callable[..., str], ttl: Optional[float] = None, tags: TagsArg = ()):
+        """
+        Decorator para funções assíncronas; `tags` pode ser uma lista fixa ou
+        uma função dos mesmos argumentos:
+
+            @cache_service.cached(lambda id: f"project:{id}", tags=lambda id: [f"project:{id}"])
+        """
+        def decorator(func):
+            async def wrapper(*args, **kwargs):
+                key_tags = tags(*args, **kwargs) if callable(tags) else tags
+                return await self.get_or_set(
+                    key(*args, **kwargs), lambda: func(*args, **kwargs), ttl, key_tags
+                )
+            wrapper.__name__ = func.__name__
+            wrapper.__doc__ = func.__doc__
+            return wrapper
+        return decorator
+
+    def stats(self) -> Dict[str, Any]:
+        def ratio(hits, misses):
+            total = hits.value + misses.value
+            return round(hits.value / total, 4) if total else None
+
+        return {
+            'available': self.is_available(),
+            'serializer': self.serializer.name,
+            'l1_items': len(self.l1),
+            'l1_hit_ratio': ratio(self._l1_hit, self._l1_miss),
+            'l2_hit_ratio': ratio(self._l2_hit, self._l2_miss),
+            'l2_errors': self._l2_error.value,
+            'coalesced': self.coalesced_total.value,
+            'loads': self.loads_total.value,
+            'inflight': len(self._inflight),
+            'tags_tracked': len(self._tag_versions),
+            'tags_unsynced': len(self._unsynced)
+        }
+
+    async def close(self):
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.aclose()
+            except AttributeError:
+                await self.redis_client.close()
+
+
+cache_service = CacheService(
+    url=settings.REDIS_URL,
+    serializer=settings.CACHE_SERIALIZER,
+    namespace=settings.CACHE_NAMESPACE,
+    default_ttl=settings.CACHE_DEFAULT_TTL_SECONDS,
+    ttl_jitter=settings.CACHE_TTL_JITTER,
+    l1_maxsize=settings.CACHE_L1_MAX_ITEMS,
+    l1_ttl=settings.CACHE_L1_TTL_SECONDS,
+    tag_maxsize=settings.CACHE_TAG_MAX_ITEMS,
+    max_unsynced=settings.CACHE_MAX_UNSYNCED_TAGS
+)
@@ -0,0 +1,564 @@
+"""
+Snapshots colunares (Parquet + Arrow) para os dashboards customizados
+
+Os widgets de dashboards customizados fazem filtros e agrupamentos livres
+sobre projetos, tarefas e deploys. Em vez de varrer as tabelas OLTP (e os
+work items guardados em JSONB dentro de `projects`) a cada visualização,
+`ColumnarSnapshotJob` copia periodicamente cada fonte para um arquivo Parquet
+em COLUMNAR_SNAPSHOT_DIR, lendo de um cursor do servidor em lotes (de
+preferência numa réplica: COLUMNAR_SNAPSHOT_DATABASE_URL). O arquivo novo
+substitui o anterior com `os.replace`, então leitores nunca veem um snapshot
+pela metade.
+
+`ColumnarStore.query` executa a consulta de um widget (`WidgetQuery`) com
+pyarrow.compute sobre a tabela Arrow carregada em memória (recarregada
+quando o arquivo muda): sem nenhum acesso ao banco principal. Todo resultado
+leva o momento do snapshot e a idade em segundos, e toda consulta é
+restrita às linhas do próprio usuário.
+
+O job roda no processo worker (app.worker); os processos da API só leem os
+arquivos, então COLUMNAR_SNAPSHOT_DIR deve ser compartilhado entre eles.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import JSON, Column as SAColumn, DateTime, Integer, MetaData, Numeric, String, Table, select
+from sqlalchemy.sql import Select
+
+from app.core.config import settings
+from app.services.kpi_aggregation import resolve_period
+from app.services.monitoring_service import monitoring_service
+from app.services.report_export import Column, ParquetWriter
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_AT_KEY = b"milapp.snapshot_at"
+
+metadata = MetaData()
+projects = Table(
+    "projects", metadata,
+    SAColumn("id", String(36), primary_key=True),
+    SAColumn("name", String(255)),
+    SAColumn("type", String(50)),
+    SAColumn("status", String(50)),
+    SAColumn("priority", String(20)),
+    SAColumn("created_by", String(36)),
+    SAColumn("roi_target", Numeric(10, 2)),
+    SAColumn("roi_actual", Numeric(10, 2)),
+    SAColumn("estimated_effort", Integer),
+    SAColumn("actual_effort", Integer),
+    SAColumn("work_items", JSON),
+    SAColumn("created_at", DateTime(timezone=True)),
+    SAColumn("updated_at", DateTime(timezone=True)),
+)
+deployments = Table(
+    "deployments", metadata,
+    SAColumn("id", String(36), primary_key=True),
+    SAColumn("name", String(255)),
+    SAColumn("status", String(20)),
+    SAColumn("progress_percentage", Integer),
+    SAColumn("target_environment_id", String(36)),
+    SAColumn("initiated_by", String(36)),
+    SAColumn("started_at", DateTime(timezone=True)),
+    SAColumn("completed_at", DateTime(timezone=True)),
+    SAColumn("created_at", DateTime(timezone=True)),
+)
+
+
+@dataclass(frozen=True)
+class SnapshotSource:
+    """
+    Fonte de snapshot: colunas (tipos do report_export), a consulta e a
+    conversão de um lote de linhas do banco em linhas do snapshot; `owner` é
+    a coluna que identifica o dono de cada linha
+    """
+    name: str
+    columns: Sequence[Column]
+    query: Callable[[], Select]
+    rows: Callable[[Sequence[Any]], List[Tuple[Any, ...]]] = lambda batch: [tuple(row) for row in batch]
+    owner: str = "created_by"
+
+
+def _timestamp(value: Any) -> Optional[datetime]:
+    """Datas gravadas como texto dentro do JSONB dos work items"""
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _int(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _task_rows(batch: Sequence[Any]) -> List[Tuple[Any, ...]]:
+    """Um projeto vira uma linha por work item (o JSONB é desaninhado aqui, fora do banco)"""
+    rows = []
+    for project in batch:
+        for item in project.work_items or ():
+            if not isinstance(item, dict):
+                continue
+            rows.append((
+                item.get("id"), str(project.id), str(project.created_by) if project.created_by else None,
+                item.get("type"), item.get("status"), item.get("priority"), _int(item.get("story_points")),
+                len(item.get("subtasks") or ()), _timestamp(item.get("created_at")),
+                _timestamp(item.get("updated_at"))
+            ))
+    return rows
+
+
+def _deployment_rows(batch: Sequence[Any]) -> List[Tuple[Any, ...]]:
+    rows = []
+    for row in batch:
+        duration = None
+        if row.started_at is not None and row.completed_at is not None:
+            duration = (row.completed_at - row.started_at).total_seconds() / 60
+        rows.append((*row, duration))
+    return rows
+
+
+SOURCES: Dict[str, SnapshotSource] = {source.name: source for source in (
+    SnapshotSource(
+        "projects",
+        (("id", "string"), ("name", "string"), ("type", "string"), ("status", "string"), ("priority", "string"),
+         ("created_by", "string"), ("roi_target", "float"), ("roi_actual", "float"), ("estimated_effort", "int"),
+         ("actual_effort", "int"), ("created_at", "datetime"), ("updated_at", "datetime")),
+        lambda: select(
+            projects.c.id, projects.c.name, projects.c.type, projects.c.status, projects.c.priority,
+            projects.c.created_by, projects.c.roi_target, projects.c.roi_actual, projects.c.estimated_effort,
+            projects.c.actual_effort, projects.c.created_at, projects.c.updated_at
+        )
+    ),
+    SnapshotSource(
+        "tasks",
+        (("id", "string"), ("project_id", "string"), ("created_by", "string"), ("type", "string"),
+         ("status", "string"), ("priority", "string"), ("story_points", "int"), ("subtasks", "int"),
+         ("created_at", "datetime"), ("updated_at", "datetime")),
+        lambda: select(projects.c.id, projects.c.created_by, projects.c.work_items),
+        rows=_task_rows
+    ),
+    SnapshotSource(
+        "deployments",
+        (("id", "string"), ("name", "string"), ("status", "string"), ("progress_percentage", "int"),
+         ("target_environment_id", "string"), ("initiated_by", "string"), ("started_at", "datetime"),
+         ("completed_at", "datetime"), ("created_at", "datetime"), ("duration_minutes", "float")),
+        lambda: select(
+            deployments.c.id, deployments.c.name, deployments.c.status, deployments.c.progress_percentage,
+            deployments.c.target_environment_id, deployments.c.initiated_by, deployments.c.started_at,
+            deployments.c.completed_at, deployments.c.created_at
+        ),
+        rows=_deployment_rows,
+        owner="initiated_by"
+    ),
+)}
+
+FILTER_OPS = ("eq", "ne", "gt", "gte", "lt", "lte", "in", "not_in", "is_null", "not_null")
+AGGREGATES = {"count": "count", "count_distinct": "count_distinct", "sum": "sum", "avg": "mean",
+              "min": "min", "max": "max"}
+BUCKET_UNITS = ("day", "week", "month", "quarter", "year")
+
+
+@dataclass(frozen=True)
+class Metric:
+    agg: str
+    column: Optional[str]
+    alias: str
+
+
+@dataclass(frozen=True)
+class WidgetQuery:
+    """
+    Consulta de widget, no formato gravado em `dashboard_config`:
+
+        {"source": "tasks", "filters": [{"column": "status", "op": "in", "value": ["todo"]}],
+         "period": {"column": "created_at", "value": "90d"},
+         "bucket": {"column": "created_at", "unit": "month"},
+         "group_by": ["type"], "metrics": [{"agg": "count"}, {"agg": "sum", "column": "story_points"}],
+         "order_by": "-count", "limit": 20}
+    """
+    source: str
+    filters: Tuple[Tuple[str, str, Any], ...] = ()
+    period: Optional[Tuple[str, str]] = None
+    bucket: Optional[Tuple[str, str]] = None
+    group_by: Tuple[str, ...] = ()
+    metrics: Tuple[Metric, ...] = (Metric("count", None, "count"),)
+    order_by: Tuple[Tuple[str, str], ...] = ()
+    limit: int = 100
+
+    @classmethod
+    def parse(cls, spec: Dict[str, Any], max_rows: int = 1000) -> "WidgetQuery":
+        """Valida a especificação contra as colunas da fonte (ValueError se inválida)"""
+        source = SOURCES.get(spec.get("source"))
+        if source is None:
+            raise ValueError(f"Fonte desconhecida: {spec.get('source')} (use {', '.join(SOURCES)})")
+        columns = dict(source.columns)
+
+        def column(name: Any, kinds: Optional[Tuple[str, ...]] = None) -> str:
+            if name not in columns:
+                raise ValueError(f"Coluna desconhecida em {source.name}: {name}")
+            if kinds and columns[name] not in kinds:
+                raise ValueError(f"Coluna {name} não é do tipo {' ou '.join(kinds)}")
+            return name
+
+        filters = []
+        for item in spec.get("filters") or ():
+            op = item.get("op", "eq")
+            if op not in FILTER_OPS:
+                raise ValueError(f"Operador inválido: {op} (use {', '.join(FILTER_OPS)})")
+            value = item.get("value")
+            if op in ("in", "not_in") and not isinstance(value, list):
+                raise ValueError(f"O operador {op} requer uma lista")
+            if columns.get(item.get("column")) == "datetime" and isinstance(value, str):
+                value = _timestamp(value)
+                if value is None:
+                    raise ValueError(f"Data inválida em {item.get('column')}: {item.get('value')}")
+            filters.append((column(item.get("column")), op, value))
+
+        period = None
+        if spec.get("period"):
+            period = (column(spec["period"].get("column"), ("datetime",)), spec["period"].get("value", "30d"))
+            resolve_period(period[1])  # Valida o formato já aqui
+
+        bucket = None
+        if spec.get("bucket"):
+            unit = spec["bucket"].get("unit", "day")
+            if unit not in BUCKET_UNITS:
+                raise ValueError(f"Unidade inválida: {unit} (use {', '.join(BUCKET_UNITS)})")
+            bucket = (column(spec["bucket"].get("column"), ("datetime",)), unit)
+
+        metrics = []
+        for item in spec.get("metrics") or ({"agg": "count"},):
+            agg = item.get("agg")
+            if agg not in AGGREGATES:
+                raise ValueError(f"Agregação inválida: {agg} (use {', '.join(AGGREGATES)})")
+            target = None
+            if agg != "count" or item.get("column"):
+                target = column(item.get("column"), ("int", "float") if agg in ("sum", "avg") else None)
+            metrics.append(Metric(agg, target, item.get("alias") or (f"{agg}_{target}" if target else agg)))
+
+        group_by = tuple(column(name) for name in spec.get("group_by") or ())
+        outputs = ([bucket[0]] if bucket else []) + list(group_by) + [metric.alias for metric in metrics]
+        if len(set(outputs)) != len(outputs):
+            raise ValueError("Nomes de saída repetidos: use alias nas métricas")
+
+        order_by = []
+        for name in ([spec["order_by"]] if isinstance(spec.get("order_by"), str) else spec.get("order_by") or ()):
+            descending = name.startswith("-")
+            name = name.lstrip("-")
+            if name not in outputs:
+                raise ValueError(f"Ordenação por coluna fora do resultado: {name}")
+            order_by.append((name, "descending" if descending else "ascending"))
+
+        return cls(
+            source=source.name, filters=tuple(filters), period=period, bucket=bucket, group_by=group_by,
+            metrics=tuple(metrics), order_by=tuple(order_by), limit=max(1, min(int(spec.get("limit", 100)), max_rows))
+        )
+
+
+@dataclass
+class _Loaded:
+    mtime_ns: int
+    table: Any
+    snapshot_at: Optional[datetime]
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Snapshots colunares requerem o pacote pyarrow") from e
+    return pa, pc, pq
+
+
+class ColumnarStore:
+    """Grava (refresh) e consulta (query) os snapshots Parquet de `sources`"""
+
+    def __init__(self, directory: str, database_url: Optional[str] = None, engine=None,
+                 sources: Optional[Dict[str, SnapshotSource]] = None, batch_size: int = 5000,
+                 max_rows: int = 1000, registry=None):
+        self.directory = Path(directory)
+        self.database_url = database_url
+        self._engine = engine
+        self._sessionmaker = None
+        self.sources = sources or SOURCES
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self._loaded: Dict[str, _Loaded] = {}
+
+        registry = registry or monitoring_service.registry
+        self.query_seconds = registry.histogram(
+            'milapp_columnar_query_seconds', 'Consultas de widget sobre os snapshots colunares', ('source',),
+            buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+        )
+        self.refresh_seconds = registry.histogram(
+            'milapp_columnar_refresh_seconds', 'Duração da gravação de cada snapshot', ('source',),
+            buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0)
+        )
+        self.snapshot_rows = registry.gauge(
+            'milapp_columnar_snapshot_rows', 'Linhas no último snapshot gravado', ('source',),
+            multiprocess_mode='max'
+        )
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine
+
+            from app.services.job_queue import async_database_url
+
+            self._engine = create_async_engine(
+                async_database_url(self.database_url or settings.DATABASE_URL), pool_pre_ping=True
+            )
+        return self._engine
+
+    @asynccontextmanager
+    async def session(self):
+        if self._sessionmaker is None:
+            from sqlalchemy.ext.asyncio import async_sessionmaker
+
+            self._sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with self._sessionmaker() as db:
+            yield db
+
+    async def close(self):
+        if self._engine is not None:
+            await self._engine.dispose()
+
+    def path(self, source: str) -> Path:
+        return self.directory / f"{source}.parquet"
+
+    def snapshot_age(self, source: str) -> Optional[float]:
+        """Idade do snapshot em disco (pelo mtime do arquivo), sem carregá-lo"""
+        try:
+            return max(0.0, time.time() - self.path(source).stat().st_mtime)
+        except FileNotFoundError:
+            return None
+
+    async def refresh(self, source: str) -> Dict[str, Any]:
+        """Grava um snapshot novo da fonte e troca o arquivo atomicamente"""
+        spec = self.sources[source]
+        taken_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        writer = ParquetWriter(
+            spec.columns, row_group_size=settings.REPORT_PARQUET_ROW_GROUP_SIZE,
+            metadata={SNAPSHOT_AT_KEY.decode(): taken_at.isoformat()}
+        )
+        self.directory.mkdir(parents=True, exist_ok=True)
+        target = self.path(source)
+        partial = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        rows = 0
+        try:
+            async with self.session() as db:
+                result = await db.stream(spec.query().execution_options(yield_per=self.batch_size))
+                try:
+                    with open(partial, "wb") as output:
+                        output.write(writer.header())
+                        async for batch in result.partitions(self.batch_size):
+                            converted = spec.rows(batch)
+                            rows += len(converted)
+                            output.write(writer.write(converted))
+                        output.write(writer.close())
+                finally:
+                    await result.close()
+            os.replace(partial, target)
+        finally:
+            if partial.exists():
+                partial.unlink()
+
+        elapsed = time.perf_counter() - started
+        self.refresh_seconds.labels(source).observe(elapsed)
+        self.snapshot_rows.labels(source).set(rows)
+        return {"source": source, "rows": rows, "taken_at": taken_at.isoformat(), "seconds": round(elapsed, 3)}
+
+    def _table(self, source: str) -> _Loaded:
+        """Tabela Arrow do snapshot, relida só quando o arquivo muda"""
+        _, _, pq = _pyarrow()
+        path = self.path(source)
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            raise LookupError(f"Snapshot de {source} ainda não gerado") from None
+        loaded = self._loaded.get(source)
+        if loaded is None or loaded.mtime_ns != mtime_ns:
+            table = pq.read_table(path)
+            raw = (table.schema.metadata or {}).get(SNAPSHOT_AT_KEY)
+            snapshot_at = datetime.fromisoformat(raw.decode()) if raw else None
+            loaded = self._loaded[source] = _Loaded(mtime_ns, table.replace_schema_metadata(None), snapshot_at)
+        return loaded
+
+    async def query(self, spec: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+        """Executa a consulta do widget sobre o snapshot; devolve linhas e frescor"""
+        query = WidgetQuery.parse(spec, self.max_rows)
+        started = time.perf_counter()
+        loaded, rows = await asyncio.to_thread(self._run, query, user_id)
+        self.query_seconds.labels(query.source).observe(time.perf_counter() - started)
+        snapshot_at = loaded.snapshot_at
+        return {
+            "rows": rows,
+            "snapshot": {
+                "source": query.source,
+                "taken_at": snapshot_at.isoformat() if snapshot_at else None,
+                "age_seconds": round((datetime.now(timezone.utc) - snapshot_at).total_seconds(), 1)
+                if snapshot_at else None
+            }
+        }
+
+    def _run(self, query: WidgetQuery, user_id: str) -> Tuple[_Loaded, List[Dict[str, Any]]]:
+        pa, pc, _ = _pyarrow()
+        loaded = self._table(query.source)
+        table = loaded.table
+        owner = self.sources[query.source].owner
+
+        condition = pc.field(owner) == str(user_id)
+        for column, op, value in query.filters:
+            condition = condition & _filter_expression(pc, pa, column, op, value)
+        if query.period is not None:
+            window = resolve_period(query.period[1], datetime.now(timezone.utc))
+            if window.start is not None:
+                start = pa.scalar(window.start, pa.timestamp("us", "UTC"))
+                condition = condition & (pc.field(query.period[0]) >= start)
+        table = table.filter(condition)
+
+        keys = list(query.group_by)
+        if query.bucket is not None:
+            column, unit = query.bucket
+            bucketed = pc.floor_temporal(table[column], unit=unit, week_starts_monday=True)
+            table = table.set_column(table.schema.get_field_index(column), column, bucketed)
+            keys.insert(0, column)
+
+        if keys:
+            table = _grouped(pa, pc, table, keys, query.metrics)
+        else:
+            table = pa.table({metric.alias: [_scalar(pc, table, metric)] for metric in query.metrics})
+
+        if query.order_by:
+            table = table.sort_by(list(query.order_by))
+        return loaded, table.slice(0, query.limit).to_pylist()
+
+
+def _filter_expression(pc, pa, column: str, op: str, value: Any):
+    field_ = pc.field(column)
+    if op == "is_null":
+        return field_.is_null()
+    if op == "not_null":
+        return field_.is_valid()
+    if op in ("in", "not_in"):
+        expression = field_.isin(value)
+        return ~expression if op == "not_in" else expression
+    if isinstance(value, datetime):
+        value = pa.scalar(value if value.tzinfo else value.replace(tzinfo=timezone.utc), pa.timestamp("us", "UTC"))
+    return {"eq": field_ == value, "ne": field_ != value, "gt": field_ > value, "gte": field_ >= value,
+            "lt": field_ < value, "lte": field_ <= value}[op]
+
+
+def _grouped(pa, pc, table, keys: List[str], metrics: Sequence[Metric]):
+    # Cada (agregação, coluna) roda uma vez, mesmo repetida com outro alias; o resultado
+    # é lido por posição, pois nomes como "status_count" se repetem entre count(*) e
+    # count(status)
+    aggregations, positions = [], {}
+    for metric in metrics:
+        key = (metric.agg, metric.column)
+        if key in positions:
+            continue
+        positions[key] = len(aggregations)
+        if metric.agg == "count" and metric.column is None:
+            aggregations.append((keys[0], "count", pc.CountOptions(mode="all")))
+        else:
+            aggregations.append((metric.column, AGGREGATES[metric.agg]))
+    grouped = table.group_by(keys).aggregate(aggregations)
+    # Conforme a versão do pyarrow, as chaves vêm antes ou depois das agregações
+    first = len(keys) if grouped.column_names[:len(keys)] == keys else 0
+    columns = {name: grouped[name] for name in keys}
+    for metric in metrics:
+        columns[metric.alias] = grouped.column(first + positions[(metric.agg, metric.column)])
+    return pa.Table.from_arrays(list(columns.values()), names=list(columns))
+
+
+def _scalar(pc, table, metric: Metric) -> Any:
+    if metric.agg == "count" and metric.column is None:
+        return table.num_rows
+    column = table[metric.column]
+    if metric.agg == "count":
+        return pc.count(column).as_py()
+    if metric.agg == "count_distinct":
+        return pc.count_distinct(column).as_py()
+    return getattr(pc, AGGREGATES[metric.agg])(column).as_py()
+
+
+class ColumnarSnapshotJob:
+    """Regrava os snapshots a cada `interval` segundos (no processo worker)"""
+
+    def __init__(self, store: ColumnarStore, interval: float = 300.0, enabled: bool = True):
+        self.store = store
+        self.interval = interval
+        self.enabled = enabled
+        self.last_run: Optional[List[Dict[str, Any]]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop(), name="columnar-snapshots")
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _loop(self):
+        # Verifica a idade dos arquivos com frequência; só regrava o que venceu
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval / 10)
+
+    async def run_once(self, force: bool = False) -> List[Dict[str, Any]]:
+        """
+        Atualiza as fontes com snapshot mais velho que `interval`; com vários
+        workers, o arquivo recém-gravado por um faz os outros pularem a fonte
+        """
+        results = []
+        for source in self.store.sources:
+            age = self.store.snapshot_age(source)
+            if not force and age is not None and age < self.interval:
+                continue
+            try:
+                results.append(await self.store.refresh(source))
+            except Exception as e:
+                logger.error(f"Erro no snapshot colunar de {source}: {e}")
+                results.append({"source": source, "error": str(e)})
+        if results:
+            logger.info("Snapshots colunares: " + ", ".join(
+                f"{r['source']} ({r.get('rows', 'erro')})" for r in results
+            ))
+            self.last_run = results
+        return results
+
+
+columnar_store = ColumnarStore(
+    settings.COLUMNAR_SNAPSHOT_DIR,
+    database_url=settings.COLUMNAR_SNAPSHOT_DATABASE_URL,
+    batch_size=settings.COLUMNAR_SNAPSHOT_BATCH_SIZE,
+    max_rows=settings.COLUMNAR_QUERY_MAX_ROWS
+)
+
+columnar_snapshot_job = ColumnarSnapshotJob(
+    columnar_store,
+    interval=settings.COLUMNAR_SNAPSHOT_INTERVAL_SECONDS,
+    enabled=settings.COLUMNAR_SNAPSHOT_ENABLED
+)
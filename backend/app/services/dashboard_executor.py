@@ -0,0 +1,142 @@
+"""
+Execução concorrente dos widgets de um dashboard
+
+Cada widget tem um provider independente (`provider(db, user_id)`). Com uma
+fábrica de sessões configurada, cada provider roda na própria AsyncSession
+do pool, em paralelo com os demais; sem ela, os providers compartilham a
+sessão da requisição e rodam um de cada vez (AsyncSession não aceita uso
+concorrente), mas mantêm timeout e falha parcial; depois de um timeout a
+sessão compartilhada é desfeita (rollback) antes do widget seguinte.
+
+A aplicação configura a fábrica no lifespan (main.py), com um engine
+assíncrono próprio sobre DATABASE_URL. As sessões dessa fábrica são
+limitadas por um semáforo de `max_sessions` compartilhado por todas as
+requisições (abaixo da capacidade do pool do engine): vários dashboards ao
+mesmo tempo esperam por uma vaga em vez de esgotar o pool. A espera pela vaga
+conta no prazo do widget.
+
+Um widget que estoura o prazo ou falha volta com `status` "timeout"/"error"
+e `data` None; o restante do dashboard é entregue normalmente.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.monitoring_service import monitoring_service
+
+logger = logging.getLogger(__name__)
+
+WIDGET_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass(frozen=True)
+class WidgetSpec:
+    id: str
+    type: str
+    title: str
+    provider: Callable[[Any, str], Awaitable[Any]]
+    timeout: Optional[float] = None  # None: timeout padrão do executor
+    depends_on: Tuple[str, ...] = ()  # Recursos cujas mudanças invalidam o snapshot (dashboard_snapshots)
+
+
+async def _rollback(db, widget_id: str):
+    """Desfaz a query cancelada na sessão compartilhada antes do próximo widget"""
+    try:
+        await db.rollback()
+    except Exception as e:
+        logger.error(f"Falha ao desfazer a sessão após timeout do widget {widget_id}: {e}")
+
+
+class DashboardExecutor:
+    """Roda os widgets com até `max_concurrency` providers simultâneos por dashboard"""
+
+    def __init__(self, session_factory: Optional[Callable[[], Any]] = None, max_concurrency: int = 4,
+                 default_timeout: float = 5.0, max_sessions: int = 10, registry=None):
+        self.session_factory = session_factory
+        self.max_concurrency = max_concurrency
+        self.default_timeout = default_timeout
+        self.max_sessions = max_sessions
+        # Vagas no pool da fábrica configurada, compartilhadas entre as requisições
+        self._pool_slots = asyncio.Semaphore(max_sessions)
+
+        registry = registry or monitoring_service.registry
+        self.widget_seconds = registry.histogram(
+            'milapp_dashboard_widget_seconds', 'Tempo de cálculo de cada widget de dashboard', ('widget',),
+            buckets=WIDGET_LATENCY_BUCKETS
+        )
+        self.widget_failures = registry.counter(
+            'milapp_dashboard_widget_failures_total', 'Widgets de dashboard que falharam ou estouraram o prazo',
+            ('widget', 'reason')
+        )
+
+    def configure(self, session_factory: Optional[Callable[[], Any]]):
+        """Define a fábrica de sessões (ex.: `async_sessionmaker(engine)`)"""
+        self.session_factory = session_factory
+
+    async def run(self, widgets: Sequence[WidgetSpec], user_id: str, db=None,
+                  session_factory: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+        """Calcula todos os widgets e devolve `{"widgets": [...], "partial": bool}`"""
+        factory = session_factory or self.session_factory
+        if factory is None and db is None:
+            raise ValueError("Informe uma sessão ou configure session_factory")
+        semaphore = asyncio.Semaphore(self.max_concurrency if factory is not None else 1)
+        pooled = session_factory is None and factory is not None
+
+        @asynccontextmanager
+        async def session():
+            if pooled:
+                async with self._pool_slots, factory() as own_session:
+                    yield own_session
+            elif factory is not None:
+                async with factory() as own_session:
+                    yield own_session
+            else:
+                yield db
+
+        async def provide(spec: WidgetSpec):
+            async with session() as widget_db:
+                return await spec.provider(widget_db, user_id)
+
+        async def compute(spec: WidgetSpec) -> Dict[str, Any]:
+            widget = {"id": spec.id, "type": spec.type, "title": spec.title, "data": None}
+            timeout = spec.timeout if spec.timeout is not None else self.default_timeout
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    # O prazo inclui a espera por uma vaga no pool
+                    widget["data"] = await asyncio.wait_for(provide(spec), timeout)
+                    widget["status"] = "ok"
+                except asyncio.TimeoutError:
+                    widget["status"] = "timeout"
+                    widget["error"] = f"Tempo limite de {timeout}s excedido"
+                    self.widget_failures.labels(spec.id, 'timeout').inc()
+                    logger.warning(f"Widget {spec.id} excedeu {timeout}s (usuário {user_id})")
+                    if factory is None:
+                        await _rollback(db, spec.id)
+                except Exception as e:
+                    widget["status"] = "error"
+                    widget["error"] = str(e)
+                    self.widget_failures.labels(spec.id, 'error').inc()
+                    logger.error(f"Erro no widget {spec.id} (usuário {user_id}): {e}")
+                elapsed = time.perf_counter() - started
+                self.widget_seconds.labels(spec.id).observe(elapsed)
+                widget["elapsed_ms"] = round(elapsed * 1000, 2)
+            return widget
+
+        results: List[Dict[str, Any]] = await asyncio.gather(*(compute(spec) for spec in widgets))
+        return {
+            "widgets": results,
+            "partial": any(widget["status"] != "ok" for widget in results)
+        }
+
+
+dashboard_executor = DashboardExecutor(
+    max_concurrency=settings.DASHBOARD_MAX_CONCURRENT_WIDGETS,
+    default_timeout=settings.DASHBOARD_WIDGET_TIMEOUT_SECONDS,
+    max_sessions=settings.DASHBOARD_MAX_SESSIONS
+)
@@ -0,0 +1,130 @@
+"""
+Snapshots de dashboard por usuário com atualização incremental
+
+Cada dashboard de um usuário fica guardado como um snapshot único no cache
+(um GET), com o resultado de cada widget e as gerações das tags das quais
+ele depende (`WidgetSpec.depends_on`: "projects", "tasks", "deployments",
+"events"). Uma mudança chama `mark_dirty(user_id, "tasks")`, que só
+incrementa a geração da tag; na próxima leitura, os widgets cujas gerações
+mudaram são recalculados (e apenas eles), o resto sai do snapshot. O custo
+de atualização acompanha a taxa de mudanças, não a de leituras.
+
+"events" é global: o rollup de analytics invalida os widgets alimentados
+pelas tabelas fato de todos os usuários de uma vez.
+"""
+
+import asyncio
+import logging
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.core.config import settings
+from app.services.cache_service import cache_service
+from app.services.dashboard_executor import WidgetSpec, dashboard_executor
+from app.services.monitoring_service import monitoring_service
+
+logger = logging.getLogger(__name__)
+
+RESOURCES = ("projects", "tasks", "deployments", "events")
+GLOBAL_RESOURCES = ("events",)
+
+
+def dependency_tag(user_id: Optional[str], resource: str) -> str:
+    if resource in GLOBAL_RESOURCES:
+        return f"dashboard:{resource}"
+    return f"dashboard:user:{user_id}:{resource}"
+
+
+class DashboardSnapshotStore:
+    """Lê e atualiza os snapshots; widgets sujos são recalculados pelo DashboardExecutor"""
+
+    def __init__(self, cache=None, executor=None, ttl: float = 3600, registry=None):
+        self.cache = cache or cache_service
+        self.executor = executor or dashboard_executor
+        self.ttl = ttl
+        # Uma atualização por snapshot neste processo; leituras concorrentes esperam a mesma
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+        registry = registry or monitoring_service.registry
+        self.reads_total = registry.counter(
+            'milapp_dashboard_snapshot_reads_total', 'Leituras de dashboard por resultado (hit: nenhum widget recalculado)',
+            ('dashboard', 'result')
+        )
+        self.refreshes_total = registry.counter(
+            'milapp_dashboard_widget_refreshes_total', 'Widgets recalculados por motivo',
+            ('widget', 'reason')
+        )
+
+    @staticmethod
+    def _key(dashboard: str, user_id: str) -> str:
+        return f"dashboard_snapshot:{dashboard}:{user_id}"
+
+    def _lock(self, key: str) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        return lock
+
+    async def get(self, dashboard: str, widgets: Sequence[WidgetSpec], user_id: str, db=None) -> Dict[str, Any]:
+        """Dashboard a partir do snapshot, recalculando só os widgets sujos"""
+        key = self._key(dashboard, user_id)
+        async with self._lock(key):
+            snapshot = dict(await self.cache.get(key) or {})
+            tags = {spec.id: [dependency_tag(user_id, r) for r in spec.depends_on] for spec in widgets}
+            versions = await self.cache.tag_versions(tag for spec_tags in tags.values() for tag in spec_tags)
+
+            dirty: List[WidgetSpec] = []
+            for spec in widgets:
+                reason = self._dirty_reason(snapshot.get(spec.id), {tag: versions[tag] for tag in tags[spec.id]})
+                if reason:
+                    dirty.append(spec)
+                    self.refreshes_total.labels(spec.id, reason).inc()
+
+            if dirty:
+                computed = await self.executor.run(dirty, user_id, db=db)
+                now = time.time()
+                for widget in computed["widgets"]:
+                    # Versões lidas antes do cálculo: invalidação durante o cálculo deixa o widget sujo
+                    widget["versions"] = {tag: versions[tag] for tag in tags[widget["id"]]}
+                    widget["computed_at"] = now
+                    snapshot[widget["id"]] = widget
+                if any(widget["status"] == "ok" for widget in computed["widgets"]):
+                    await self.cache.set(key, snapshot, ttl=self.ttl)
+            self.reads_total.labels(dashboard, 'refresh' if dirty else 'hit').inc()
+
+        results = [
+            {k: v for k, v in snapshot[spec.id].items() if k != "versions"}
+            for spec in widgets
+        ]
+        return {
+            "widgets": results,
+            "partial": any(widget["status"] != "ok" for widget in results),
+            "refreshed": [spec.id for spec in dirty]
+        }
+
+    @staticmethod
+    def _dirty_reason(widget: Optional[Dict[str, Any]], versions: Dict[str, int]) -> Optional[str]:
+        if widget is None:
+            return "missing"
+        if widget.get("status") != "ok":
+            return "failed"
+        if widget.get("versions") != versions:
+            return "changed"
+        return None
+
+    async def mark_dirty(self, user_id: Optional[str], *resources: str) -> None:
+        """Marca como sujos os widgets do usuário que dependem de `resources`"""
+        unknown = set(resources) - set(RESOURCES)
+        if unknown:
+            raise ValueError(f"Recursos desconhecidos: {', '.join(sorted(unknown))}")
+        tags = {dependency_tag(user_id, resource) for resource in resources}
+        if tags:
+            await self.cache.invalidate_tags(*tags)
+
+    async def drop(self, dashboard: str, user_id: str) -> None:
+        await self.cache.delete(self._key(dashboard, user_id))
+
+
+dashboard_snapshots = DashboardSnapshotStore(ttl=settings.DASHBOARD_SNAPSHOT_TTL_SECONDS)
@@ -14,6 +14,9 @@ from supabase import Client
 import json
 import random
 
+from app.services.monitoring_service import monitoring_service
+from app.services.tracing import tracer
+
 logger = logging.getLogger(__name__)
 
 class FailureRecoveryService:
@@ -63,11 +66,21 @@ class FailureRecoveryService:
     async def openai_chat_completion(self, messages: List[Dict], **kwargs) -> Dict:
         """Chat completion com retry automático"""
         try:
-            response = await asyncio.to_thread(
-                self.openai.chat.completions.create,
-                messages=messages,
-                **kwargs
-            )
+            with tracer.span("openai.chat.completions", 'client', model=kwargs.get('model', '')) as span:
+                response = await asyncio.to_thread(
+                    self.openai.chat.completions.create,
+                    messages=messages,
+                    **kwargs
+                )
+                if response.usage:
+                    span.set_attributes({
+                        'ai.prompt_tokens': response.usage.prompt_tokens,
+                        'ai.completion_tokens': response.usage.completion_tokens
+                    })
+            if response.usage:
+                monitoring_service.record_ai_usage(
+                    response.model, response.usage.prompt_tokens, response.usage.completion_tokens
+                )
             return {
                 'content': response.choices[0].message.content,
                 'usage': response.usage.dict() if response.usage else None,
@@ -0,0 +1,294 @@
+"""
+Previsão de séries das tabelas fato (tendência linear e Holt-Winters/ETS)
+
+Todas as funções recebem uma matriz `(séries, pontos)` e ajustam todas as
+séries de uma vez: a recursão do ETS percorre o tempo, mas cada passo é uma
+operação NumPy sobre (grade de parâmetros × séries), então centenas de
+séries de projeto/métrica custam alguns milissegundos.
+
+Modelos (`model`):
+- "linear": mínimos quadrados com intervalo de predição da regressão
+- "holt": ETS(A,A,N), nível + tendência
+- "holt_winters": ETS(A,A,A), com sazonalidade de `season_length` pontos
+- "seasonal_naive": repete o último ciclo (linha de base do backtest)
+- "auto": escolhe, por série, o de menor AIC entre linear, holt e holt_winters
+
+Os parâmetros do ETS são escolhidos numa grade fixa pelo menor erro
+quadrático a um passo; os intervalos usam a variância analítica da forma de
+correção de erro (Hyndman et al., cap. 6).
+"""
+
+import time
+from dataclasses import dataclass
+from itertools import product
+from statistics import NormalDist
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+MODELS = ("linear", "holt", "holt_winters", "seasonal_naive")
+AUTO_MODELS = ("linear", "holt", "holt_winters")
+
+_ALPHAS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9)
+_BETAS = (0.0, 0.01, 0.05, 0.1, 0.2)
+_GAMMAS = (0.0, 0.05, 0.1, 0.2, 0.4)
+_EPS = 1e-12
+
+
+@dataclass
+class ForecastResult:
+    """Previsões de S séries para H passos; `model[i]` é o modelo usado na série i"""
+    model: np.ndarray  # (S,) str
+    mean: np.ndarray  # (S, H)
+    lower: np.ndarray  # (S, H)
+    upper: np.ndarray  # (S, H)
+    sigma: np.ndarray  # (S,) desvio do erro a um passo
+    aic: np.ndarray  # (S,)
+    level: float
+
+    def series(self, index: int) -> Dict[str, Any]:
+        return {
+            "model": str(self.model[index]),
+            "mean": self.mean[index].tolist(),
+            "lower": self.lower[index].tolist(),
+            "upper": self.upper[index].tolist(),
+        }
+
+
+def as_matrix(values) -> np.ndarray:
+    """Uma série (T,) ou várias (S, T); NaN é preenchido com o último valor conhecido"""
+    matrix = np.atleast_2d(np.asarray(values, dtype=float))
+    if np.isnan(matrix).any():
+        matrix = _ffill(matrix)
+    return matrix
+
+
+def _ffill(matrix: np.ndarray) -> np.ndarray:
+    mask = np.isnan(matrix)
+    index = np.where(~mask, np.arange(matrix.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    filled = matrix[np.arange(matrix.shape[0])[:, None], index]
+    # NaN no início da série (sem valor anterior) vira 0
+    return np.nan_to_num(filled, nan=0.0)
+
+
+def _z(level: float) -> float:
+    return NormalDist().inv_cdf(0.5 + level / 2)
+
+
+def _aic(sse: np.ndarray, n: int, k: int) -> np.ndarray:
+    return n * np.log(sse / n + _EPS) + 2 * k
+
+
+def linear_forecast(y, horizon: int, level: float = 0.95) -> ForecastResult:
+    y = as_matrix(y)
+    series, n = y.shape
+    x = np.arange(n, dtype=float)
+    x_mean = x.mean()
+    sxx = max(((x - x_mean) ** 2).sum(), _EPS)
+    y_mean = y.mean(axis=1)
+    slope = (y - y_mean[:, None]) @ (x - x_mean) / sxx
+    intercept = y_mean - slope * x_mean
+
+    residuals = y - (intercept[:, None] + slope[:, None] * x)
+    sse = (residuals ** 2).sum(axis=1)
+    sigma = np.sqrt(sse / max(n - 2, 1))
+
+    future = np.arange(n, n + horizon, dtype=float)
+    mean = intercept[:, None] + slope[:, None] * future
+    spread = _z(level) * sigma[:, None] * np.sqrt(1 + 1 / n + (future - x_mean) ** 2 / sxx)
+    return ForecastResult(
+        np.full(series, "linear", dtype=object), mean, mean - spread, mean + spread,
+        sigma, _aic(sse, n, 3), level
+    )
+
+
+def ets_forecast(y, horizon: int, season_length: int = 7, seasonal: bool = True,
+                 level: float = 0.95) -> ForecastResult:
+    """Holt (seasonal=False) ou Holt-Winters aditivo, com grade de parâmetros vetorizada"""
+    y = as_matrix(y)
+    series, n = y.shape
+    m = season_length if seasonal else 1
+    if n < 2 * m or n < 3:
+        raise ValueError(f"Série curta demais para {'holt_winters' if seasonal else 'holt'}: {n} pontos")
+
+    # Grade admissível (forma de correção de erro): beta <= alpha, gamma <= 1 - alpha
+    grid = np.array([
+        (a, b, g) for a, b, g in product(_ALPHAS, _BETAS, _GAMMAS if seasonal else (0.0,))
+        if b <= a and g <= 1 - a
+    ])
+    alpha, beta, gamma = (grid[:, i][:, None] for i in range(3))
+    combos = len(grid)
+
+    if seasonal:
+        first, second = y[:, :m].mean(axis=1), y[:, m:2 * m].mean(axis=1)
+        level0, trend0 = first, (second - first) / m
+        season0 = y[:, :m] - first[:, None]
+    else:
+        level0 = y[:, 0]
+        trend0 = np.diff(y[:, :min(n, 5)], axis=1).mean(axis=1)
+        season0 = np.zeros((series, 1))
+
+    lvl = np.broadcast_to(level0, (combos, series)).copy()
+    trend = np.broadcast_to(trend0, (combos, series)).copy()
+    # (m, combos, series): cada passo lê e escreve um bloco contíguo
+    season = np.broadcast_to(season0.T[:, None, :], (m, combos, series)).copy()
+    sse = np.zeros((combos, series))
+
+    for t in range(n):
+        slot = t % m
+        error = y[:, t] - (lvl + trend + season[slot])
+        sse += error ** 2
+        lvl += trend + alpha * error
+        trend += beta * error
+        season[slot] += gamma * error
+
+    best = sse.argmin(axis=0)
+    columns = np.arange(series)
+    lvl, trend, season = lvl[best, columns], trend[best, columns], season[:, best, columns].T
+    a, b, g = grid[best, 0], grid[best, 1], grid[best, 2]
+    sse = sse[best, columns]
+
+    steps = np.arange(1, horizon + 1)
+    slots = (n + steps - 1) % m
+    mean = lvl[:, None] + steps * trend[:, None] + season[:, slots]
+
+    # Var(h) = sigma² (1 + Σ_{j<h} c_j²), c_j = alpha + beta·j + gamma·[j mod m = 0]
+    params = 2 + (3 if seasonal else 0)
+    states = 2 + (m if seasonal else 0)
+    sigma = np.sqrt(sse / max(n - params, 1))
+    j = np.arange(1, horizon)
+    c = a[:, None] + b[:, None] * j + (g[:, None] * (j % m == 0) if seasonal else 0)
+    multiplier = np.concatenate([np.ones((series, 1)), 1 + np.cumsum(c ** 2, axis=1)], axis=1)
+    spread = _z(level) * sigma[:, None] * np.sqrt(multiplier)
+
+    name = "holt_winters" if seasonal else "holt"
+    return ForecastResult(
+        np.full(series, name, dtype=object), mean, mean - spread, mean + spread,
+        sigma, _aic(sse, n, params + states), level
+    )
+
+
+def seasonal_naive_forecast(y, horizon: int, season_length: int = 7, level: float = 0.95) -> ForecastResult:
+    y = as_matrix(y)
+    series, n = y.shape
+    m = min(season_length, n)
+    steps = np.arange(horizon)
+    mean = y[:, n - m + steps % m]
+    diffs = y[:, m:] - y[:, :-m] if n > m else np.zeros((series, 1))
+    sigma = np.sqrt((diffs ** 2).mean(axis=1))
+    spread = _z(level) * sigma[:, None] * np.sqrt(steps // m + 1)
+    return ForecastResult(
+        np.full(series, "seasonal_naive", dtype=object), mean, mean - spread, mean + spread,
+        sigma, np.full(series, np.inf), level
+    )
+
+
+def forecast(y, horizon: int, model: str = "auto", season_length: int = 7, level: float = 0.95,
+             non_negative: bool = False) -> ForecastResult:
+    """
+    Previsão de `horizon` passos para cada linha de `y`; `non_negative` corta
+    média e limites em zero (contagens)
+    """
+    if model not in MODELS and model != "auto":
+        raise ValueError(f"Modelo desconhecido: {model} (use {', '.join(MODELS)} ou auto)")
+    y = as_matrix(y)
+    n = y.shape[1]
+    if n < 3:
+        raise ValueError(f"São necessários ao menos 3 pontos para prever (recebidos {n})")
+
+    if model == "auto":
+        candidates = [linear_forecast(y, horizon, level), ets_forecast(y, horizon, seasonal=False, level=level)]
+        if n >= 2 * season_length:
+            candidates.append(ets_forecast(y, horizon, season_length, seasonal=True, level=level))
+        result = _select(candidates)
+    elif model == "linear":
+        result = linear_forecast(y, horizon, level)
+    elif model == "seasonal_naive":
+        result = seasonal_naive_forecast(y, horizon, season_length, level)
+    else:
+        result = ets_forecast(y, horizon, season_length, seasonal=model == "holt_winters", level=level)
+
+    if non_negative:
+        np.maximum(result.mean, 0, out=result.mean)
+        np.maximum(result.lower, 0, out=result.lower)
+        np.maximum(result.upper, 0, out=result.upper)
+    return result
+
+
+def _select(candidates: Sequence[ForecastResult]) -> ForecastResult:
+    """Por série, o candidato de menor AIC"""
+    aic = np.stack([candidate.aic for candidate in candidates])
+    best = aic.argmin(axis=0)
+    rows = np.arange(len(best))
+
+    def pick(attribute: str) -> np.ndarray:
+        return np.stack([getattr(candidate, attribute) for candidate in candidates])[best, rows]
+
+    return ForecastResult(
+        pick("model"), pick("mean"), pick("lower"), pick("upper"),
+        pick("sigma"), pick("aic"), candidates[0].level
+    )
+
+
+def backtest(y, horizon: int, model: str = "auto", folds: int = 3, season_length: int = 7,
+             level: float = 0.95, non_negative: bool = False) -> Dict[str, Any]:
+    """
+    Validação com origem móvel: em cada fold, ajusta até `T - k·horizon` e
+    compara os `horizon` pontos seguintes com o real. Devolve MAE, RMSE, WAPE,
+    cobertura do intervalo, WAPE por série e tempo de ajuste
+    """
+    y = as_matrix(y)
+    series, n = y.shape
+    abs_error = np.zeros(series)
+    sq_error = np.zeros(series)
+    actual_total = np.zeros(series)
+    covered = np.zeros(series)
+    points, used, seconds = 0, 0, 0.0
+
+    for fold in range(folds, 0, -1):
+        cut = n - fold * horizon
+        if cut < 3:
+            continue
+        actual = y[:, cut:cut + horizon]
+        started = time.perf_counter()
+        result = forecast(y[:, :cut], actual.shape[1], model, season_length, level, non_negative)
+        seconds += time.perf_counter() - started
+
+        error = actual - result.mean
+        abs_error += np.abs(error).sum(axis=1)
+        sq_error += (error ** 2).sum(axis=1)
+        actual_total += np.abs(actual).sum(axis=1)
+        covered += ((actual >= result.lower) & (actual <= result.upper)).sum(axis=1)
+        points += actual.shape[1]
+        used += 1
+
+    if used == 0:
+        raise ValueError(f"Série curta demais para backtest com horizonte {horizon}: {n} pontos")
+    wape = abs_error / np.maximum(actual_total, _EPS)
+    return {
+        "model": model,
+        "series": series,
+        "horizon": horizon,
+        "folds": used,
+        "mae": float(abs_error.sum() / (series * points)),
+        "rmse": float(np.sqrt(sq_error.sum() / (series * points))),
+        # Sem volume real (série toda zerada), WAPE não é definido
+        "wape": float(abs_error.sum() / actual_total.sum()) if actual_total.sum() > 0 else float("nan"),
+        "coverage": float(covered.sum() / (series * points)),
+        "wape_per_series": wape,
+        "seconds": seconds,
+    }
+
+
+def accuracy(y, horizon: int, model: str = "auto", season_length: int = 7,
+             non_negative: bool = False) -> Optional[float]:
+    """1 - WAPE de um backtest curto (entre 0 e 1); None se a série não comporta"""
+    y = as_matrix(y)
+    folds = min(3, (y.shape[1] - 2 * season_length) // max(horizon, 1))
+    if folds < 1:
+        return None
+    result = backtest(y, horizon, model, folds, season_length, non_negative=non_negative)
+    if np.isnan(result["wape"]):
+        return None
+    return float(np.clip(1 - result["wape"], 0.0, 1.0))
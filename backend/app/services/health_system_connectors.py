@@ -10,6 +10,8 @@ from datetime import datetime
 import structlog
 from pydantic import BaseModel
 
+from app.services.tracing import AsyncTracingTransport
+
 logger = structlog.get_logger()
 
 
@@ -30,7 +32,8 @@ class TopSaudeConnector:
         self.api_key = api_key
         self.client = httpx.AsyncClient(
             base_url=base_url,
-            headers={"Authorization": f"Bearer {api_key}"}
+            headers={"Authorization": f"Bearer {api_key}"},
+            transport=AsyncTracingTransport(peer="top_saude")
         )
     
     async def get_patient_data(self, patient_id: str) -> HealthSystemData:
@@ -129,7 +132,8 @@ class MXMConnector:
         self.api_key = api_key
         self.client = httpx.AsyncClient(
             base_url=base_url,
-            headers={"Authorization": f"Bearer {api_key}"}
+            headers={"Authorization": f"Bearer {api_key}"},
+            transport=AsyncTracingTransport(peer="mxm")
         )
     
     async def get_medical_data(self, medical_id: str) -> HealthSystemData:
@@ -181,7 +185,8 @@ class TasyConnector:
         self.api_key = api_key
         self.client = httpx.AsyncClient(
             base_url=base_url,
-            headers={"Authorization": f"Bearer {api_key}"}
+            headers={"Authorization": f"Bearer {api_key}"},
+            transport=AsyncTracingTransport(peer="tasy")
         )
     
     async def get_hospital_data(self, hospital_id: str) -> HealthSystemData:
@@ -233,7 +238,8 @@ class TechSallusConnector:
         self.api_key = api_key
         self.client = httpx.AsyncClient(
             base_url=base_url,
-            headers={"Authorization": f"Bearer {api_key}"}
+            headers={"Authorization": f"Bearer {api_key}"},
+            transport=AsyncTracingTransport(peer="tech_sallus")
         )
     
     async def get_health_data(self, health_id: str) -> HealthSystemData:
@@ -285,7 +291,8 @@ class BizagiConnector:
         self.api_key = api_key
         self.client = httpx.AsyncClient(
             base_url=base_url,
-            headers={"Authorization": f"Bearer {api_key}"}
+            headers={"Authorization": f"Bearer {api_key}"},
+            transport=AsyncTracingTransport(peer="bizagi")
         )
     
     async def get_bpmn_process(self, process_id: str) -> HealthSystemData:
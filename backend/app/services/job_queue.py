@@ -0,0 +1,424 @@
+"""
+Fila de jobs em background armazenada no Postgres
+
+Os jobs ficam em `background_jobs` (migração 20250721000000). Um worker
+reivindica lotes com `UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP
+LOCKED LIMIT n) RETURNING ...`: workers concorrentes nunca pegam o mesmo job
+e não esperam os bloqueios uns dos outros.
+
+- prioridade: menor número sai primeiro (padrão 100), depois `run_at`
+- visibilidade: o job reivindicado fica `running` até `locked_until`; o
+  worker renova o prazo enquanto executa (heartbeat). Se o worker morre, o
+  prazo expira e `requeue_expired` devolve o job à fila
+- retentativas: falha volta para `queued` com atraso exponencial (com
+  jitter) até `max_attempts`; depois fica `failed`
+- conclusão e falha só valem para o worker que detém o job, então um job
+  reivindicado de novo após expirar não é concluído duas vezes
+
+Sem FOR UPDATE (SQLite, usado no benchmark local), o mesmo UPDATE é atômico
+porque o banco serializa as escritas.
+"""
+
+import asyncio
+import inspect
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Union
+
+from sqlalchemy import (
+    JSON, Column, DateTime, Index, Integer, MetaData, String, Table, Text, Uuid, and_, case, select, text, update
+)
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.core.config import settings
+from app.services.monitoring_service import monitoring_service
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+DEFAULT_PRIORITY = 100
+
+_JSON = JSON().with_variant(JSONB(), "postgresql")
+
+metadata = MetaData()
+jobs = Table(
+    "background_jobs", metadata,
+    Column("id", Uuid(as_uuid=False), primary_key=True),
+    Column("queue", String(50), nullable=False, default="default"),
+    Column("task", String(100), nullable=False),
+    Column("payload", _JSON, nullable=False),
+    Column("priority", Integer, nullable=False, default=DEFAULT_PRIORITY),
+    Column("status", String(20), nullable=False, default=QUEUED),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("max_attempts", Integer, nullable=False),
+    Column("run_at", DateTime(timezone=True), nullable=False),
+    Column("locked_by", String(200)),
+    Column("locked_until", DateTime(timezone=True)),
+    Column("result", _JSON),
+    Column("error", Text),
+    Column("created_by", Uuid(as_uuid=False)),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Column("updated_at", DateTime(timezone=True), nullable=False),
+    Column("started_at", DateTime(timezone=True)),
+    Column("finished_at", DateTime(timezone=True)),
+    Index("idx_background_jobs_claim", "queue", "priority", "run_at", postgresql_where=text("status = 'queued'")),
+    Index("idx_background_jobs_running", "locked_until", postgresql_where=text("status = 'running'")),
+)
+
+PUBLIC_FIELDS = (
+    "id", "queue", "task", "status", "priority", "attempts", "max_attempts", "result", "error",
+    "created_at", "started_at", "finished_at", "run_at"
+)
+
+# Campos do resultado que só o servidor usa (ex.: caminho do arquivo gerado, lido pelo /download)
+PRIVATE_RESULT_FIELDS = frozenset(("path",))
+
+
+class PermanentJobError(Exception):
+    """Falha que não adianta repetir (payload inválido): o job vai direto para `failed`"""
+
+
+@dataclass
+class Job:
+    id: str
+    queue: str
+    task: str
+    payload: Dict[str, Any]
+    priority: int
+    attempts: int
+    max_attempts: int
+
+
+@dataclass(frozen=True)
+class TaskHandler:
+    """`func(payload, job)` assíncrona ou síncrona (roda em thread); `timeout` em segundos"""
+    name: str
+    func: Callable[[Dict[str, Any], Job], Union[Any, Awaitable[Any]]]
+    timeout: Optional[float] = None
+
+
+def async_database_url(url: str) -> str:
+    """Troca o driver síncrono pelo assíncrono (asyncpg/aiosqlite)"""
+    for sync, async_ in (("postgresql://", "postgresql+asyncpg://"), ("postgres://", "postgresql+asyncpg://"),
+                         ("postgresql+psycopg2://", "postgresql+asyncpg://"), ("sqlite://", "sqlite+aiosqlite://")):
+        if url.startswith(sync):
+            return async_ + url[len(sync):]
+    return url
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobQueue:
+    """Enfileira, reivindica e finaliza jobs; `handlers` guarda as tarefas registradas"""
+
+    def __init__(self, database_url: Optional[str] = None, engine=None, max_attempts: int = 5,
+                 retry_base: float = 5.0, retry_max: float = 600.0, registry=None):
+        self.database_url = database_url
+        self._engine = engine
+        self._sessionmaker = None
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.handlers: Dict[str, TaskHandler] = {}
+
+        registry = registry or monitoring_service.registry
+        self.enqueued_total = registry.counter(
+            'milapp_jobs_enqueued_total', 'Jobs enfileirados', ('task',)
+        )
+        self.claimed_total = registry.counter(
+            'milapp_jobs_claimed_total', 'Jobs reivindicados por workers', ('queue',)
+        )
+        self.finished_total = registry.counter(
+            'milapp_jobs_finished_total', 'Jobs finalizados por resultado (succeeded, retry, failed, lost)',
+            ('task', 'result')
+        )
+        self.expired_total = registry.counter(
+            'milapp_jobs_expired_total', 'Jobs devolvidos à fila após expirar a visibilidade'
+        )
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine
+
+            self._engine = create_async_engine(
+                async_database_url(self.database_url or settings.DATABASE_URL), pool_pre_ping=True
+            )
+        return self._engine
+
+    @asynccontextmanager
+    async def session(self):
+        """AsyncSession no mesmo banco da fila (para as tarefas que consultam dados)"""
+        if self._sessionmaker is None:
+            from sqlalchemy.ext.asyncio import async_sessionmaker
+
+            self._sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with self._sessionmaker() as db:
+            yield db
+
+    async def create_schema(self):
+        """Cria a tabela fora do Supabase (benchmark, desenvolvimento com SQLite)"""
+        async with self.engine.begin() as conn:
+            await conn.run_sync(metadata.create_all)
+
+    async def close(self):
+        if self._engine is not None:
+            await self._engine.dispose()
+
+    def task(self, name: str, timeout: Optional[float] = None):
+        """Decorador que registra uma tarefa executável pelos workers"""
+        def register(func):
+            self.handlers[name] = TaskHandler(name, func, timeout)
+            return func
+        return register
+
+    async def enqueue(self, task: str, payload: Optional[Dict[str, Any]] = None, queue: str = "default",
+                      priority: int = DEFAULT_PRIORITY, delay: float = 0, max_attempts: Optional[int] = None,
+                      created_by: Optional[str] = None) -> str:
+        job_id = str(uuid.uuid4())
+        now = _now()
+        async with self.engine.begin() as conn:
+            await conn.execute(jobs.insert().values(
+                id=job_id, queue=queue, task=task, payload=payload or {}, priority=priority, status=QUEUED,
+                attempts=0, max_attempts=max_attempts or self.max_attempts,
+                run_at=now + timedelta(seconds=delay), created_by=created_by, created_at=now, updated_at=now
+            ))
+        self.enqueued_total.labels(task).inc()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(select(jobs).where(jobs.c.id == job_id))).first()
+        return dict(row._mapping) if row is not None else None
+
+    async def claim(self, worker_id: str, queues: Sequence[str], limit: int,
+                    visibility_timeout: float) -> List[Job]:
+        """Reivindica até `limit` jobs prontos das filas, por prioridade e `run_at`"""
+        if limit <= 0:
+            return []
+        now = _now()
+        claimable = select(jobs.c.id).where(
+            jobs.c.status == QUEUED, jobs.c.queue.in_(queues), jobs.c.run_at <= now
+        ).order_by(jobs.c.priority, jobs.c.run_at).limit(limit).with_for_update(skip_locked=True)
+        statement = update(jobs).where(jobs.c.id.in_(claimable), jobs.c.status == QUEUED).values(
+            status=RUNNING, attempts=jobs.c.attempts + 1, locked_by=worker_id,
+            locked_until=now + timedelta(seconds=visibility_timeout), started_at=now, updated_at=now
+        ).returning(
+            jobs.c.id, jobs.c.queue, jobs.c.task, jobs.c.payload, jobs.c.priority, jobs.c.attempts, jobs.c.max_attempts
+        )
+        async with self.engine.begin() as conn:
+            rows = (await conn.execute(statement)).all()
+        claimed = [Job(str(row.id), row.queue, row.task, row.payload or {}, row.priority, row.attempts,
+                       row.max_attempts) for row in rows]
+        for job in claimed:
+            self.claimed_total.labels(job.queue).inc()
+        return sorted(claimed, key=lambda job: job.priority)
+
+    def _owned(self, job: Job, worker_id: str):
+        return and_(jobs.c.id == job.id, jobs.c.status == RUNNING, jobs.c.locked_by == worker_id)
+
+    async def complete(self, job: Job, worker_id: str, result: Any = None) -> bool:
+        now = _now()
+        async with self.engine.begin() as conn:
+            updated = await conn.execute(update(jobs).where(self._owned(job, worker_id)).values(
+                status=SUCCEEDED, result=result, error=None, locked_by=None, locked_until=None,
+                finished_at=now, updated_at=now
+            ))
+        owned = updated.rowcount > 0
+        self.finished_total.labels(job.task, 'succeeded' if owned else 'lost').inc()
+        return owned
+
+    def retry_delay(self, attempts: int) -> float:
+        """Atraso exponencial com jitter (50-100% do valor), limitado a `retry_max`"""
+        delay = min(self.retry_max, self.retry_base * 2 ** max(attempts - 1, 0))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def fail(self, job: Job, worker_id: str, error: str, retry: bool = True) -> bool:
+        """Agenda nova tentativa (se restarem) ou marca como `failed`"""
+        now = _now()
+        retrying = retry and job.attempts < job.max_attempts
+        values = {"error": error[:4000], "locked_by": None, "locked_until": None, "updated_at": now}
+        if retrying:
+            values.update(status=QUEUED, run_at=now + timedelta(seconds=self.retry_delay(job.attempts)))
+        else:
+            values.update(status=FAILED, finished_at=now)
+        async with self.engine.begin() as conn:
+            updated = await conn.execute(update(jobs).where(self._owned(job, worker_id)).values(**values))
+        owned = updated.rowcount > 0
+        self.finished_total.labels(job.task, ('retry' if retrying else 'failed') if owned else 'lost').inc()
+        return owned
+
+    async def heartbeat(self, job_ids: Sequence[str], worker_id: str, visibility_timeout: float) -> int:
+        """Renova a visibilidade dos jobs em execução deste worker"""
+        if not job_ids:
+            return 0
+        now = _now()
+        async with self.engine.begin() as conn:
+            updated = await conn.execute(update(jobs).where(
+                jobs.c.id.in_(list(job_ids)), jobs.c.status == RUNNING, jobs.c.locked_by == worker_id
+            ).values(locked_until=now + timedelta(seconds=visibility_timeout), updated_at=now))
+        return updated.rowcount
+
+    async def requeue_expired(self) -> int:
+        """Devolve à fila (ou falha, sem tentativas restantes) os jobs com visibilidade expirada"""
+        now = _now()
+        async with self.engine.begin() as conn:
+            updated = await conn.execute(update(jobs).where(
+                jobs.c.status == RUNNING, jobs.c.locked_until < now
+            ).values(
+                status=case((jobs.c.attempts >= jobs.c.max_attempts, FAILED), else_=QUEUED),
+                finished_at=case((jobs.c.attempts >= jobs.c.max_attempts, now), else_=None),
+                error="Prazo de visibilidade expirado (worker interrompido?)",
+                locked_by=None, locked_until=None, run_at=now, updated_at=now
+            ))
+        if updated.rowcount:
+            self.expired_total.inc(updated.rowcount)
+            logger.warning(f"{updated.rowcount} job(s) com visibilidade expirada devolvidos à fila")
+        return updated.rowcount
+
+
+def public_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Campos expostos na API de status (resultado só com o job concluído)"""
+    data = {field: job.get(field) for field in PUBLIC_FIELDS}
+    if data["status"] != SUCCEEDED:
+        data["result"] = None
+    elif isinstance(data["result"], dict):
+        data["result"] = {k: v for k, v in data["result"].items() if k not in PRIVATE_RESULT_FIELDS}
+    return data
+
+
+class JobWorker:
+    """Executa até `concurrency` jobs simultâneos das `queues`, renovando a visibilidade"""
+
+    def __init__(self, queue: JobQueue, queues: Sequence[str] = ("default",), concurrency: int = 4,
+                 poll_interval: float = 1.0, visibility_timeout: float = 300, worker_id: Optional[str] = None,
+                 registry=None):
+        self.queue = queue
+        self.queues = list(queues)
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._running: Dict[str, asyncio.Task] = {}
+        self._stopping = asyncio.Event()
+
+        registry = registry or monitoring_service.registry
+        self.job_seconds = registry.histogram(
+            'milapp_job_seconds', 'Duração da execução dos jobs', ('task',),
+            buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0)
+        )
+
+    def stop(self):
+        """Para de reivindicar; jobs em execução terminam antes de `run` retornar"""
+        self._stopping.set()
+
+    async def run(self, max_jobs: Optional[int] = None) -> int:
+        """Loop principal; com `max_jobs`, retorna após processar essa quantidade (benchmark)"""
+        processed = 0
+        last_heartbeat = last_reap = time.monotonic()
+        logger.info(f"Worker {self.worker_id} em {', '.join(self.queues)} (concorrência {self.concurrency})")
+        while not self._stopping.is_set():
+            free = self.concurrency - len(self._running)
+            if max_jobs is not None:
+                free = min(free, max_jobs - processed - len(self._running))
+            claimed = []
+            if free > 0:
+                try:
+                    claimed = await self.queue.claim(self.worker_id, self.queues, free, self.visibility_timeout)
+                except Exception as e:
+                    logger.error(f"Erro ao reivindicar jobs: {e}")
+            for job in claimed:
+                self._running[job.id] = asyncio.create_task(self._execute(job), name=f"job-{job.id}")
+
+            now = time.monotonic()
+            if self._running and now - last_heartbeat >= self.visibility_timeout / 3:
+                await self._safe(self.queue.heartbeat(list(self._running), self.worker_id, self.visibility_timeout))
+                last_heartbeat = now
+            if now - last_reap >= self.visibility_timeout / 2:
+                await self._safe(self.queue.requeue_expired())
+                last_reap = now
+
+            if claimed and len(self._running) < self.concurrency:
+                continue  # Ainda há vagas e a fila respondeu: tenta reivindicar mais sem esperar
+            # Acorda quando um job termina ou a cada poll_interval (mantém o heartbeat com todas as vagas ocupadas)
+            processed += await self._wait(self.poll_interval)
+            if max_jobs is not None and processed >= max_jobs:
+                break
+
+        if self._running:
+            logger.info(f"Aguardando {len(self._running)} job(s) em execução")
+            processed += await self._wait(None, drain=True)
+        return processed
+
+    async def _wait(self, timeout: Optional[float], drain: bool = False) -> int:
+        """Espera um job terminar (ou `timeout`, ou o stop); devolve quantos terminaram"""
+        if not self._running:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return 0
+        waiters = set(self._running.values())
+        stopper = None
+        if not drain:
+            stopper = asyncio.ensure_future(self._stopping.wait())
+            waiters.add(stopper)
+        done, _ = await asyncio.wait(
+            waiters, timeout=timeout,
+            return_when=asyncio.ALL_COMPLETED if drain else asyncio.FIRST_COMPLETED
+        )
+        if stopper is not None:
+            stopper.cancel()
+        finished = [job_id for job_id, task in self._running.items() if task in done]
+        for job_id in finished:
+            del self._running[job_id]
+        return len(finished)
+
+    async def _safe(self, operation: Awaitable[Any]):
+        try:
+            await operation
+        except Exception as e:
+            logger.error(f"Erro na manutenção da fila: {e}")
+
+    async def _execute(self, job: Job):
+        handler = self.queue.handlers.get(job.task)
+        if handler is None:
+            await self._safe(self.queue.fail(job, self.worker_id, f"Tarefa desconhecida: {job.task}", retry=False))
+            return
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(handler.func):
+                call = handler.func(job.payload, job)
+            else:
+                call = asyncio.to_thread(handler.func, job.payload, job)
+            result = await asyncio.wait_for(call, handler.timeout)
+        except asyncio.CancelledError:
+            raise
+        except PermanentJobError as e:
+            logger.warning(f"Job {job.id} ({job.task}) falhou sem retentativa: {e}")
+            await self._safe(self.queue.fail(job, self.worker_id, str(e), retry=False))
+        except Exception as e:
+            error = "Tempo limite excedido" if isinstance(e, asyncio.TimeoutError) else f"{type(e).__name__}: {e}"
+            logger.warning(f"Job {job.id} ({job.task}) falhou na tentativa {job.attempts}/{job.max_attempts}: {error}")
+            await self._safe(self.queue.fail(job, self.worker_id, error))
+        else:
+            await self._safe(self.queue.complete(job, self.worker_id, result))
+        finally:
+            self.job_seconds.labels(job.task).observe(time.perf_counter() - started)
+
+
+job_queue = JobQueue(
+    database_url=settings.JOB_QUEUE_DATABASE_URL,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    retry_base=settings.JOB_RETRY_BASE_SECONDS,
+    retry_max=settings.JOB_RETRY_MAX_SECONDS
+)
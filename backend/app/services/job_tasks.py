@@ -0,0 +1,144 @@
+"""
+Tarefas executadas pelos workers da fila (app.worker)
+
+Trabalho pesado que antes rodava dentro da requisição: análise de arquivos
+com IA, análise multimodal e geração de relatórios. Cada tarefa recebe o
+payload gravado no job e devolve um resultado serializável em JSON, que a
+API de status expõe quando o job termina.
+"""
+
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict
+
+from app.core.config import settings
+from app.services.analytics_reports import validate_report
+from app.services.job_queue import Job, PermanentJobError, job_queue
+from app.services.monitoring_service import monitoring_service
+from app.services.report_export import report_exporter
+from app.services.tracing import TracingTransport, tracer
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_PROMPT = """
+        Analise o conteúdo do arquivo fornecido e extraia:
+        1. Requisitos funcionais
+        2. Requisitos não funcionais
+        3. Processos de negócio
+        4. Entidades e relacionamentos
+        5. Work items sugeridos
+
+        Forneça uma análise estruturada e detalhada.
+        """
+
+_openai_client = None
+
+
+def _openai():
+    global _openai_client
+    if _openai_client is None:
+        import httpx
+        import openai
+
+        _openai_client = openai.OpenAI(
+            api_key=settings.OPENAI_API_KEY or os.getenv("OPENAI_API_KEY"),
+            http_client=httpx.Client(transport=TracingTransport(peer="openai"))
+        )
+    return _openai_client
+
+
+def job_upload_path(prefix: str, filename: str) -> Path:
+    """Arquivo de entrada/saída de job dentro de UPLOAD_DIR (só o nome base do original)"""
+    directory = Path(settings.UPLOAD_DIR) / "jobs"
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{prefix}-{Path(filename).name}"
+
+
+def extract_text(file_path: str, filename: str) -> str:
+    """Extração de texto (implementação básica)"""
+    if filename.endswith('.txt'):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    if filename.endswith('.pdf'):
+        # Implementar extração de PDF
+        return "Conteúdo extraído do PDF"
+    if filename.endswith(('.doc', '.docx')):
+        # Implementar extração de Word
+        return "Conteúdo extraído do Word"
+    return "Arquivo não suportado para extração de texto"
+
+
+@job_queue.task("analyze_file", timeout=600)
+def analyze_file(payload: Dict[str, Any], job: Job) -> Dict[str, Any]:
+    """Analisar arquivo com IA (PDF, Word, Excel, etc.); payload: path, filename, project_id"""
+    file_path, filename = payload["path"], payload["filename"]
+    file_content = extract_text(file_path, filename)
+
+    with tracer.span("openai.chat.completions", 'client', model="gpt-4") as span:
+        response = _openai().chat.completions.create(
+            model="gpt-4",
+            messages=[
+                {"role": "system", "content": ANALYSIS_PROMPT},
+                {"role": "user", "content": f"Analise este arquivo: {file_content}"}
+            ],
+            max_tokens=1500,
+            temperature=0.7
+        )
+        if response.usage:
+            span.set_attributes({
+                'ai.prompt_tokens': response.usage.prompt_tokens,
+                'ai.completion_tokens': response.usage.completion_tokens
+            })
+
+    if response.usage:
+        monitoring_service.record_ai_usage(
+            response.model, response.usage.prompt_tokens, response.usage.completion_tokens
+        )
+
+    # Arquivo só sai depois do sucesso: uma retentativa ainda precisa dele
+    os.remove(file_path)
+    return {
+        "filename": filename,
+        "project_id": payload.get("project_id"),
+        "analysis": response.choices[0].message.content,
+        "work_items_suggested": []  # Extrair work items da análise
+    }
+
+
+@job_queue.task("analyze_multimodal", timeout=900)
+async def analyze_multimodal(payload: Dict[str, Any], job: Job) -> Dict[str, Any]:
+    """AIService.analyze_multimodal_content; payload: files (lista de {type, path})"""
+    from app.services.ai_service import AIService
+
+    return await AIService().analyze_multimodal_content(payload["files"])
+
+
+@job_queue.task("generate_report", timeout=3600)
+async def generate_report(payload: Dict[str, Any], job: Job) -> Dict[str, Any]:
+    """
+    Exporta um relatório de analytics para arquivo em UPLOAD_DIR;
+    payload: user_id, report_type, format, filters
+    """
+    filters, format = payload.get("filters") or {}, payload.get("format", "csv")
+    try:
+        spec = validate_report(payload["report_type"], format, filters)
+    except ValueError as e:  # Relatório, formato ou filtro inválido: repetir não adianta
+        raise PermanentJobError(str(e)) from e
+
+    async with job_queue.session() as db:
+        response = report_exporter.response(db, spec, payload["user_id"], filters, format)
+        filename = response.headers["content-disposition"].split('filename="', 1)[1].rstrip('"')
+        path = job_upload_path(job.id, filename)
+        size = 0
+        with open(path, "wb") as output:
+            async for chunk in response.body_iterator:
+                output.write(chunk)
+                size += len(chunk)
+
+    return {
+        "filename": filename,
+        "path": str(path),
+        "media_type": response.media_type,
+        "size": size
+    }
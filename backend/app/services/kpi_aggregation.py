@@ -0,0 +1,142 @@
+"""
+Agregação de KPIs em uma única consulta
+
+Cada KPI é uma expressão agregada (COUNT/SUM/AVG, com `FILTER (WHERE ...)`
+quando precisa de um recorte); `kpi_select` junta todas num único SELECT
+sobre a mesma tabela, então N indicadores custam uma ida ao banco e uma
+leitura das linhas, em vez de N consultas.
+
+`resolve_period` é o parser único dos períodos ("7d", "30d", "1y", "all")
+usados pelos relatórios.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.sql import ColumnElement, Select
+
+ACTIVE_STATUSES = ("development", "testing")
+COMPLETED_STATUSES = ("deployed", "maintenance")
+
+_PERIOD = re.compile(r"^(\d+)([dwmy])$")
+_PERIOD_DAYS = {"d": 1, "w": 7, "m": 30, "y": 365}
+
+
+@dataclass(frozen=True)
+class Period:
+    """Janela de análise: `start` None significa todo o histórico"""
+    label: str
+    start: Optional[datetime]
+    end: datetime
+
+    @property
+    def days(self) -> Optional[float]:
+        if self.start is None:
+            return None
+        return (self.end - self.start).total_seconds() / 86400
+
+    def conditions(self, column) -> List[ColumnElement]:
+        """Filtros de `column` (ex.: Project.created_at) dentro da janela"""
+        if self.start is None:
+            return [column <= self.end]
+        return [column >= self.start, column <= self.end]
+
+
+def resolve_period(period: str, now: Optional[datetime] = None) -> Period:
+    """
+    Converte "7d", "30d", "90d", "1y" (ou qualquer N com d/w/m/y) e "all" numa
+    janela terminando em `now`
+    """
+    end = now or datetime.now()
+    label = (period or "all").strip().lower()
+    if label == "all":
+        return Period(label, None, end)
+    match = _PERIOD.match(label)
+    if match is None:
+        raise ValueError(f"Período inválido: {period} (use ex.: 7d, 30d, 90d, 1y ou all)")
+    amount, unit = int(match.group(1)), match.group(2)
+    return Period(label, end - timedelta(days=amount * _PERIOD_DAYS[unit]), end)
+
+
+@dataclass(frozen=True)
+class KPI:
+    """Indicador: nome, expressão agregada e conversão do valor lido"""
+    name: str
+    expression: ColumnElement
+    default: Any = 0
+    convert: Optional[Callable[[Any], Any]] = None
+
+    def value(self, raw: Any) -> Any:
+        if raw is None:
+            return self.default
+        return self.convert(raw) if self.convert else raw
+
+
+def count_where(*conditions) -> ColumnElement:
+    """COUNT(*) FILTER (WHERE ...)"""
+    return func.count().filter(and_(*conditions))
+
+
+def sum_where(column, *conditions) -> ColumnElement:
+    return func.sum(column).filter(and_(*conditions))
+
+
+def avg_where(column, *conditions) -> ColumnElement:
+    return func.avg(column).filter(and_(*conditions))
+
+
+def kpi_select(source, kpis: Sequence[KPI], *where) -> Select:
+    """SELECT com todos os KPIs sobre `source` (tabela ou modelo ORM)"""
+    query = select(*(kpi.expression.label(kpi.name) for kpi in kpis)).select_from(source)
+    return query.where(*where) if where else query
+
+
+def kpi_values(kpis: Sequence[KPI], row) -> Dict[str, Any]:
+    mapping = row._mapping
+    return {kpi.name: kpi.value(mapping[kpi.name]) for kpi in kpis}
+
+
+async def aggregate_kpis(db, source, kpis: Sequence[KPI], *where) -> Dict[str, Any]:
+    """Executa `kpi_select` numa AsyncSession e devolve {nome: valor}"""
+    result = await db.execute(kpi_select(source, kpis, *where))
+    return kpi_values(kpis, result.one())
+
+
+def project_kpis(projects) -> Sequence[KPI]:
+    """
+    KPIs de projetos; `projects` é o modelo ORM (Project) ou `tabela.c`,
+    basta expor as colunas status e roi_actual
+    """
+    return (
+        KPI("total_projects", func.count()),
+        KPI("active_projects", count_where(projects.status.in_(ACTIVE_STATUSES))),
+        KPI("completed_projects", count_where(projects.status.in_(COMPLETED_STATUSES))),
+        # AVG ignora NULL: mesmo resultado do antigo filtro roi_actual IS NOT NULL
+        KPI("average_roi", func.avg(projects.roi_actual), default=0.0, convert=float),
+    )
+
+
+def completion_rate(kpis: Dict[str, Any]) -> float:
+    total = kpis.get("total_projects") or 0
+    return (kpis.get("completed_projects", 0) / total * 100) if total > 0 else 0.0
+
+
+def roi_kpis(projects) -> Sequence[KPI]:
+    return (
+        KPI("project_count", func.count()),
+        KPI("total_roi", func.sum(projects.roi_actual), default=0.0, convert=float),
+        KPI("total_investment", func.sum(projects.estimated_effort), default=0, convert=float),
+    )
+
+
+def productivity_kpis(projects) -> Sequence[KPI]:
+    return (
+        KPI("total_projects", func.count()),
+        KPI("completed_projects", count_where(projects.status.in_(COMPLETED_STATUSES))),
+        KPI("total_effort", func.sum(projects.actual_effort), default=0, convert=float),
+        # Para períodos abertos ("all"), a média mensal usa o primeiro projeto
+        KPI("first_created_at", func.min(projects.created_at), default=None),
+    )
@@ -0,0 +1,197 @@
+"""
+Monitor de atraso do event loop e profiler de callbacks lentos
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from app.services.metrics_registry import MetricsRegistry
+
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_MAX_STACK_DEPTH = 25
+_MAX_STACKS_PER_SITE = 5
+
+StackKey = Tuple[Tuple[str, int, str], ...]
+
+
+@dataclass
+class StallSite:
+    """Bloqueios agregados por ponto de chamada"""
+    call_site: str
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_seen: float = 0.0
+    stacks: Dict[StackKey, int] = field(default_factory=dict)
+
+
+def _call_site(stack: StackKey) -> str:
+    """Frame mais interno do código da aplicação (ou o mais interno de todos)"""
+    for filename, lineno, name in reversed(stack):
+        if filename.startswith(_APP_ROOT) and not filename.endswith("loop_monitor.py"):
+            return f"{os.path.relpath(filename, os.path.dirname(_APP_ROOT))}:{lineno} {name}"
+    if stack:
+        filename, lineno, name = stack[-1]
+        return f"{filename}:{lineno} {name}"
+    return "<desconhecido>"
+
+
+class LoopStallMonitor:
+    """
+    Um heartbeat no event loop mede o atraso de cada tick. Uma thread de
+    vigilância verifica o último heartbeat; se o loop ficar parado mais que
+    `threshold`, captura a pilha da thread do loop naquele instante (isto é,
+    o callback que está bloqueando). Quando o heartbeat volta, a duração do
+    bloqueio é atribuída à pilha capturada.
+    """
+
+    def __init__(self, registry: MetricsRegistry, threshold: float = 0.1,
+                 interval: float = 0.05, max_sites: int = 200):
+        self.threshold = threshold
+        self.interval = interval
+        self.check_interval = max(threshold / 2, 0.005)
+        self.max_sites = max_sites
+        self.sites: Dict[str, StallSite] = {}
+        self.total_stalls = 0
+        self.uncaptured_stalls = 0
+        self._lock = threading.Lock()
+        self._last_beat = time.perf_counter()
+        self._pending: Optional[Tuple[float, StackKey]] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self.lag = registry.gauge('milapp_event_loop_lag_seconds', 'Último atraso medido do event loop')
+        self.lag_histogram = registry.histogram(
+            'milapp_event_loop_lag_distribution_seconds', 'Distribuição do atraso do event loop',
+            buckets=LOOP_LAG_BUCKETS
+        )
+        self.stalls_total = registry.counter(
+            'milapp_event_loop_stalls_total', 'Bloqueios do event loop acima do limite'
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Inicia heartbeat (no loop atual) e thread de vigilância"""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat(), name="loop-stall-heartbeat")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-stall-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self._last_beat = now
+            lag = max(0.0, now - expected)
+            self.lag.set(lag)
+            self.lag_histogram.observe(lag)
+            if lag >= self.threshold:
+                self._record_stall(lag)
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            beat = self._last_beat
+            blocked = time.perf_counter() - beat - self.interval
+            if blocked < self.threshold:
+                continue
+            with self._lock:
+                if self._pending is not None and self._pending[0] == beat:
+                    continue  # bloqueio já capturado
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = tuple(
+                (entry.filename, entry.lineno, entry.name)
+                for entry in traceback.extract_stack(frame, limit=_MAX_STACK_DEPTH)
+            )
+            del frame
+            with self._lock:
+                self._pending = (beat, stack)
+
+    def _record_stall(self, duration: float):
+        """Chamado no loop quando o heartbeat volta após um bloqueio"""
+        self.total_stalls += 1
+        self.stalls_total.inc()
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            self.uncaptured_stalls += 1
+            return
+
+        stack = pending[1]
+        key = _call_site(stack)
+        site = self.sites.get(key)
+        if site is None:
+            if len(self.sites) >= self.max_sites:
+                evicted = min(self.sites.values(), key=lambda s: s.total_seconds)
+                del self.sites[evicted.call_site]
+            site = self.sites[key] = StallSite(call_site=key)
+        site.count += 1
+        site.total_seconds += duration
+        site.max_seconds = max(site.max_seconds, duration)
+        site.last_seen = time.time()
+        if stack in site.stacks or len(site.stacks) < _MAX_STACKS_PER_SITE:
+            site.stacks[stack] = site.stacks.get(stack, 0) + 1
+
+    def report(self, limit: int = 20) -> Dict[str, Any]:
+        """Bloqueios agregados por ponto de chamada, do maior tempo total ao menor"""
+        sites = sorted(self.sites.values(), key=lambda s: s.total_seconds, reverse=True)[:limit]
+        return {
+            'threshold_ms': self.threshold * 1000,
+            'running': self.running,
+            'total_stalls': self.total_stalls,
+            'uncaptured_stalls': self.uncaptured_stalls,
+            'lag_ms': self.lag.value * 1000,
+            'lag_p99_ms': (self.lag_histogram.quantile(0.99) or 0.0) * 1000,
+            'sites': [
+                {
+                    'call_site': site.call_site,
+                    'count': site.count,
+                    'total_ms': round(site.total_seconds * 1000, 3),
+                    'max_ms': round(site.max_seconds * 1000, 3),
+                    'avg_ms': round(site.total_seconds / site.count * 1000, 3),
+                    'last_seen': site.last_seen,
+                    'stacks': [
+                        {
+                            'count': count,
+                            'frames': [f"{filename}:{lineno} in {name}" for filename, lineno, name in stack]
+                        }
+                        for stack, count in sorted(site.stacks.items(), key=lambda item: -item[1])
+                    ]
+                }
+                for site in sites
+            ]
+        }
+
+    def reset(self):
+        self.sites.clear()
+        self.total_stalls = 0
+        self.uncaptured_stalls = 0
@@ -0,0 +1,405 @@
+"""
+Registro de métricas no formato de exposição texto do Prometheus
+"""
+
+import math
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Amostra produzida por coletores: (nome, labels, valor)
+Sample = Tuple[str, Dict[str, str], float]
+
+# Família: (nome, documentação, tipo, modo multiprocesso, amostras)
+Family = Tuple[str, str, str, str, List[Sample]]
+
+# Como combinar a métrica entre workers (ver multiprocess_metrics):
+# sum/max/min, last (worker mais recente) ou all (uma série por worker)
+MULTIPROCESS_MODES = ("sum", "max", "min", "last", "all")
+
+
+def _escape(value: str) -> str:
+    """Escapa valor de label conforme o formato texto"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str]) -> str:
+    """Monta o bloco {a="b",...} de uma série"""
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    """Formata valor numérico (inteiros sem casa decimal)"""
+    try:
+        as_int = int(value)
+    except (OverflowError, ValueError):
+        if value != value:
+            return "NaN"
+        return "+Inf" if value > 0 else "-Inf"
+    if as_int == value:
+        return str(as_int)
+    return repr(float(value))
+
+
+class _Metric:
+    """Base para métricas com labels"""
+
+    type_name = "untyped"
+    default_multiprocess_mode = "all"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 multiprocess_mode: Optional[str] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.multiprocess_mode = multiprocess_mode or self.default_multiprocess_mode
+        if self.multiprocess_mode not in MULTIPROCESS_MODES:
+            raise ValueError(f"{name}: modo multiprocesso inválido {self.multiprocess_mode}")
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        self._header = f"# HELP {name} {documentation}\n# TYPE {name} {self.type_name}\n".encode("utf-8")
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *labelvalues: str):
+        """Obtém (ou cria) a série para os valores de label informados"""
+        child = self._children.get(labelvalues)
+        if child is not None:
+            return child
+        key = tuple(str(v) for v in labelvalues)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: esperado {len(self.labelnames)} labels, recebido {len(key)}")
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child(key)
+                    self._children[key] = child
+        return child
+
+    def remove(self, *labelvalues: str):
+        """Remove uma série"""
+        with self._lock:
+            self._children.pop(tuple(str(v) for v in labelvalues), None)
+
+    def clear(self):
+        """Remove todas as séries"""
+        with self._lock:
+            self._children.clear()
+            if not self.labelnames:
+                self._default = self.labels()
+
+    def series_count(self) -> int:
+        return len(self._children)
+
+    def series(self) -> List[Tuple[Tuple[str, ...], object]]:
+        """Pares (valores de label, série)"""
+        return list(self._children.items())
+
+    def _new_child(self, key: Tuple[str, ...]):
+        raise NotImplementedError
+
+    def render(self, out: List[bytes]):
+        out.append(self._header)
+        for child in list(self._children.values()):
+            out.append(child.render())
+
+    def collect(self) -> List[Sample]:
+        """Amostras atuais como (nome, labels, valor)"""
+        samples = []
+        for key, child in list(self._children.items()):
+            child.collect(self.name, dict(zip(self.labelnames, key)), samples)
+        return samples
+
+
+class _ValueChild:
+    # O texto de cada série é reaproveitado enquanto o valor não muda,
+    # de modo que o custo do scrape acompanha apenas as séries alteradas
+    __slots__ = ("value", "_prefix", "_cached_value", "_cached")
+
+    def __init__(self, prefix: str):
+        self.value = 0.0
+        self._prefix = prefix
+        self._cached_value = None
+        self._cached = b""
+
+    def collect(self, name: str, labels: Dict[str, str], samples: List[Sample]):
+        samples.append((name, labels, self.value))
+
+    def render(self) -> bytes:
+        value = self.value
+        if value != self._cached_value:
+            self._cached = f"{self._prefix} {_format_value(value)}\n".encode("utf-8")
+            self._cached_value = value
+        return self._cached
+
+
+class _CounterChild(_ValueChild):
+    __slots__ = ()
+
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Contadores só podem ser incrementados")
+        self.value += amount
+
+
+class _GaugeChild(_ValueChild):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Counter(_Metric):
+    """Contador monotônico"""
+
+    type_name = "counter"
+    default_multiprocess_mode = "sum"
+
+    def _new_child(self, key):
+        return _CounterChild(self.name + _format_labels(self.labelnames, key))
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    @property
+    def value(self) -> float:
+        return self._default.value
+
+
+class Gauge(_Metric):
+    """Valor instantâneo"""
+
+    type_name = "gauge"
+
+    def _new_child(self, key):
+        return _GaugeChild(self.name + _format_labels(self.labelnames, key))
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+
+    @property
+    def value(self) -> float:
+        return self._default.value
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "version", "_bucket_prefixes",
+                 "_sum_prefix", "_count_prefix", "_cached_version", "_cached")
+
+    def __init__(self, name: str, labelnames: Sequence[str], key: Sequence[str], upper_bounds: Sequence[float]):
+        self.upper_bounds = upper_bounds
+        # Contagem não cumulativa por bucket; o último é o +Inf
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.version = 0
+        bucket_names = tuple(labelnames) + ("le",)
+        self._bucket_prefixes = [
+            f"{name}_bucket" + _format_labels(bucket_names, tuple(key) + (_format_value(bound),)) + " "
+            for bound in tuple(upper_bounds) + (math.inf,)
+        ]
+        labels = _format_labels(labelnames, key)
+        self._sum_prefix = f"{name}_sum{labels} "
+        self._count_prefix = f"{name}_count{labels} "
+        self._cached_version = -1
+        self._cached = b""
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.version += 1
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def cumulative_counts(self) -> List[int]:
+        total = 0
+        cumulative = []
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estima o quantil por interpolação linear dentro do bucket"""
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        lower = 0.0
+        for index, count in enumerate(self.counts):
+            upper = self.upper_bounds[index] if index < len(self.upper_bounds) else lower
+            if count and cumulative + count >= rank:
+                return lower + (upper - lower) * ((rank - cumulative) / count)
+            cumulative += count
+            lower = upper
+        return lower
+
+    def collect(self, name: str, labels: Dict[str, str], samples: List[Sample]):
+        cumulative = self.cumulative_counts()
+        bounds = [_format_value(bound) for bound in self.upper_bounds] + ["+Inf"]
+        for bound, total in zip(bounds, cumulative):
+            samples.append((f"{name}_bucket", {**labels, "le": bound}, total))
+        samples.append((f"{name}_sum", labels, self.sum))
+        samples.append((f"{name}_count", labels, cumulative[-1]))
+
+    def render(self) -> bytes:
+        if self.version != self._cached_version:
+            version = self.version
+            cumulative = self.cumulative_counts()
+            lines = [f"{prefix}{total}\n" for prefix, total in zip(self._bucket_prefixes, cumulative)]
+            lines.append(f"{self._sum_prefix}{_format_value(self.sum)}\n{self._count_prefix}{cumulative[-1]}\n")
+            self._cached = "".join(lines).encode("utf-8")
+            self._cached_version = version
+        return self._cached
+
+
+class Histogram(_Metric):
+    """Histograma com buckets fixos"""
+
+    type_name = "histogram"
+    default_multiprocess_mode = "sum"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, multiprocess_mode: Optional[str] = None):
+        self.upper_bounds = tuple(sorted(float(b) for b in buckets if b != math.inf))
+        super().__init__(name, documentation, labelnames, multiprocess_mode)
+
+    def _new_child(self, key):
+        return _HistogramChild(self.name, self.labelnames, key, self.upper_bounds)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self._default.quantile(q)
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas e coletores executados no momento do scrape
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Tuple[str, str, str, Callable[[], Iterable[Sample]], str]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Métrica já registrada com outra definição: {metric.name}")
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              multiprocess_mode: str = "all") -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, multiprocess_mode))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def register_collector(self, name: str, documentation: str, metric_type: str,
+                           collect: Callable[[], Iterable[Sample]], multiprocess_mode: str = "all"):
+        """
+        Registra função chamada a cada scrape (ex.: estatísticas do pool do banco)
+        """
+        if multiprocess_mode not in MULTIPROCESS_MODES:
+            raise ValueError(f"{name}: modo multiprocesso inválido {multiprocess_mode}")
+        with self._lock:
+            self._collectors = [c for c in self._collectors if c[0] != name]
+            self._collectors.append((name, documentation, metric_type, collect, multiprocess_mode))
+
+    def series_count(self) -> int:
+        return sum(metric.series_count() for metric in list(self._metrics.values()))
+
+    def collect(self) -> List[Sample]:
+        """Amostras de todas as métricas e coletores (usadas na avaliação de regras)"""
+        samples: List[Sample] = []
+        for metric in list(self._metrics.values()):
+            samples.extend(metric.collect())
+        for collector in list(self._collectors):
+            try:
+                samples.extend(collector[3]())
+            except Exception:
+                continue
+        return samples
+
+    def families(self) -> List[Family]:
+        """Métricas agrupadas por família, com tipo e modo de agregação entre workers"""
+        families: List[Family] = []
+        for metric in list(self._metrics.values()):
+            families.append((metric.name, metric.documentation, metric.type_name,
+                             metric.multiprocess_mode, metric.collect()))
+        for name, documentation, metric_type, collect, mode in list(self._collectors):
+            try:
+                samples = list(collect())
+            except Exception:
+                continue
+            families.append((name, documentation, metric_type, mode, samples))
+        return families
+
+    def render(self) -> bytes:
+        """Gera a exposição completa no formato texto"""
+        out: List[bytes] = []
+        for metric in list(self._metrics.values()):
+            metric.render(out)
+
+        for name, documentation, metric_type, collect, _ in list(self._collectors):
+            try:
+                samples = list(collect())
+            except Exception:
+                continue
+            if samples:
+                out.append(_render_family(name, documentation, metric_type, samples))
+
+        return b"".join(out)
+
+
+def _render_family(name: str, documentation: str, metric_type: str, samples: Iterable[Sample]) -> bytes:
+    lines = [f"# HELP {name} {documentation}\n# TYPE {name} {metric_type}\n"]
+    for sample_name, labels, value in samples:
+        label_block = _format_labels(tuple(labels), tuple(labels.values()))
+        lines.append(f"{sample_name}{label_block} {_format_value(value)}\n")
+    return "".join(lines).encode("utf-8")
+
+
+def render_families(families: Iterable[Family]) -> bytes:
+    """Exposição texto a partir de famílias já coletadas (ex.: visão agregada)"""
+    return b"".join(
+        _render_family(name, documentation, metric_type, samples)
+        for name, documentation, metric_type, _, samples in families
+        if samples
+    )
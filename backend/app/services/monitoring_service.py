@@ -1,12 +1,18 @@
 import logging
-import time
 import psutil
-import threading
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 from collections import defaultdict, deque
 from dataclasses import dataclass, asdict
+from pathlib import Path
 from app.core.config import settings
+from app.services.alert_engine import Alert, AlertStore, RuleEngine
+from app.services.loop_monitor import LoopStallMonitor
+from app.services.metrics_registry import MetricsRegistry, render_families
+from app.services.multiprocess_metrics import MultiprocessAggregator
+from app.services.rollup_store import RollupStore
+from app.services.runtime_metrics import RuntimeMetricsCollector
+from app.services.sliding_window import SlidingWindowCounter
 
 logger = logging.getLogger(__name__)
 
@@ -17,16 +23,6 @@ class MetricPoint:
     value: float
     labels: Dict[str, str]
 
-@dataclass
-class Alert:
-    """Alerta do sistema"""
-    id: str
-    severity: str  # 'info', 'warning', 'error', 'critical'
-    message: str
-    timestamp: datetime
-    resolved: bool = False
-    metadata: Dict[str, Any] = None
-
 class MonitoringService:
     """
     Serviço de monitoramento para coletar métricas e alertas
@@ -34,12 +30,32 @@ class MonitoringService:
     
     def __init__(self):
         self.metrics: Dict[str, deque] = defaultdict(lambda: deque(maxlen=1000))
-        self.alerts: List[Alert] = []
+        self.alert_store = AlertStore(
+            expire_after=settings.MONITORING_ALERT_EXPIRE_SECONDS,
+            resolved_retention=settings.MONITORING_ALERT_RETENTION_SECONDS
+        )
+        self.rule_engine = RuleEngine(
+            self.alert_store,
+            target_labels={'job': settings.MONITORING_RULES_JOB, 'service': settings.MONITORING_RULES_JOB},
+            default_keep_firing_for=settings.MONITORING_ALERT_KEEP_FIRING_SECONDS
+        )
+        self._rules_loaded = False
+        self._host_samples: List[tuple] = []
         self.performance_data: Dict[str, List[float]] = defaultdict(list)
         self.error_counts: Dict[str, int] = defaultdict(int)
         self.request_times: deque = deque(maxlen=1000)
-        self.monitoring_thread = None
-        self.running = False
+        self._recent_durations: deque = deque(maxlen=100)
+        self._recent_total = 0.0
+        self._status_labels: Dict[int, tuple] = {}
+        # Totais desde a subida (o canal em tempo real deriva a vazão das diferenças)
+        self.requests_served = 0
+        self.errors_served = 0
+        # Requisições por (rota, classe de status) em buckets de 10s
+        self.request_window = SlidingWindowCounter(
+            window_seconds=settings.MONITORING_ERROR_WINDOW_SECONDS,
+            bucket_seconds=10
+        )
+        self.error_status_classes = {'5xx'}
         
         # Limites de alerta
         self.thresholds = {
@@ -49,40 +65,76 @@ class MonitoringService:
             'response_time': 2.0,
             'error_rate': 5.0
         }
-    
-    def start_monitoring(self):
-        """Inicia o monitoramento em background"""
-        if self.monitoring_thread and self.monitoring_thread.is_alive():
-            return
         
-        self.running = True
-        self.monitoring_thread = threading.Thread(target=self._monitor_loop, daemon=True)
-        self.monitoring_thread.start()
+        # Métricas no formato Prometheus
+        self.registry = MetricsRegistry()
+        self._gauges: Dict[str, Any] = {}
+        self.http_requests_total = self.registry.counter(
+            'http_requests_total', 'Total de requisições HTTP', ('method', 'route', 'status')
+        )
+        self.http_request_duration = self.registry.histogram(
+            'http_request_duration_seconds', 'Latência das requisições HTTP', ('method', 'route')
+        )
+        self.errors_total = self.registry.counter(
+            'milapp_errors_total', 'Total de erros registrados', ('type',)
+        )
+        self.ai_requests_total = self.registry.counter(
+            'milapp_ai_requests_total', 'Chamadas aos modelos de IA', ('model',)
+        )
+        self.ai_tokens_total = self.registry.counter(
+            'milapp_ai_tokens_total', 'Tokens consumidos nos modelos de IA', ('model', 'kind')
+        )
+        self.registry.register_collector(
+            'milapp_alerts_active', 'Alertas ativos', 'gauge', self._collect_alert_stats,
+            multiprocess_mode='max'
+        )
+        self.registry.register_collector(
+            'milapp_http_requests_window', 'Requisições na janela da taxa de erro', 'gauge',
+            self._collect_window_stats, multiprocess_mode='sum'
+        )
+        self.registry.register_collector(
+            'milapp_db_pool_connections', 'Conexões do pool do banco', 'gauge', self._collect_db_pool_stats,
+            multiprocess_mode='sum'
+        )
+        self.rollups = RollupStore(
+            settings.MONITORING_ROLLUP_DIR, max_series=settings.MONITORING_ROLLUP_MAX_SERIES
+        ) if settings.MONITORING_ROLLUP_ENABLED else None
+        self.loop_monitor = LoopStallMonitor(
+            self.registry, threshold=settings.MONITORING_LOOP_STALL_THRESHOLD_MS / 1000
+        )
+        self.collector = RuntimeMetricsCollector(
+            self, interval=settings.MONITORING_COLLECT_INTERVAL_SECONDS
+        )
+        # Com vários workers, /metrics, /performance e /alerts combinam todos eles
+        self.multiprocess = MultiprocessAggregator(
+            settings.MONITORING_MULTIPROCESS_DIR, self._multiprocess_snapshot,
+            interval=settings.MONITORING_MULTIPROCESS_PUBLISH_SECONDS
+        ) if settings.MONITORING_MULTIPROCESS_DIR else None
+    
+    async def start_monitoring(self):
+        """Inicia o coletor assíncrono no event loop atual"""
+        self.load_alert_rules()
+        await self.loop_monitor.start()
+        await self.collector.start()
+        if self.multiprocess is not None:
+            await self.multiprocess.start()
         logger.info("Monitoramento iniciado")
     
-    def stop_monitoring(self):
+    async def stop_monitoring(self):
         """Para o monitoramento"""
-        self.running = False
-        if self.monitoring_thread:
-            self.monitoring_thread.join(timeout=5)
+        await self.collector.stop()
+        await self.loop_monitor.stop()
+        if self.multiprocess is not None:
+            await self.multiprocess.stop()
+        if self.rollups is not None:
+            self.rollups.close()
         logger.info("Monitoramento parado")
     
-    def _monitor_loop(self):
-        """Loop principal de monitoramento"""
-        while self.running:
-            try:
-                self._collect_system_metrics()
-                self._check_thresholds()
-                time.sleep(30)  # Coleta a cada 30 segundos
-            except Exception as e:
-                logger.error(f"Erro no loop de monitoramento: {e}")
-                time.sleep(60)
-    
     def _collect_system_metrics(self):
         """Coleta métricas do sistema"""
         try:
-            # CPU
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # CPU (delta desde a coleta anterior, sem bloquear)
+            cpu_percent = psutil.cpu_percent(interval=None)
             self.add_metric('system.cpu_usage', cpu_percent, {'type': 'percentage'})
             
             # Memória
@@ -95,6 +147,14 @@ class MonitoringService:
             self.add_metric('system.disk_usage', (disk.used / disk.total) * 100, {'type': 'percentage'})
             self.add_metric('system.disk_available', disk.free / (1024**3), {'type': 'gb'})
             
+            # Equivalentes às séries do node_exporter usadas nas regras de alerta
+            self._host_samples = [
+                ('node_memory_MemTotal_bytes', {}, memory.total),
+                ('node_memory_MemAvailable_bytes', {}, memory.available),
+                ('node_filesystem_size_bytes', {'mountpoint': '/'}, disk.total),
+                ('node_filesystem_free_bytes', {'mountpoint': '/'}, disk.free)
+            ]
+            
             # Rede
             network = psutil.net_io_counters()
             self.add_metric('system.network_bytes_sent', network.bytes_sent, {'type': 'bytes'})
@@ -111,9 +171,28 @@ class MonitoringService:
             labels=labels or {}
         )
         self.metrics[name].append(metric_point)
+        if self.rollups is not None:
+            self.rollups.record(name, value, labels)
+        
+        gauge = self._gauges.get(name)
+        if gauge is None:
+            gauge = self.registry.gauge(
+                'milapp_' + name.replace('.', '_'), f"Último valor de {name}", multiprocess_mode='last'
+            )
+            self._gauges[name] = gauge
+        gauge.set(value)
     
-    def record_request_time(self, endpoint: str, method: str, duration: float):
+    def record_request_time(self, endpoint: str, method: str, duration: float, status_code: int = 200):
         """Registra tempo de resposta de uma requisição"""
+        status = self._status_labels.get(status_code)
+        if status is None:
+            status = self._status_labels[status_code] = (str(status_code), f"{status_code // 100}xx")
+        self.http_requests_total.labels(method, endpoint, status[0]).inc()
+        self.http_request_duration.labels(method, endpoint).observe(duration)
+        self.request_window.increment((endpoint, status[1]))
+        self.requests_served += 1
+        if status[1] in self.error_status_classes:
+            self.errors_served += 1
         self.request_times.append({
             'timestamp': datetime.now(),
             'endpoint': endpoint,
@@ -121,10 +200,12 @@ class MonitoringService:
             'duration': duration
         })
         
-        # Calcula tempo médio de resposta
-        recent_times = [r['duration'] for r in list(self.request_times)[-100:]]
-        avg_time = sum(recent_times) / len(recent_times)
-        self.add_metric('api.response_time_avg', avg_time, {'endpoint': endpoint})
+        # Média móvel das últimas 100 requisições (O(1); publicada a cada coleta)
+        recent = self._recent_durations
+        if len(recent) == recent.maxlen:
+            self._recent_total -= recent[0]
+        recent.append(duration)
+        self._recent_total += duration
         
         # Alerta se tempo muito alto
         if duration > self.thresholds['response_time']:
@@ -137,23 +218,118 @@ class MonitoringService:
     def record_error(self, error_type: str, error_message: str):
         """Registra um erro"""
         self.error_counts[error_type] += 1
+        self.errors_total.labels(error_type).inc()
+    
+    def _window_routes(self) -> Dict[str, Dict[str, int]]:
+        """Requisições e erros por rota na janela deslizante"""
+        routes: Dict[str, Dict[str, int]] = defaultdict(lambda: {'requests': 0, 'errors': 0})
+        for (route, status_class), count in self.request_window.totals().items():
+            routes[route]['requests'] += count
+            if status_class in self.error_status_classes:
+                routes[route]['errors'] += count
+        return dict(routes)
+    
+    def get_error_rates(self, routes: Optional[Dict[str, Dict[str, int]]] = None) -> Dict[str, Any]:
+        """
+        Taxa de erro (%) na janela deslizante, global e por rota
+        """
+        if routes is None:
+            routes = self._window_routes()
         
-        # Calcula taxa de erro
-        total_requests = len(self.request_times)
-        if total_requests > 0:
-            error_rate = (sum(self.error_counts.values()) / total_requests) * 100
-            self.add_metric('api.error_rate', error_rate, {'type': 'percentage'})
-            
-            if error_rate > self.thresholds['error_rate']:
-                self.create_alert(
-                    'high_error_rate',
-                    'error',
-                    f"Taxa de erro alta: {error_rate:.1f}%"
-                )
+        total_requests = sum(r['requests'] for r in routes.values())
+        total_errors = sum(r['errors'] for r in routes.values())
+        return {
+            'window_seconds': self.request_window.window_seconds,
+            'requests': total_requests,
+            'errors': total_errors,
+            'error_rate': (total_errors / total_requests * 100) if total_requests else 0.0,
+            'routes': {
+                route: {**stats, 'error_rate': stats['errors'] / stats['requests'] * 100}
+                for route, stats in routes.items()
+            }
+        }
+    
+    def _check_error_rate(self):
+        """Atualiza a métrica api.error_rate e alerta conforme a janela"""
+        rates = self.get_error_rates()
+        if rates['requests'] == 0:
+            return
+        
+        error_rate = rates['error_rate']
+        self.add_metric('api.error_rate', error_rate, {'type': 'percentage'})
+        
+        if rates['requests'] < settings.MONITORING_ERROR_MIN_REQUESTS:
+            return
+        if error_rate > self.thresholds['error_rate']:
+            self.create_alert(
+                'high_error_rate',
+                'error',
+                f"Taxa de erro alta: {error_rate:.1f}% nos últimos {rates['window_seconds']}s",
+                {'requests': rates['requests'], 'errors': rates['errors']}
+            )
+        else:
+            self.resolve_alert('high_error_rate')
+    
+    def record_ai_usage(self, model: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        """Registra consumo de tokens de uma chamada de IA"""
+        self.ai_requests_total.labels(model).inc()
+        if prompt_tokens:
+            self.ai_tokens_total.labels(model, 'prompt').inc(prompt_tokens)
+        if completion_tokens:
+            self.ai_tokens_total.labels(model, 'completion').inc(completion_tokens)
+    
+    def render_prometheus(self) -> bytes:
+        """Gera a exposição das métricas no formato texto do Prometheus"""
+        if self.multiprocess is not None:
+            self.multiprocess.publish()
+            return render_families(self.multiprocess.merged_families())
+        return self.registry.render()
+    
+    def _multiprocess_snapshot(self) -> Dict[str, Any]:
+        """Conteúdo publicado por este worker para a visão combinada"""
+        return {
+            'families': self.registry.families(),
+            'performance': self._performance_state(),
+            'alerts': [
+                {**asdict(alert), 'timestamp': alert.timestamp.isoformat(),
+                 'resolved_at': alert.resolved_at.isoformat() if alert.resolved_at else None}
+                for alert in self.alert_store.all()
+            ]
+        }
+    
+    def _collect_alert_stats(self):
+        """Coletor de alertas ativos por severidade"""
+        counts: Dict[str, int] = defaultdict(int)
+        for alert in self.alert_store.active():
+            counts[alert.severity] += 1
+        return [('milapp_alerts_active', {'severity': severity}, count) for severity, count in counts.items()]
+    
+    def _collect_window_stats(self):
+        """Coletor das requisições por rota e classe de status na janela"""
+        return [
+            ('milapp_http_requests_window', {'route': route, 'status_class': status_class}, count)
+            for (route, status_class), count in self.request_window.totals().items()
+        ]
+    
+    def _collect_db_pool_stats(self):
+        """Coletor de estatísticas do pool de conexões do SQLAlchemy"""
+        try:
+            from app.core.database import get_pool_stats
+        except Exception:
+            return []
+        return [
+            ('milapp_db_pool_connections', {'state': state}, value)
+            for state, value in get_pool_stats().items()
+        ]
     
     def _check_thresholds(self):
         """Verifica limites e cria alertas"""
         try:
+            if self._recent_durations:
+                self.add_metric('api.response_time_avg', self._recent_total / len(self._recent_durations))
+            self._check_error_rate()
+            self.evaluate_alert_rules()
+            
             # CPU
             cpu_metric = self.get_latest_metric('system.cpu_usage')
             if cpu_metric and cpu_metric.value > self.thresholds['cpu_usage']:
@@ -198,42 +374,86 @@ class MonitoringService:
         cutoff_time = datetime.now() - timedelta(minutes=minutes)
         return [m for m in self.metrics[name] if m.timestamp > cutoff_time]
     
+    def get_metric_history(self, name: str, minutes: int = 1440, resolution: Optional[int] = None,
+                           labels: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Histórico agregado (min/max/avg) a partir dos arquivos de rollup"""
+        if self.rollups is None:
+            return {'name': name, 'series': [], 'message': 'Rollups desabilitados'}
+        now = datetime.now().timestamp()
+        return self.rollups.query(name, now - minutes * 60, now, labels=labels, resolution=resolution)
+    
+    @property
+    def alerts(self) -> List[Alert]:
+        """Todos os alertas retidos (ativos e resolvidos recentes)"""
+        if self.multiprocess is not None:
+            return self._merged_alerts()
+        return self.alert_store.all()
+    
     def create_alert(self, alert_id: str, severity: str, message: str, metadata: Dict[str, Any] = None):
-        """Cria um novo alerta"""
-        # Verifica se já existe alerta similar não resolvido
-        for alert in self.alerts:
-            if alert.id == alert_id and not alert.resolved:
-                return  # Alerta já existe
-        
-        alert = Alert(
-            id=alert_id,
-            severity=severity,
-            message=message,
-            timestamp=datetime.now(),
-            metadata=metadata or {}
-        )
-        
-        self.alerts.append(alert)
-        logger.warning(f"Alerta criado: {severity.upper()} - {message}")
+        """Cria um novo alerta (ou renova o existente, sem duplicar)"""
+        alert, created = self.alert_store.upsert(alert_id, severity, message, metadata)
+        if created:
+            logger.warning(f"Alerta criado: {severity.upper()} - {message}")
     
     def resolve_alert(self, alert_id: str):
         """Marca um alerta como resolvido"""
-        for alert in self.alerts:
-            if alert.id == alert_id:
-                alert.resolved = True
-                logger.info(f"Alerta resolvido: {alert_id}")
-                break
+        if self.alert_store.resolve(alert_id):
+            logger.info(f"Alerta resolvido: {alert_id}")
     
     def get_active_alerts(self) -> List[Alert]:
         """Obtém alertas ativos (não resolvidos)"""
-        return [alert for alert in self.alerts if not alert.resolved]
+        if self.multiprocess is not None:
+            return [alert for alert in self._merged_alerts() if not alert.resolved]
+        return self.alert_store.active()
+    
+    def _merged_alerts(self) -> List[Alert]:
+        """Alertas deste worker e dos demais, sem duplicar por fingerprint"""
+        merged: Dict[str, Alert] = {alert.fingerprint: alert for alert in self.alert_store.all()}
+        for snapshot in self.multiprocess.peer_snapshots():
+            for data in snapshot.get('alerts', ()):
+                current = merged.get(data['fingerprint'])
+                if current is not None and (data['resolved'] or not current.resolved):
+                    continue
+                merged[data['fingerprint']] = Alert(**{
+                    **data,
+                    'timestamp': datetime.fromisoformat(data['timestamp']),
+                    'resolved_at': datetime.fromisoformat(data['resolved_at']) if data['resolved_at'] else None
+                })
+        return list(merged.values())
+    
+    def load_alert_rules(self, path: Optional[str] = None) -> int:
+        """Carrega as regras de alerta (por padrão monitoring/medsenior-rules.yml)"""
+        if self._rules_loaded and path is None:
+            return len(self.rule_engine.rules)
+        
+        rules_path = Path(path or settings.MONITORING_RULES_FILE or
+                          Path(__file__).resolve().parents[3] / 'monitoring' / 'medsenior-rules.yml')
+        self._rules_loaded = True
+        if not rules_path.exists():
+            logger.info(f"Arquivo de regras não encontrado: {rules_path}")
+            return 0
+        try:
+            return self.rule_engine.load_file(rules_path)
+        except Exception as e:
+            logger.error(f"Erro ao carregar regras de alerta: {e}")
+            return 0
+    
+    def evaluate_alert_rules(self) -> List[Alert]:
+        """Avalia as regras carregadas contra as séries do processo"""
+        samples = self.registry.collect()
+        samples.extend(self._host_samples)
+        samples.append(('up', {}, 1))
+        health = self.get_system_health()
+        samples.append(('health_check_status', {}, 0 if health['status'] == 'critical' else 1))
+        return self.rule_engine.evaluate(samples)
     
     def get_system_health(self) -> Dict[str, Any]:
         """Obtém status geral de saúde do sistema"""
         cpu_metric = self.get_latest_metric('system.cpu_usage')
         memory_metric = self.get_latest_metric('system.memory_usage')
         disk_metric = self.get_latest_metric('system.disk_usage')
-        error_rate_metric = self.get_latest_metric('api.error_rate')
+        error_rates = self.get_error_rates()
+        error_rate = error_rates['error_rate'] if error_rates['requests'] else None
         
         # Calcula score de saúde (0-100)
         health_score = 100
@@ -253,9 +473,9 @@ class MonitoringService:
         elif disk_metric and disk_metric.value > 80:
             health_score -= 15
             
-        if error_rate_metric and error_rate_metric.value > 5:
+        if error_rate is not None and error_rate > 5:
             health_score -= 25
-        elif error_rate_metric and error_rate_metric.value > 2:
+        elif error_rate is not None and error_rate > 2:
             health_score -= 10
         
         return {
@@ -265,45 +485,104 @@ class MonitoringService:
                 'cpu_usage': cpu_metric.value if cpu_metric else None,
                 'memory_usage': memory_metric.value if memory_metric else None,
                 'disk_usage': disk_metric.value if disk_metric else None,
-                'error_rate': error_rate_metric.value if error_rate_metric else None
+                'error_rate': error_rate
             },
             'active_alerts': len(self.get_active_alerts()),
             'total_requests': len(self.request_times)
         }
     
+    def _performance_state(self) -> Dict[str, Any]:
+        """Contadores brutos do resumo de performance (combináveis entre workers)"""
+        endpoints: Dict[str, Dict[str, float]] = defaultdict(lambda: {'count': 0, 'total_time': 0.0})
+        for request in self.request_times:
+            stats = endpoints[request['endpoint']]
+            stats['count'] += 1
+            stats['total_time'] += request['duration']
+        return {
+            'total_requests': len(self.request_times),
+            'requests_served': self.requests_served,
+            'errors_served': self.errors_served,
+            'recent_durations': list(self._recent_durations),
+            'error_count': sum(self.error_counts.values()),
+            'window_routes': self._window_routes(),
+            'endpoints': dict(endpoints)
+        }
+    
+    @staticmethod
+    def _merge_performance_states(states: List[Dict[str, Any]]) -> Dict[str, Any]:
+        endpoints: Dict[str, Dict[str, float]] = defaultdict(lambda: {'count': 0, 'total_time': 0.0})
+        routes: Dict[str, Dict[str, int]] = defaultdict(lambda: {'requests': 0, 'errors': 0})
+        merged = {
+            'total_requests': 0, 'requests_served': 0, 'errors_served': 0, 'recent_durations': [], 'error_count': 0
+        }
+        for state in states:
+            merged['total_requests'] += state['total_requests']
+            merged['requests_served'] += state.get('requests_served', 0)
+            merged['errors_served'] += state.get('errors_served', 0)
+            merged['recent_durations'].extend(state['recent_durations'])
+            merged['error_count'] += state['error_count']
+            for endpoint, stats in state['endpoints'].items():
+                endpoints[endpoint]['count'] += stats['count']
+                endpoints[endpoint]['total_time'] += stats['total_time']
+            for route, stats in state['window_routes'].items():
+                routes[route]['requests'] += stats['requests']
+                routes[route]['errors'] += stats['errors']
+        merged['endpoints'] = dict(endpoints)
+        merged['window_routes'] = dict(routes)
+        return merged
+    
+    def _combined_performance_state(self) -> tuple:
+        """Estado deste worker somado ao publicado pelos demais; devolve (estado, workers)"""
+        state = self._performance_state()
+        if self.multiprocess is None:
+            return state, 1
+        peers = [snap['performance'] for snap in self.multiprocess.peer_snapshots() if 'performance' in snap]
+        return self._merge_performance_states([state] + peers), 1 + len(peers)
+    
+    def get_realtime_performance(self) -> Dict[str, Any]:
+        """
+        Totais acumulados, taxa de erro da janela e percentis de latência das
+        requisições recentes (todos os workers), para o canal em tempo real
+        """
+        state, workers = self._combined_performance_state()
+        durations = sorted(state['recent_durations'])
+        rates = self.get_error_rates(state['window_routes'])
+        return {
+            'requests_served': state['requests_served'],
+            'errors_served': state['errors_served'],
+            'error_rate': round(rates['error_rate'], 2),
+            'latency_ms': {
+                name: round(durations[min(len(durations) - 1, int(len(durations) * q))] * 1000, 1)
+                for name, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+            } if durations else None,
+            'active_alerts': len(self.get_active_alerts()),
+            'workers': workers
+        }
+    
     def get_performance_summary(self) -> Dict[str, Any]:
         """Obtém resumo de performance"""
-        if not self.request_times:
-            return {'message': 'Nenhuma requisição registrada'}
+        state, workers = self._combined_performance_state()
         
-        recent_requests = list(self.request_times)[-100:]
-        durations = [r['duration'] for r in recent_requests]
+        if not state['total_requests']:
+            return {'message': 'Nenhuma requisição registrada'}
         
-        return {
-            'total_requests': len(self.request_times),
-            'recent_requests': len(recent_requests),
+        durations = state['recent_durations']
+        summary = {
+            'total_requests': state['total_requests'],
+            'recent_requests': len(durations),
             'avg_response_time': sum(durations) / len(durations),
             'min_response_time': min(durations),
             'max_response_time': max(durations),
-            'error_count': sum(self.error_counts.values()),
-            'endpoints': self._get_endpoint_stats()
+            'error_count': state['error_count'],
+            'error_rates': self.get_error_rates(state['window_routes']),
+            'endpoints': {
+                endpoint: {**stats, 'avg_time': stats['total_time'] / stats['count'] if stats['count'] else 0}
+                for endpoint, stats in state['endpoints'].items()
+            }
         }
-    
-    def _get_endpoint_stats(self) -> Dict[str, Dict[str, float]]:
-        """Obtém estatísticas por endpoint"""
-        endpoint_stats = defaultdict(lambda: {'count': 0, 'total_time': 0, 'avg_time': 0})
-        
-        for request in self.request_times:
-            endpoint = request['endpoint']
-            endpoint_stats[endpoint]['count'] += 1
-            endpoint_stats[endpoint]['total_time'] += request['duration']
-        
-        # Calcula tempo médio
-        for endpoint, stats in endpoint_stats.items():
-            if stats['count'] > 0:
-                stats['avg_time'] = stats['total_time'] / stats['count']
-        
-        return dict(endpoint_stats)
+        if self.multiprocess is not None:
+            summary['workers'] = workers
+        return summary
 
 # Instância global do monitoramento
 monitoring_service = MonitoringService() 
\ No newline at end of file
@@ -0,0 +1,316 @@
+"""
+Agregação de métricas entre workers (uvicorn --workers / gunicorn)
+
+Cada worker publica periodicamente um snapshot (famílias de métricas, resumo
+de performance e alertas) num segmento de memória compartilhada próprio
+(arquivo mmap em um diretório tmpfs, ex.: /dev/shm). Quem atende /metrics lê
+todos os segmentos e devolve a visão combinada:
+
+- counters e histogramas são somados, inclusive de workers que já morreram
+  (compactados num segmento de arquivo), para que reinícios de worker não
+  apareçam como reset nos dashboards;
+- gauges seguem o modo da métrica (sum/max/min/last/all) e só consideram
+  workers vivos.
+
+O segmento se chama `worker-<pid>-<sufixo aleatório>.seg`: um worker novo que
+herda o pid de um morto cria o próprio arquivo em vez de truncar o do
+antecessor, que é tratado como morto e compactado.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+from glob import glob
+from typing import Any, Callable, Dict, List, Optional
+
+from app.services.metrics_registry import Family
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MILMPW01"
+# magic, sequência (seqlock: ímpar durante a escrita), tamanho do payload, timestamp
+_HEADER = struct.Struct("<8sQId")
+HEADER_SIZE = 32
+_SEQ_OFFSET = 8
+
+ARCHIVE_FILE = "archive.seg"
+LOCK_FILE = ".lock"
+_CUMULATIVE_TYPES = ("counter", "histogram")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WorkerSegment:
+    """Segmento de tamanho fixo escrito por um único processo"""
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+        with open(path, "wb") as f:
+            f.truncate(size)
+        with open(path, "r+b") as f:
+            self._mm = mmap.mmap(f.fileno(), size)
+        self._seq = 0
+        _HEADER.pack_into(self._mm, 0, MAGIC, 0, 0, 0.0)
+
+    def write(self, payload: bytes, ts: float) -> bool:
+        if len(payload) > self.size - HEADER_SIZE:
+            return False
+        mm = self._mm
+        self._seq += 1
+        struct.pack_into("<Q", mm, _SEQ_OFFSET, self._seq)
+        mm[HEADER_SIZE:HEADER_SIZE + len(payload)] = payload
+        self._seq += 1
+        _HEADER.pack_into(mm, 0, MAGIC, self._seq, len(payload), ts)
+        return True
+
+    def close(self):
+        self._mm.close()
+
+
+def read_segment(path: str, retries: int = 20) -> Optional[Dict[str, Any]]:
+    """Lê um snapshot consistente (repete se o escritor estiver no meio da escrita)"""
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        for _ in range(retries):
+            magic, seq, length, ts = _HEADER.unpack_from(mm, 0)
+            if magic != MAGIC or seq == 0:
+                return None
+            if seq % 2:
+                time.sleep(0.0005)
+                continue
+            payload = mm[HEADER_SIZE:HEADER_SIZE + length]
+            if struct.unpack_from("<Q", mm, _SEQ_OFFSET)[0] != seq:
+                continue
+            snapshot = json.loads(payload)
+            snapshot["ts"] = ts
+            return snapshot
+    except (ValueError, struct.error) as e:
+        logger.warning(f"Segmento de métricas inválido ({path}): {e}")
+    finally:
+        mm.close()
+    return None
+
+
+def merge_families(snapshots: List[Dict[str, Any]]) -> List[Family]:
+    """
+    Combina as famílias de vários snapshots conforme o modo de cada métrica.
+    Snapshots com `live=False` só contribuem com counters e histogramas.
+    """
+    merged: Dict[str, list] = {}
+    for snapshot in sorted(snapshots, key=lambda snap: snap.get("ts", 0.0)):
+        live = snapshot.get("live", True)
+        worker = str(snapshot.get("pid", 0))
+        for name, documentation, metric_type, mode, samples in snapshot.get("families", ()):
+            if not live and metric_type not in _CUMULATIVE_TYPES:
+                continue
+            family = merged.get(name)
+            if family is None:
+                family = merged[name] = [documentation, metric_type, mode, {}]
+            values = family[3]
+            for sample_name, labels, value in samples:
+                if mode == "all":
+                    labels = {**labels, "worker": worker}
+                key = (sample_name, tuple(labels.items()))
+                previous = values.get(key)
+                if previous is None or mode in ("last", "all"):
+                    values[key] = value
+                elif mode == "sum":
+                    values[key] = previous + value
+                elif mode == "max":
+                    values[key] = max(previous, value)
+                elif mode == "min":
+                    values[key] = min(previous, value)
+    return [
+        (name, documentation, metric_type, mode,
+         [(sample_name, dict(label_items), value) for (sample_name, label_items), value in values.items()])
+        for name, (documentation, metric_type, mode, values) in merged.items()
+    ]
+
+
+class MultiprocessAggregator:
+    """
+    Publica o snapshot deste worker e lê/combina os dos demais
+
+    `snapshot` é chamado para montar o conteúdo publicado: um dict com
+    `families` (MetricsRegistry.families()) e quaisquer outros campos
+    serializáveis em JSON (ex.: resumo de performance e alertas).
+    """
+
+    def __init__(self, directory: str, snapshot: Callable[[], Dict[str, Any]],
+                 segment_size: int = 4 * 1024 * 1024, interval: float = 1.0,
+                 stale_after: Optional[float] = None):
+        self.directory = directory
+        self.snapshot = snapshot
+        self.segment_size = segment_size
+        self.interval = interval
+        self.stale_after = stale_after or max(interval * 5, 30.0)
+        self.pid = os.getpid()
+        self._token = os.urandom(4).hex()
+        self._segment: Optional[WorkerSegment] = None
+        self._task: Optional[asyncio.Task] = None
+        self._overflow_logged = False
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"worker-{self.pid}-{self._token}.seg")
+
+    def _ensure_segment(self) -> WorkerSegment:
+        # Após um fork o pid muda: cada processo cria o próprio segmento
+        if self._segment is None or self.pid != os.getpid():
+            if self.pid != os.getpid():
+                self.pid, self._token = os.getpid(), os.urandom(4).hex()
+            os.makedirs(self.directory, exist_ok=True)
+            self._segment = WorkerSegment(self.path, self.segment_size)
+        return self._segment
+
+    async def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self.publish()
+        self._task = asyncio.create_task(self._publish_loop(), name="multiprocess-metrics")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Último snapshot: os counters deste worker seguem somados depois que ele sair
+        self.publish()
+
+    async def _publish_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.publish()
+                self.compact()
+            except Exception as e:
+                logger.error(f"Erro ao publicar métricas do worker: {e}")
+
+    def publish(self):
+        """Grava o snapshot atual deste worker no segmento compartilhado"""
+        segment = self._ensure_segment()
+        content = self.snapshot()
+        content["pid"] = self.pid
+        payload = json.dumps(content, separators=(",", ":"), default=str).encode("utf-8")
+        if not segment.write(payload, time.time()) and not self._overflow_logged:
+            logger.warning(
+                f"Snapshot de métricas ({len(payload)} bytes) maior que o segmento ({self.segment_size})"
+            )
+            self._overflow_logged = True
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), "a+") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_all(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        snapshots = []
+        for path in glob(os.path.join(self.directory, "*.seg")):
+            snapshot = read_segment(path)
+            if snapshot is None:
+                continue
+            pid = snapshot.get("pid", 0)
+            own = path == self.path
+            snapshot["path"] = path
+            snapshot["live"] = own or (
+                pid > 0 and pid != self.pid and _pid_alive(pid) and now - snapshot["ts"] <= self.stale_after
+            )
+            # Mesmo pid em outro arquivo: antecessor morto cujo pid foi reaproveitado por este processo
+            snapshot["dead"] = pid == 0 or (not own and (pid == self.pid or not _pid_alive(pid)))
+            snapshots.append(snapshot)
+        return snapshots
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        """Snapshots de todos os segmentos (vivos, parados e o arquivo de mortos)"""
+        with self._locked(exclusive=False):
+            return self._read_all()
+
+    def peer_snapshots(self) -> List[Dict[str, Any]]:
+        """Snapshots dos outros workers vivos (o atual usa o próprio estado)"""
+        return [snapshot for snapshot in self.snapshots() if snapshot["live"] and snapshot.get("pid") != self.pid]
+
+    def merged_families(self) -> List[Family]:
+        return merge_families(self.snapshots())
+
+    def _dead_segment_paths(self) -> List[str]:
+        """Segmentos de workers mortos, pelo pid no nome do arquivo (sem ler o conteúdo)"""
+        paths = []
+        for path in glob(os.path.join(self.directory, "worker-*.seg")):
+            try:
+                pid = int(os.path.basename(path)[len("worker-"):-len(".seg")].split("-", 1)[0])
+            except ValueError:
+                continue
+            if path == self.path:
+                continue
+            if pid == self.pid or not _pid_alive(pid):
+                paths.append(path)
+        return paths
+
+    def compact(self) -> int:
+        """
+        Incorpora counters/histogramas de workers mortos ao segmento de arquivo
+        e remove os segmentos deles; retorna quantos foram compactados
+
+        Roda a cada publicação em todos os workers: sem worker morto (o caso
+        comum) custa um glob e um kill(pid, 0) por segmento, sem lock nem leitura.
+        Segmentos com o pid deste processo e outro sufixo também contam como
+        mortos (pid reaproveitado).
+        """
+        if not self._dead_segment_paths():
+            return 0
+        with self._locked(exclusive=True):
+            # Outro worker pode ter compactado enquanto este esperava o lock
+            dead_paths = self._dead_segment_paths()
+            if not dead_paths:
+                return 0
+            archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+            archive = [s for s in (read_segment(archive_path),) if s is not None]
+            dead = [s for s in map(read_segment, dead_paths) if s is not None]
+            families = [
+                family for family in merge_families(archive + [{**s, "live": False} for s in dead])
+                if family[2] in _CUMULATIVE_TYPES
+            ]
+            payload = json.dumps({"pid": 0, "families": families}, separators=(",", ":")).encode("utf-8")
+            tmp_path = archive_path + ".tmp"
+            # Segmento novo + rename: leitores veem o arquivo antigo ou o novo, nunca metade
+            segment = WorkerSegment(tmp_path, max(self.segment_size, len(payload) + HEADER_SIZE))
+            segment.write(payload, time.time())
+            segment.close()
+            os.replace(tmp_path, archive_path)
+            for path in dead_paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            logger.info(f"{len(dead_paths)} segmentos de workers encerrados compactados")
+            return len(dead_paths)
+
+    def close(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
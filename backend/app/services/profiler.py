@@ -0,0 +1,170 @@
+"""
+Profiler estatístico sob demanda (amostragem de pilhas de todas as threads)
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+_MAX_DEPTH = 128
+
+# Folhas típicas de threads ociosas (esperando lock, I/O ou fila)
+_IDLE_LEAVES = frozenset((
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+))
+
+
+class ProfilerBusyError(RuntimeError):
+    """Já existe um profile em andamento neste processo"""
+
+
+class ProfileResult:
+    """Pilhas agregadas de um profile (formato collapsed + tabela de funções)"""
+
+    def __init__(self, stacks: Counter, samples: int, duration: float, interval: float,
+                 sampler_cpu: float, idle_samples: int):
+        self.stacks = stacks
+        self.samples = samples
+        self.duration = duration
+        self.interval = interval
+        self.sampler_cpu = sampler_cpu
+        self.idle_samples = idle_samples
+
+    def collapsed(self) -> str:
+        """Uma linha `thread;f1;f2;...;folha N` por pilha (flamegraph.pl / speedscope)"""
+        return "\n".join(
+            f"{';'.join(stack)} {count}"
+            for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1])
+        )
+
+    def top(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Funções por amostras próprias (self) e inclusivas (total)"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for frame in set(stack[1:]):
+                total[frame] += count
+        samples = self.samples or 1
+        return [
+            {
+                'function': frame,
+                'self_samples': own[frame],
+                'total_samples': total[frame],
+                'self_percent': round(own[frame] * 100 / samples, 2),
+                'total_percent': round(total[frame] * 100 / samples, 2)
+            }
+            for frame in sorted(total, key=lambda name: (-own[name], -total[name]))[:limit]
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'samples': self.samples,
+            'idle_samples_skipped': self.idle_samples,
+            'duration_seconds': round(self.duration, 3),
+            'effective_interval_ms': round(self.interval * 1000, 3),
+            'sampler_cpu_seconds': round(self.sampler_cpu, 4),
+            'overhead_ratio': round(self.sampler_cpu / self.duration, 4) if self.duration else 0.0
+        }
+
+
+class SamplingProfiler:
+    """
+    Uma thread amostra `sys._current_frames()` a cada `interval`. O custo de
+    cada amostra é medido com thread_time e o intervalo é alongado para que a
+    CPU do amostrador nunca passe de `max_overhead` — seguro em worker carregado.
+    Só um profile roda por vez.
+    """
+
+    def __init__(self, hz: int = 100, max_overhead: float = 0.02, max_seconds: int = 60):
+        self.hz = hz
+        self.max_overhead = max_overhead
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self._labels: Dict[Any, str] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, seconds: float, hz: Optional[int] = None, include_idle: bool = False) -> ProfileResult:
+        """Bloqueia por `seconds` amostrando o processo (rode fora do event loop)"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("Profile já em andamento")
+        try:
+            return self._run(min(max(seconds, 0.1), self.max_seconds), hz or self.hz, include_idle)
+        finally:
+            self._labels.clear()
+            self._lock.release()
+
+    def _run(self, seconds: float, hz: int, include_idle: bool) -> ProfileResult:
+        interval = 1.0 / max(1, min(hz, 1000))
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks: Counter = Counter()
+        samples = idle = ticks = 0
+        cpu_spent = 0.0
+        started = time.perf_counter()
+        deadline = started + seconds
+
+        while True:
+            ticks += 1
+            cpu_started = time.thread_time()
+            frames = sys._current_frames()
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                if not include_idle and self._is_idle(frame):
+                    idle += 1
+                    continue
+                stack = self._stack(frame)
+                thread_name = names.get(thread_id)
+                if thread_name is None:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    thread_name = names.get(thread_id, str(thread_id))
+                stacks[(thread_name,) + stack] += 1
+                samples += 1
+            frames = frame = None
+            cost = time.thread_time() - cpu_started
+            cpu_spent += cost
+
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            time.sleep(min(max(interval, cost / self.max_overhead), deadline - now))
+
+        duration = time.perf_counter() - started
+        return ProfileResult(stacks, samples, duration, duration / ticks, cpu_spent, idle)
+
+    def _stack(self, frame) -> Tuple[str, ...]:
+        labels = self._labels
+        stack = []
+        while frame is not None and len(stack) < _MAX_DEPTH:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                label = labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            stack.append(label)
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    @staticmethod
+    def _is_idle(frame) -> bool:
+        code = frame.f_code
+        return (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES
+
+
+profiler = SamplingProfiler(
+    hz=settings.MONITORING_PROFILE_HZ,
+    max_seconds=settings.MONITORING_PROFILE_MAX_SECONDS
+)
@@ -0,0 +1,212 @@
+"""
+Canal de performance em tempo real (Server-Sent Events)
+
+Em vez de cada tela consultar o endpoint de performance em polling, os
+clientes assinam `/api/v1/analytics/realtime/stream`. Um único laço por
+processo calcula o snapshot a cada `interval` segundos (vazão, taxa de erro,
+percentis de latência, alertas e automações ativas), compara com o anterior e
+serializa uma só vez o delta com os campos que mudaram; o mesmo frame é
+entregue a todos os assinantes. N telas abertas custam um cálculo por tick,
+não N.
+
+Quem se conecta recebe primeiro o snapshot completo (`event: snapshot`) e
+depois só deltas (`event: delta`). Um assinante lento não acumula fila: os
+deltas ainda não enviados são fundidos num só. Sem assinantes o laço para.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+from app.core.config import settings
+from app.core.responses import dumps
+from app.services.monitoring_service import monitoring_service
+
+logger = logging.getLogger(__name__)
+
+
+def sse_frame(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\n".encode() + b"data: " + dumps(data) + b"\n\n"
+
+
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+
+class _Subscriber:
+    """Delta pendente de um assinante: o frame do tick ou a fusão de vários"""
+
+    def __init__(self):
+        self.ready = asyncio.Event()
+        self._frame: Optional[bytes] = None
+        self._delta: Optional[Dict[str, Any]] = None
+        self._tick = 0
+
+    def push(self, tick: int, delta: Dict[str, Any], frame: bytes) -> bool:
+        """Guarda o delta do tick; True se precisou fundir com um anterior não enviado"""
+        coalesced = self._delta is not None
+        if coalesced:
+            # Assinante atrasado: funde em vez de enfileirar (o frame pronto deixa de valer)
+            self._delta, self._frame = {**self._delta, **delta}, None
+        else:
+            self._delta, self._frame = delta, frame
+        self._tick = tick
+        self.ready.set()
+        return coalesced
+
+    def take(self) -> bytes:
+        frame = self._frame or sse_frame("delta", self._delta, self._tick)
+        self.discard()
+        return frame
+
+    def discard(self):
+        self._delta = self._frame = None
+        self.ready.clear()
+
+
+class PerformanceChannel:
+    """Calcula o snapshot uma vez por tick e distribui os deltas aos assinantes"""
+
+    def __init__(self, interval: float = 2.0, keepalive: float = 15.0,
+                 source: Optional[Callable[[], Dict[str, Any]]] = None, registry=None):
+        self.interval = interval
+        self.keepalive = keepalive
+        self.source = source or monitoring_service.get_realtime_performance
+        self.active_automations: Optional[Callable[[], Awaitable[int]]] = None
+        self.current: Optional[Dict[str, Any]] = None
+        self.tick = 0
+        self._subscribers: Set[_Subscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._previous_totals: Optional[tuple] = None
+        self._poll_totals: Optional[tuple] = None
+        self._poll_throughput: Optional[float] = None
+
+        registry = registry or monitoring_service.registry
+        self.subscribers_gauge = registry.gauge(
+            'milapp_realtime_subscribers', 'Conexões abertas no canal de performance em tempo real',
+            multiprocess_mode='sum'
+        )
+        self.ticks_total = registry.counter(
+            'milapp_realtime_ticks_total', 'Snapshots calculados pelo canal em tempo real'
+        )
+        self.coalesced_total = registry.counter(
+            'milapp_realtime_coalesced_total', 'Deltas fundidos para assinantes atrasados'
+        )
+
+    def configure(self, active_automations: Callable[[], Awaitable[int]]):
+        """Define a contagem de automações ativas (vem do banco; cacheie na origem)"""
+        self.active_automations = active_automations
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    async def snapshot(self, poll: bool = False) -> Dict[str, Any]:
+        """
+        Calcula o estado atual; a vazão sai da diferença de totais desde o tick
+        anterior. Com `poll` (leitura sem o laço) a base é outra e só avança a
+        cada `interval`: leituras concorrentes recebem a vazão da última janela
+        fechada em vez de encurtarem a janela umas das outras.
+        """
+        raw = self.source()
+        now = time.monotonic()
+        served, errors = raw.pop('requests_served'), raw.pop('errors_served')
+        baseline = self._poll_totals if poll else self._previous_totals
+        throughput = None
+        if baseline is not None:
+            previous_at, previous_served = baseline
+            throughput = round(max(0, served - previous_served) / max(now - previous_at, 1e-6), 2)
+        if not poll:
+            self._previous_totals = (now, served)
+        elif baseline is None or now - baseline[0] >= self.interval:
+            self._poll_totals, self._poll_throughput = (now, served), throughput
+        else:
+            throughput = self._poll_throughput
+
+        automations = None
+        if self.active_automations is not None:
+            try:
+                automations = await self.active_automations()
+            except Exception as e:
+                logger.warning(f"Automações ativas indisponíveis: {e}")
+        return {
+            'throughput_rps': throughput,
+            'requests_total': served,
+            'errors_total': errors,
+            **raw,
+            'active_automations': automations
+        }
+
+    async def get_current(self) -> Dict[str, Any]:
+        """Último snapshot do laço (ou um calculado agora, se ninguém assina o canal)"""
+        if self._task is None or self.current is None:
+            return await self.snapshot(poll=True)
+        return self.current
+
+    async def _advance(self):
+        snapshot = await self.snapshot()
+        self.ticks_total.inc()
+        previous, self.current = self.current, snapshot
+        self.tick += 1
+        if previous is None:
+            delta = snapshot
+        else:
+            delta = {key: value for key, value in snapshot.items() if previous.get(key) != value}
+        if not delta:
+            return
+        frame = sse_frame("delta", delta, self.tick)  # Serializado uma vez para todos
+        coalesced = sum(subscriber.push(self.tick, delta, frame) for subscriber in self._subscribers)
+        if coalesced:
+            self.coalesced_total.inc(coalesced)
+
+    async def _loop(self):
+        try:
+            while self._subscribers:
+                started = time.monotonic()
+                try:
+                    await self._advance()
+                except Exception as e:
+                    logger.error(f"Erro no canal de performance em tempo real: {e}")
+                await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+        finally:
+            self._task = None
+            self.current = None
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        """Frames SSE de um assinante: snapshot completo, depois deltas e keepalives"""
+        subscriber = _Subscriber()
+        self._subscribers.add(subscriber)
+        self.subscribers_gauge.set(len(self._subscribers))
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="realtime-performance")
+        snapshot_sent = False
+        try:
+            while True:
+                if not snapshot_sent and self.current is not None:
+                    subscriber.discard()  # O snapshot já inclui os deltas pendentes
+                    snapshot_sent = True
+                    yield sse_frame("snapshot", self.current, self.tick)
+                    continue
+                try:
+                    await asyncio.wait_for(subscriber.ready.wait(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE_FRAME
+                    continue
+                if snapshot_sent:
+                    yield subscriber.take()
+        finally:
+            self._subscribers.discard(subscriber)
+            self.subscribers_gauge.set(len(self._subscribers))
+
+
+performance_channel = PerformanceChannel(
+    interval=settings.REALTIME_TICK_SECONDS,
+    keepalive=settings.REALTIME_KEEPALIVE_SECONDS
+)
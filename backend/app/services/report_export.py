@@ -0,0 +1,374 @@
+"""
+Exportação de relatórios em streaming (CSV, XLSX, Parquet e JSON)
+
+As linhas saem de um cursor do lado do servidor (`AsyncSession.stream` com
+`yield_per`) em lotes e passam por um escritor incremental, que devolve os
+bytes prontos de cada lote; esses bytes vão direto para o
+`StreamingResponse`. A memória fica limitada a um lote (um row group no
+Parquet), qualquer que seja o tamanho do relatório, e o primeiro byte sai
+antes de a consulta terminar.
+
+O XLSX é escrito diretamente como zip em streaming (o modo write_only do
+openpyxl só libera o arquivo no `save`, depois da última linha). O Parquet
+requer o pacote pyarrow.
+"""
+
+import csv
+import io
+import logging
+import zipfile
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.sql import Select
+
+from app.core.config import settings
+from app.core.responses import dumps
+from app.services.monitoring_service import monitoring_service
+
+logger = logging.getLogger(__name__)
+
+# Tipos de coluna: string | int | float | datetime | date
+Column = Tuple[str, str]
+
+
+@dataclass(frozen=True)
+class ReportSpec:
+    """Relatório: colunas de saída e a consulta (`query(user_id, filters)`)"""
+    name: str
+    columns: Sequence[Column]
+    query: Callable[[str, Dict[str, Any]], Select]
+
+
+class CSVWriter:
+    media_type = "text/csv; charset=utf-8"
+    extension = "csv"
+
+    def __init__(self, columns: Sequence[Column]):
+        self.columns = columns
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode("utf-8")
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def header(self) -> bytes:
+        self._writer.writerow([name for name, _ in self.columns])
+        # BOM: o Excel abre o CSV em UTF-8 sem perguntar
+        return "\ufeff".encode("utf-8") + self._drain()
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        self._writer.writerows(
+            [_text(value) for value in row] for row in rows
+        )
+        return self._drain()
+
+    def close(self) -> bytes:
+        return b""
+
+
+class JSONLinesWriter:
+    media_type = "application/x-ndjson"
+    extension = "jsonl"
+
+    def __init__(self, columns: Sequence[Column]):
+        self.names = [name for name, _ in columns]
+
+    def header(self) -> bytes:
+        return b""
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        return b"".join(dumps(dict(zip(self.names, row))) + b"\n" for row in rows)
+
+    def close(self) -> bytes:
+        return b""
+
+
+class _Sink(io.RawIOBase):
+    """Arquivo só de escrita que acumula os bytes até `take()`; aceita destino não posicionável"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+
+_XLSX_STATIC = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{sheet}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    # Estilos: 0 padrão, 1 data/hora (formato embutido 22), 2 data (14)
+    "xl/styles.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+
+
+class XLSXWriter:
+    """Planilha única; strings inline (sem sharedStrings), datas como número com estilo"""
+    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    extension = "xlsx"
+
+    def __init__(self, columns: Sequence[Column], sheet: str = "Relatório"):
+        self.columns = columns
+        self.sheet = sheet
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, "w", compression=zipfile.ZIP_DEFLATED)
+        self._sheet = None
+
+    def header(self) -> bytes:
+        for name, content in _XLSX_STATIC.items():
+            if name == "xl/workbook.xml":
+                content = content.replace("{sheet}", escape(self.sheet[:31], {'"': "&quot;"}))
+            self._zip.writestr(name, content)
+        self._sheet = self._zip.open("xl/worksheets/sheet1.xml", "w", force_zip64=True)
+        self._sheet.write(
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+        )
+        self._sheet.write(self._row([name for name, _ in self.columns], header=True))
+        return self._sink.take()
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        self._sheet.write(b"".join(self._row(row) for row in rows))
+        return self._sink.take()
+
+    def close(self) -> bytes:
+        self._sheet.write(b"</sheetData></worksheet>")
+        self._sheet.close()
+        self._zip.close()
+        return self._sink.take()
+
+    def _row(self, values: Sequence[Any], header: bool = False) -> bytes:
+        cells = []
+        for value in values:
+            if value is None:
+                cells.append("<c/>")
+            elif isinstance(value, bool) or header or not isinstance(value, (int, float, Decimal, date)):
+                cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{_xml_text(value)}</t></is></c>')
+            elif isinstance(value, datetime):
+                delta = value.replace(tzinfo=None) - _EXCEL_EPOCH
+                cells.append(f'<c s="1"><v>{delta.total_seconds() / 86400!r}</v></c>')
+            elif isinstance(value, date):
+                cells.append(f'<c s="2"><v>{(value - _EXCEL_EPOCH.date()).days}</v></c>')
+            else:
+                cells.append(f"<c><v>{value}</v></c>")
+        return f"<row>{''.join(cells)}</row>".encode("utf-8")
+
+
+class ParquetWriter:
+    """Um row group a cada `row_group_size` linhas (o lote atual fica em memória até lá)"""
+    media_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def __init__(self, columns: Sequence[Column], row_group_size: int = 10000,
+                 metadata: Optional[Dict[str, str]] = None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Exportação em Parquet requer o pacote pyarrow") from e
+        self._pa = pa
+        types = {
+            "string": pa.string(), "int": pa.int64(), "float": pa.float64(),
+            "datetime": pa.timestamp("us", tz="UTC"), "date": pa.date32()
+        }
+        self.columns = columns
+        self.schema = pa.schema([(name, types[kind]) for name, kind in columns], metadata=metadata)
+        self.row_group_size = row_group_size
+        self._sink = _Sink()
+        self._writer = pq.ParquetWriter(pa.PythonFile(self._sink, mode="w"), self.schema, compression="zstd")
+        self._pending: List[Sequence[Any]] = []
+
+    def header(self) -> bytes:
+        return self._sink.take()
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        self._pending.extend(rows)
+        if len(self._pending) >= self.row_group_size:
+            self._flush()
+        return self._sink.take()
+
+    def close(self) -> bytes:
+        self._flush()
+        self._writer.close()
+        return self._sink.take()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        arrays = [
+            self._pa.array([_parquet_value(row[i], kind) for row in self._pending], type=self.schema.field(i).type)
+            for i, (_, kind) in enumerate(self.columns)
+        ]
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self.schema))
+        self._pending = []
+
+
+WRITERS = {
+    "csv": CSVWriter,
+    "json": JSONLinesWriter,
+    "xlsx": XLSXWriter,
+    "parquet": ParquetWriter,
+}
+
+
+def _text(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+_INVALID_XML = dict.fromkeys(c for c in range(32) if c not in (9, 10, 13))
+
+
+def _xml_text(value: Any) -> str:
+    return escape(str(_text(value)).translate(_INVALID_XML))
+
+
+def _parquet_value(value: Any, kind: str) -> Any:
+    if value is None:
+        return None
+    if kind == "float":
+        return float(value)
+    if kind == "string":
+        return str(value)
+    return value
+
+
+def make_writer(format: str, columns: Sequence[Column], title: str):
+    writer = WRITERS.get(format)
+    if writer is None:
+        raise ValueError(f"Formato não suportado: {format} (use {', '.join(WRITERS)})")
+    if writer is XLSXWriter:
+        return XLSXWriter(columns, sheet=title)
+    if writer is ParquetWriter:
+        return ParquetWriter(columns, row_group_size=settings.REPORT_PARQUET_ROW_GROUP_SIZE)
+    return writer(columns)
+
+
+class ReportExporter:
+    """Percorre o cursor em lotes de `batch_size` e repassa os bytes de cada lote"""
+
+    def __init__(self, batch_size: int = 1000, registry=None):
+        self.batch_size = batch_size
+        registry = registry or monitoring_service.registry
+        self.rows_total = registry.counter(
+            'milapp_report_export_rows_total', 'Linhas exportadas por relatório e formato', ('report', 'format')
+        )
+        self.bytes_total = registry.counter(
+            'milapp_report_export_bytes_total', 'Bytes exportados por relatório e formato', ('report', 'format')
+        )
+
+    async def stream(self, db, spec: ReportSpec, user_id: str, filters: Dict[str, Any],
+                     format: str, writer=None) -> AsyncIterator[bytes]:
+        writer = writer or make_writer(format, spec.columns, spec.name)
+        rows_total = self.rows_total.labels(spec.name, format)
+        bytes_total = self.bytes_total.labels(spec.name, format)
+
+        def emit(chunk: bytes) -> bytes:
+            bytes_total.inc(len(chunk))
+            return chunk
+
+        yield emit(writer.header())
+        query = spec.query(user_id, filters).execution_options(yield_per=self.batch_size)
+        result = await db.stream(query)
+        try:
+            async for rows in result.partitions(self.batch_size):
+                chunk = writer.write(rows)
+                rows_total.inc(len(rows))
+                if chunk:
+                    yield emit(chunk)
+        except Exception as e:
+            # Cabeçalhos já enviados: o cliente recebe um arquivo truncado
+            logger.error(f"Erro na exportação do relatório {spec.name} ({format}): {e}")
+            raise
+        finally:
+            await result.close()
+        yield emit(writer.close())
+
+    def response(self, db, spec: ReportSpec, user_id: str, filters: Dict[str, Any], format: str,
+                 filename: Optional[str] = None) -> StreamingResponse:
+        # Formato inválido ou dependência ausente falham antes de a resposta começar
+        writer = make_writer(format, spec.columns, spec.name)
+        filename = filename or f"{spec.name}-{datetime.utcnow():%Y%m%d-%H%M%S}.{writer.extension}"
+        return StreamingResponse(
+            self.stream(db, spec, user_id, filters, format, writer),
+            media_type=writer.media_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+
+
+report_exporter = ReportExporter(batch_size=settings.REPORT_EXPORT_BATCH_SIZE)
@@ -0,0 +1,342 @@
+"""
+Histórico persistente de métricas em arquivos de rollup mapeados em memória
+
+Cada série (nome + labels) tem um arquivo de tamanho fixo com um anel por
+resolução (10s, 1min, 1h). Cada slot guarda epoch, min, max, soma e
+contagem; gravar é atualizar três slots no mmap, e o custo em disco por série
+é conhecido de antemão (`RollupStore.series_bytes`).
+
+Os workers do uvicorn/gunicorn gravam nos mesmos arquivos: cada atualização
+(ler o slot, somar, regravar) roda sob `flock` exclusivo no arquivo da série,
+além do lock de thread. Um arquivo novo é montado num temporário criado com
+O_EXCL e publicado com `os.link`, que falha se outro processo publicou
+primeiro; ninguém trunca um arquivo que já está em uso.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from glob import glob
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MILROLL1"
+HEADER_SIZE = 512
+# epoch (índice do bucket), min, max, soma, contagem
+SLOT = struct.Struct("<qdddd")
+_HEADER = struct.Struct("<8sI")
+_RESOLUTION = struct.Struct("<II")
+
+# (segundos por bucket, quantidade de slots): 1 dia, 7 dias, 1 ano
+DEFAULT_RESOLUTIONS: Tuple[Tuple[int, int], ...] = ((10, 8640), (60, 10080), (3600, 8760))
+
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def _series_key(name: str, labels: Optional[Dict[str, str]]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted((str(k), str(v)) for k, v in (labels or {}).items()))
+
+
+def _file_name(name: str, label_items: Tuple[Tuple[str, str], ...]) -> str:
+    digest = hashlib.sha1(json.dumps([name, label_items]).encode("utf-8")).hexdigest()[:12]
+    return f"{_SAFE_NAME.sub('_', name)}-{digest}.roll"
+
+
+class _SeriesFile:
+    """Arquivo de uma série: cabeçalho + um anel de slots por resolução"""
+
+    def __init__(self, path: str, name: str, labels: Dict[str, str],
+                 resolutions: Sequence[Tuple[int, int]], create: bool, replace: bool = False):
+        self.path = path
+        self.name = name
+        self.labels = labels
+        self.resolutions = tuple(resolutions)
+        self.offsets = []
+        offset = HEADER_SIZE
+        for _, slots in self.resolutions:
+            self.offsets.append(offset)
+            offset += slots * SLOT.size
+        self.size = offset
+        self.lock = threading.Lock()
+
+        if create:
+            self._create(replace)
+        self._file = open(path, "r+b")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), self.size)
+        except (OSError, ValueError):
+            self._file.close()
+            raise
+
+    def _create(self, replace: bool):
+        """
+        Monta o arquivo inicializado num temporário e o publica em `path`; só
+        sobrescreve com `replace` (arquivo existente inválido ou de outras resoluções)
+        """
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            os.ftruncate(fd, self.size)
+            with mmap.mmap(fd, self.size) as mm:
+                mm[:HEADER_SIZE] = self._header()
+            if replace:
+                os.replace(tmp, self.path)
+            else:
+                try:
+                    os.link(tmp, self.path)
+                except FileExistsError:
+                    pass  # Outro worker publicou antes: usa o dele
+        finally:
+            os.close(fd)
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        with self.lock:
+            fcntl.flock(self._file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    @classmethod
+    def open_existing(cls, path: str) -> Optional["_SeriesFile"]:
+        """Lê o cabeçalho de um arquivo já gravado; None se inválido"""
+        try:
+            with open(path, "rb") as f:
+                header = f.read(HEADER_SIZE)
+            magic, count = _HEADER.unpack_from(header)
+            if magic != MAGIC:
+                return None
+            pos = _HEADER.size
+            resolutions = []
+            for _ in range(count):
+                resolutions.append(_RESOLUTION.unpack_from(header, pos))
+                pos += _RESOLUTION.size
+            (meta_len,) = struct.unpack_from("<I", header, pos)
+            meta = json.loads(header[pos + 4:pos + 4 + meta_len].decode("utf-8"))
+            series = cls(path, meta["name"], meta["labels"], resolutions, create=False)
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            logger.warning(f"Arquivo de rollup ignorado ({path}): {e}")
+            return None
+        return series
+
+    def _header(self) -> bytes:
+        meta = json.dumps({"name": self.name, "labels": self.labels}).encode("utf-8")
+        header = bytearray(HEADER_SIZE)
+        _HEADER.pack_into(header, 0, MAGIC, len(self.resolutions))
+        pos = _HEADER.size
+        for resolution in self.resolutions:
+            _RESOLUTION.pack_into(header, pos, *resolution)
+            pos += _RESOLUTION.size
+        meta = meta[:HEADER_SIZE - pos - 4]
+        struct.pack_into("<I", header, pos, len(meta))
+        header[pos + 4:pos + 4 + len(meta)] = meta
+        return bytes(header)
+
+    def record(self, value: float, ts: float):
+        mm = self._mm
+        with self._locked(exclusive=True):
+            for (seconds, slots), offset in zip(self.resolutions, self.offsets):
+                epoch = int(ts // seconds)
+                pos = offset + (epoch % slots) * SLOT.size
+                current, low, high, total, count = SLOT.unpack_from(mm, pos)
+                if current != epoch:
+                    SLOT.pack_into(mm, pos, epoch, value, value, value, 1.0)
+                else:
+                    SLOT.pack_into(mm, pos, epoch, min(low, value), max(high, value), total + value, count + 1)
+
+    def read(self, level: int, start: float, end: float) -> List[Dict[str, Any]]:
+        seconds, slots = self.resolutions[level]
+        offset = self.offsets[level]
+        first, last = int(start // seconds), int(end // seconds)
+        points = []
+        with self._locked(exclusive=False), memoryview(self._mm) as view:
+            ring = view[offset:offset + slots * SLOT.size]
+            for epoch, low, high, total, count in SLOT.iter_unpack(ring):
+                if first <= epoch <= last and count:
+                    points.append((epoch, low, high, total, count))
+            ring.release()
+        points.sort()
+        return [
+            {
+                'timestamp': epoch * seconds,
+                'min': low,
+                'max': high,
+                'avg': total / count,
+                'sum': total,
+                'count': int(count)
+            }
+            for epoch, low, high, total, count in points
+        ]
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+class RollupStore:
+    """
+    Séries de rollup em `directory`, abertas sob demanda
+
+    Novas séries além de `max_series` são descartadas (com aviso), então o
+    espaço em disco máximo é `max_series * series_bytes`.
+    """
+
+    def __init__(self, directory: str, resolutions: Sequence[Tuple[int, int]] = DEFAULT_RESOLUTIONS,
+                 max_series: int = 1000, clock=time.time):
+        self.directory = directory
+        self.resolutions = tuple(sorted(resolutions))
+        self.max_series = max_series
+        self._clock = clock
+        self._series: Dict[Tuple[str, tuple], _SeriesFile] = {}
+        self._scanned: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+        self._overflow_logged = False
+
+    @property
+    def series_bytes(self) -> int:
+        return HEADER_SIZE + sum(slots for _, slots in self.resolutions) * SLOT.size
+
+    def record(self, name: str, value: float, labels: Optional[Dict[str, str]] = None,
+               ts: Optional[float] = None):
+        """Soma o valor aos buckets de todas as resoluções"""
+        key = _series_key(name, labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._open(key, create=True)
+            if series is None:
+                return
+        series.record(float(value), self._clock() if ts is None else ts)
+
+    def _open(self, key, create: bool) -> Optional[_SeriesFile]:
+        with self._lock:
+            series = self._series.get(key)
+            if series is not None:
+                return series
+            name, label_items = key
+            path = os.path.join(self.directory, _file_name(name, label_items))
+            exists = os.path.exists(path)
+            if exists:
+                series = _SeriesFile.open_existing(path)
+                if series is not None and series.resolutions != self.resolutions:
+                    logger.warning(f"Resoluções mudaram, recriando {path}")
+                    series.close()
+                    series = None
+            if series is None:
+                if not create:
+                    return None
+                if len(self._series) >= self.max_series:
+                    if not self._overflow_logged:
+                        logger.warning(f"Limite de {self.max_series} séries de rollup atingido")
+                        self._overflow_logged = True
+                    return None
+                try:
+                    os.makedirs(self.directory, exist_ok=True)
+                    series = _SeriesFile(path, name, dict(label_items), self.resolutions, create=True,
+                                         replace=exists)
+                except (OSError, ValueError) as e:
+                    logger.error(f"Falha ao criar arquivo de rollup {path}: {e}")
+                    return None
+            self._series[key] = series
+            return series
+
+    def _load_name(self, name: str):
+        """Abre os arquivos já gravados de uma métrica (ex.: após restart)"""
+        if self._scanned.get(name):
+            return
+        pattern = os.path.join(self.directory, f"{_SAFE_NAME.sub('_', name)}-*.roll")
+        for path in glob(pattern):
+            series = _SeriesFile.open_existing(path)
+            if series is None or series.name != name:
+                if series is not None:
+                    series.close()
+                continue
+            key = _series_key(series.name, series.labels)
+            with self._lock:
+                if key in self._series or series.resolutions != self.resolutions:
+                    series.close()
+                    continue
+                self._series[key] = series
+        self._scanned[name] = True
+
+    def choose_level(self, start: float, end: float, max_points: int = 1500) -> int:
+        """Resolução mais fina que cobre `start` e não passa de `max_points`"""
+        now = self._clock()
+        for level, (seconds, slots) in enumerate(self.resolutions):
+            if now - start <= seconds * slots and (end - start) / seconds <= max_points:
+                return level
+        return len(self.resolutions) - 1
+
+    def query(self, name: str, start: float, end: Optional[float] = None,
+              labels: Optional[Dict[str, str]] = None, resolution: Optional[int] = None,
+              max_points: int = 1500) -> Dict[str, Any]:
+        """
+        Pontos agregados entre `start` e `end` (epoch em segundos) de todas as
+        séries da métrica (ou só da série com esses labels)
+        """
+        end = self._clock() if end is None else end
+        self._load_name(name)
+        if resolution is not None:
+            levels = [seconds for seconds, _ in self.resolutions]
+            if resolution not in levels:
+                raise ValueError(f"Resolução inválida: {resolution} (use {levels})")
+            level = levels.index(resolution)
+        else:
+            level = self.choose_level(start, end, max_points)
+
+        wanted = _series_key(name, labels)[1] if labels is not None else None
+        with self._lock:
+            matches = [
+                series for (series_name, label_items), series in self._series.items()
+                if series_name == name and (wanted is None or label_items == wanted)
+            ]
+        return {
+            'name': name,
+            'resolution_seconds': self.resolutions[level][0],
+            'start': start,
+            'end': end,
+            'series': [
+                {'labels': series.labels, 'points': series.read(level, start, end)}
+                for series in matches
+            ]
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'directory': self.directory,
+            'series': len(self._series),
+            'max_series': self.max_series,
+            'bytes_per_series': self.series_bytes,
+            'max_bytes': self.max_series * self.series_bytes,
+            'resolutions': [
+                {'seconds': seconds, 'slots': slots, 'retention_seconds': seconds * slots}
+                for seconds, slots in self.resolutions
+            ]
+        }
+
+    def flush(self):
+        with self._lock:
+            for series in self._series.values():
+                series.flush()
+
+    def close(self):
+        with self._lock:
+            for series in self._series.values():
+                series.flush()
+                series.close()
+            self._series.clear()
+            self._scanned.clear()
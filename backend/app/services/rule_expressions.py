@@ -0,0 +1,379 @@
+"""
+Avaliador de um subconjunto de PromQL para as regras em monitoring/*.yml
+
+Suporta seletores com matchers (=, !=, =~, !~), rate()/increase() sobre
+janelas, agregações sum/avg/min/max/count (com `by`), aritmética e
+comparações entre vetores e escalares. É suficiente para avaliar as regras
+de alerta contra as séries do próprio processo.
+"""
+
+import math
+import re
+from collections import deque
+from typing import Callable, Deque, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+
+Labels = FrozenSet[Tuple[str, str]]
+Vector = Dict[Labels, float]
+Value = Union[float, Vector]
+Sample = Tuple[str, Dict[str, str], float]
+
+AGGREGATIONS = {"sum", "avg", "min", "max", "count"}
+RANGE_FUNCTIONS = {"rate", "increase"}
+COMPARISONS = {"==", "!=", ">", "<", ">=", "<="}
+
+_TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<string>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')
+  | (?P<ident>[a-zA-Z_:][a-zA-Z0-9_:]*)
+  | (?P<op>==|!=|>=|<=|=~|!~|[-+*/<>=(){}\[\],])
+""", re.VERBOSE)
+
+_DURATION_RE = re.compile(r"^(\d+)(ms|s|m|h|d|w)$")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+class ExpressionError(ValueError):
+    """Expressão inválida ou não suportada"""
+
+
+def parse_duration(text: str) -> float:
+    match = _DURATION_RE.match(text)
+    if not match:
+        raise ExpressionError(f"Duração inválida: {text}")
+    return int(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if not match:
+            raise ExpressionError(f"Caractere inesperado em {position}: {text[position:]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        if kind != "space":
+            tokens.append((kind, match.group()))
+    tokens.append(("end", ""))
+    return tokens
+
+
+# Nós da árvore: tuplas simples (tipo, ...)
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.index = 0
+
+    def peek(self, offset: int = 0) -> Tuple[str, str]:
+        return self.tokens[self.index + offset]
+
+    def take(self, value: Optional[str] = None) -> Tuple[str, str]:
+        token = self.tokens[self.index]
+        if value is not None and token[1] != value:
+            raise ExpressionError(f"Esperado {value!r}, encontrado {token[1]!r} em {self.text!r}")
+        self.index += 1
+        return token
+
+    def parse(self):
+        node = self.comparison()
+        if self.peek()[0] != "end":
+            raise ExpressionError(f"Token inesperado {self.peek()[1]!r} em {self.text!r}")
+        return node
+
+    def comparison(self):
+        node = self.additive()
+        while self.peek()[1] in COMPARISONS:
+            op = self.take()[1]
+            node = ("binary", op, node, self.additive())
+        return node
+
+    def additive(self):
+        node = self.multiplicative()
+        while self.peek()[1] in ("+", "-"):
+            op = self.take()[1]
+            node = ("binary", op, node, self.multiplicative())
+        return node
+
+    def multiplicative(self):
+        node = self.unary()
+        while self.peek()[1] in ("*", "/"):
+            op = self.take()[1]
+            node = ("binary", op, node, self.unary())
+        return node
+
+    def unary(self):
+        if self.peek()[1] == "-":
+            self.take()
+            return ("binary", "*", ("number", -1.0), self.unary())
+        return self.primary()
+
+    def primary(self):
+        kind, value = self.peek()
+        if kind == "number":
+            self.take()
+            return ("number", float(value))
+        if value == "(":
+            self.take()
+            node = self.comparison()
+            self.take(")")
+            return node
+        if kind == "ident" and value in AGGREGATIONS:
+            return self.aggregation()
+        if kind == "ident" and value in RANGE_FUNCTIONS and self.peek(1)[1] == "(":
+            self.take()
+            self.take("(")
+            selector = self.selector()
+            if selector[0] != "range":
+                raise ExpressionError(f"{value}() exige um range vector em {self.text!r}")
+            self.take(")")
+            return ("function", value, selector)
+        if kind == "ident" or value == "{":
+            return self.selector()
+        raise ExpressionError(f"Token inesperado {value!r} em {self.text!r}")
+
+    def aggregation(self):
+        name = self.take()[1]
+        grouping: Optional[Tuple[str, ...]] = None
+        if self.peek()[1] == "by":
+            grouping = self.grouping()
+        self.take("(")
+        inner = self.comparison()
+        self.take(")")
+        if self.peek()[1] == "by":
+            grouping = self.grouping()
+        return ("aggregate", name, grouping, inner)
+
+    def grouping(self) -> Tuple[str, ...]:
+        self.take("by")
+        self.take("(")
+        labels = []
+        while self.peek()[1] != ")":
+            labels.append(self.take()[1])
+            if self.peek()[1] == ",":
+                self.take()
+        self.take(")")
+        return tuple(labels)
+
+    def selector(self):
+        matchers = []
+        if self.peek()[0] == "ident":
+            matchers.append(("__name__", "=", self.take()[1]))
+        if self.peek()[1] == "{":
+            self.take()
+            while self.peek()[1] != "}":
+                label = self.take()[1]
+                op = self.take()[1]
+                if op not in ("=", "!=", "=~", "!~"):
+                    raise ExpressionError(f"Matcher inválido {op!r} em {self.text!r}")
+                kind, raw = self.take()
+                if kind != "string":
+                    raise ExpressionError(f"Valor de label deve ser string em {self.text!r}")
+                matchers.append((label, op, raw[1:-1].encode().decode("unicode_escape")))
+                if self.peek()[1] == ",":
+                    self.take()
+            self.take("}")
+        node = ("selector", tuple(matchers))
+        if self.peek()[1] == "[":
+            self.take()
+            raw = ""
+            while self.peek()[1] != "]":
+                raw += self.take()[1]
+            self.take("]")
+            return ("range", node, parse_duration(raw))
+        return node
+
+
+def parse_expression(text: str):
+    """Converte a expressão em árvore (levanta ExpressionError se não suportada)"""
+    return _Parser(text).parse()
+
+
+def _compile_matchers(matchers) -> List[Callable[[Dict[str, str]], bool]]:
+    checks = []
+    for label, op, expected in matchers:
+        if op == "=":
+            checks.append(lambda labels, l=label, e=expected: labels.get(l, "") == e)
+        elif op == "!=":
+            checks.append(lambda labels, l=label, e=expected: labels.get(l, "") != e)
+        else:
+            pattern = re.compile(expected)
+            if op == "=~":
+                checks.append(lambda labels, l=label, p=pattern: p.fullmatch(labels.get(l, "")) is not None)
+            else:
+                checks.append(lambda labels, l=label, p=pattern: p.fullmatch(labels.get(l, "")) is None)
+    return checks
+
+
+def _drop_name(labels: Labels) -> Labels:
+    return frozenset(item for item in labels if item[0] != "__name__")
+
+
+def _apply(op: str, left: float, right: float) -> Optional[float]:
+    """Aplica o operador; em comparações retorna None quando falso"""
+    if op == "+":
+        return left + right
+    if op == "-":
+        return left - right
+    if op == "*":
+        return left * right
+    if op == "/":
+        if right == 0:
+            return math.nan if left == 0 else math.copysign(math.inf, left)
+        return left / right
+    result = {
+        "==": left == right, "!=": left != right,
+        ">": left > right, "<": left < right,
+        ">=": left >= right, "<=": left <= right,
+    }[op]
+    return left if result else None
+
+
+class RangeHistory:
+    """
+    Guarda amostras de cada seletor de janela para calcular rate()/increase().
+    O histórico é limitado à maior janela usada pela expressão.
+    """
+
+    def __init__(self):
+        self._samples: Dict[Tuple, Deque[Tuple[float, Vector]]] = {}
+
+    def record(self, key: Tuple, now: float, vector: Vector, window: float) -> Deque[Tuple[float, Vector]]:
+        samples = self._samples.setdefault(key, deque())
+        samples.append((now, vector))
+        while samples and samples[0][0] < now - window:
+            samples.popleft()
+        return samples
+
+
+class Evaluator:
+    """
+    Avalia expressões sobre as amostras atuais do processo
+
+    `target_labels` faz o papel dos labels que o Prometheus adiciona no
+    scrape (job, instance, service) para que os matchers das regras casem.
+    """
+
+    def __init__(self, samples: Iterable[Sample], now: float, history: RangeHistory,
+                 target_labels: Optional[Dict[str, str]] = None):
+        self.now = now
+        self.history = history
+        self.target_labels = target_labels or {}
+        self.series: Dict[str, List[Dict[str, str]]] = {}
+        self.values: Dict[Labels, float] = {}
+        for name, labels, value in samples:
+            self.add(name, labels, value)
+
+    def add(self, name: str, labels: Dict[str, str], value: float):
+        """Adiciona uma amostra (ex.: resultado de uma regra `record`)"""
+        full = {**self.target_labels, **labels, "__name__": name}
+        key = frozenset(full.items())
+        if key not in self.values:
+            self.series.setdefault(name, []).append(full)
+        self.values[key] = value
+
+    def evaluate(self, node) -> Value:
+        kind = node[0]
+        if kind == "number":
+            return node[1]
+        if kind == "selector":
+            return self._select(node[1])
+        if kind == "function":
+            return self._range_function(node[1], node[2])
+        if kind == "aggregate":
+            return self._aggregate(node[1], node[2], self.evaluate(node[3]))
+        if kind == "binary":
+            return self._binary(node[1], self.evaluate(node[2]), self.evaluate(node[3]))
+        raise ExpressionError(f"Expressão de janela fora de rate()/increase(): {node!r}")
+
+    def _select(self, matchers) -> Vector:
+        checks = _compile_matchers(matchers)
+        name = next((value for label, op, value in matchers if label == "__name__" and op == "="), None)
+        candidates = self.series.get(name, []) if name else [s for group in self.series.values() for s in group]
+        result: Vector = {}
+        for labels in candidates:
+            if all(check(labels) for check in checks):
+                key = frozenset(labels.items())
+                result[key] = self.values[key]
+        return result
+
+    def _range_function(self, name: str, range_node) -> Vector:
+        _, selector, window = range_node
+        current = self._select(selector[1])
+        samples = self.history.record((selector, window), self.now, current, window)
+        oldest_time, oldest = samples[0]
+        elapsed = self.now - oldest_time
+        result: Vector = {}
+        if elapsed <= 0:
+            return result
+        for labels, value in current.items():
+            if labels not in oldest:
+                continue
+            delta = value - oldest[labels]
+            if delta < 0:  # reset do contador
+                delta = value
+            result[_drop_name(labels)] = delta / elapsed if name == "rate" else delta
+        return result
+
+    def _aggregate(self, name: str, grouping: Optional[Tuple[str, ...]], value: Value) -> Vector:
+        if not isinstance(value, dict):
+            raise ExpressionError(f"{name}() exige um vetor")
+        groups: Dict[Labels, List[float]] = {}
+        for labels, sample in value.items():
+            if grouping:
+                key = frozenset(item for item in labels if item[0] in grouping)
+            else:
+                key = frozenset()
+            groups.setdefault(key, []).append(sample)
+        result: Vector = {}
+        for key, samples in groups.items():
+            if name == "sum":
+                result[key] = sum(samples)
+            elif name == "avg":
+                result[key] = sum(samples) / len(samples)
+            elif name == "min":
+                result[key] = min(samples)
+            elif name == "max":
+                result[key] = max(samples)
+            else:
+                result[key] = float(len(samples))
+        return result
+
+    def _binary(self, op: str, left: Value, right: Value) -> Value:
+        is_comparison = op in COMPARISONS
+        if not isinstance(left, dict) and not isinstance(right, dict):
+            result = _apply(op, left, right)
+            if is_comparison:
+                return 1.0 if result is not None else 0.0
+            return result
+        if isinstance(left, dict) and not isinstance(right, dict):
+            return self._vector_scalar(op, left, right, is_comparison, scalar_on_left=False)
+        if not isinstance(left, dict):
+            return self._vector_scalar(op, right, left, is_comparison, scalar_on_left=True)
+
+        # vetor-vetor: correspondência um-para-um pelos labels (sem __name__)
+        right_index = {_drop_name(labels): value for labels, value in right.items()}
+        result: Vector = {}
+        for labels, value in left.items():
+            key = _drop_name(labels)
+            if key not in right_index:
+                continue
+            output = _apply(op, value, right_index[key])
+            if output is not None:
+                result[labels if is_comparison else key] = output
+        return result
+
+    @staticmethod
+    def _vector_scalar(op: str, vector: Vector, scalar: float, is_comparison: bool,
+                       scalar_on_left: bool) -> Vector:
+        result: Vector = {}
+        for labels, value in vector.items():
+            output = _apply(op, scalar, value) if scalar_on_left else _apply(op, value, scalar)
+            if output is None:
+                continue
+            if is_comparison:
+                result[labels] = value
+            else:
+                result[_drop_name(labels)] = output
+        return result
@@ -0,0 +1,155 @@
+"""
+Coletor assíncrono de métricas do host e do runtime do processo
+"""
+
+import asyncio
+import gc
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+GC_PAUSE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5)
+
+
+class RuntimeMetricsCollector:
+    """
+    Roda como task no event loop. Todas as leituras do psutil são feitas sem
+    intervalo de bloqueio (cpu_percent usa o delta desde a coleta anterior),
+    e o custo de CPU da própria coleta é medido e exportado.
+    """
+
+    def __init__(self, monitoring, interval: float = 15.0):
+        self.monitoring = monitoring
+        self.interval = interval
+        self.process = psutil.Process(os.getpid())
+        self._tasks = []
+        self._gc_started: Optional[float] = None
+        self._last_sample: Dict[str, Any] = {}
+
+        registry = monitoring.registry
+        self.rss = registry.gauge('process_resident_memory_bytes', 'Memória residente do processo')
+        self.open_fds = registry.gauge('process_open_fds', 'Descritores de arquivo abertos')
+        self.threads = registry.gauge('process_threads', 'Threads do processo')
+        self.process_cpu = registry.gauge('process_cpu_percent', 'Uso de CPU do processo (%)')
+        self.gc_collections = registry.counter(
+            'python_gc_collections_total', 'Coletas do garbage collector', ('generation',)
+        )
+        self.gc_pause = registry.histogram(
+            'python_gc_pause_seconds', 'Duração das pausas do garbage collector', ('generation',),
+            buckets=GC_PAUSE_BUCKETS
+        )
+        self.collector_cpu = registry.counter(
+            'milapp_collector_cpu_seconds_total', 'CPU consumida pelo coletor de métricas'
+        )
+        self.collector_duration = registry.gauge(
+            'milapp_collector_last_duration_seconds', 'Duração da última coleta'
+        )
+        self.collector_overhead = registry.gauge(
+            'milapp_collector_overhead_ratio', 'CPU do coletor / intervalo de coleta'
+        )
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    async def start(self):
+        """Inicia as tasks de coleta no event loop atual"""
+        if self.running:
+            return
+        # Primeira leitura só inicializa os deltas de CPU
+        psutil.cpu_percent(interval=None)
+        self.process.cpu_percent(interval=None)
+        if self._on_gc not in gc.callbacks:
+            gc.callbacks.append(self._on_gc)
+        self._tasks = [
+            asyncio.create_task(self._collect_loop(), name="runtime-metrics-collector"),
+        ]
+        logger.info("Coletor de métricas iniciado")
+
+    async def stop(self):
+        """Cancela as tasks e remove o callback do GC"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        logger.info("Coletor de métricas parado")
+
+    async def _collect_loop(self):
+        while True:
+            try:
+                self.collect_once()
+            except Exception as e:
+                logger.error(f"Erro no coletor de métricas: {e}")
+            await asyncio.sleep(self.interval)
+
+    def collect_once(self):
+        """Coleta host + processo e verifica limites, medindo o próprio custo"""
+        cpu_started = time.thread_time()
+        started = time.perf_counter()
+
+        self.monitoring._collect_system_metrics()
+        self._collect_process_metrics()
+        self.monitoring._check_thresholds()
+
+        cpu_spent = time.thread_time() - cpu_started
+        self.collector_cpu.inc(cpu_spent)
+        self.collector_duration.set(time.perf_counter() - started)
+        self.collector_overhead.set(cpu_spent / self.interval)
+
+    def _collect_process_metrics(self):
+        process = self.process
+        with process.oneshot():
+            rss = process.memory_info().rss
+            threads = process.num_threads()
+            cpu = process.cpu_percent(interval=None)
+            try:
+                fds = process.num_fds()
+            except (AttributeError, psutil.Error):
+                fds = process.num_handles() if hasattr(process, 'num_handles') else 0
+        self.rss.set(rss)
+        self.threads.set(threads)
+        self.open_fds.set(fds)
+        self.process_cpu.set(cpu)
+        self._last_sample = {'rss_bytes': rss, 'threads': threads, 'open_fds': fds, 'cpu_percent': cpu}
+
+    def _on_gc(self, phase: str, info: Dict[str, int]):
+        """Callback do gc: mede a pausa de cada coleta por geração"""
+        if phase == 'start':
+            self._gc_started = time.perf_counter()
+            return
+        if self._gc_started is None:
+            return
+        generation = str(info.get('generation', -1))
+        self.gc_pause.labels(generation).observe(time.perf_counter() - self._gc_started)
+        self.gc_collections.labels(generation).inc()
+        self._gc_started = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Resumo para a API de monitoramento"""
+        gc_stats = {}
+        for (generation,), child in self.gc_pause.series():
+            gc_stats[generation] = {
+                'collections': child.count,
+                'pause_total_seconds': child.sum,
+                'pause_p99_seconds': child.quantile(0.99)
+            }
+        return {
+            'running': self.running,
+            'interval_seconds': self.interval,
+            'process': self._last_sample,
+            'gc': gc_stats,
+            'event_loop_lag_seconds': self.monitoring.loop_monitor.lag.value,
+            'event_loop_lag_p99_seconds': self.monitoring.loop_monitor.lag_histogram.quantile(0.99),
+            'collector': {
+                'cpu_seconds_total': self.collector_cpu.value,
+                'last_duration_seconds': self.collector_duration.value,
+                'overhead_ratio': self.collector_overhead.value
+            }
+        }
@@ -0,0 +1,75 @@
+"""
+Contadores em janela deslizante com buckets de tamanho fixo
+"""
+
+import math
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Tuple
+
+
+class SlidingWindowCounter:
+    """
+    Conta eventos por chave nos últimos `window_seconds`, em buckets de
+    `bucket_seconds`. Cada chave mantém um anel de buckets; incrementar é O(1)
+    e buckets antigos são zerados quando o anel dá a volta.
+    """
+
+    def __init__(self, window_seconds: int = 300, bucket_seconds: int = 10,
+                 clock: Callable[[], float] = time.monotonic):
+        if bucket_seconds <= 0 or window_seconds < bucket_seconds:
+            raise ValueError("Janela deve conter ao menos um bucket")
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.size = int(math.ceil(window_seconds / bucket_seconds))
+        self._clock = clock
+        # chave -> (época de cada bucket, contagem de cada bucket)
+        self._rings: Dict[Hashable, Tuple[List[int], List[int]]] = {}
+        self._lock = threading.Lock()
+
+    def _current_bucket(self) -> int:
+        return int(self._clock() // self.bucket_seconds)
+
+    def increment(self, key: Hashable, amount: int = 1):
+        """Soma `amount` ao bucket atual da chave"""
+        bucket = self._current_bucket()
+        ring = self._rings.get(key)
+        if ring is None:
+            with self._lock:
+                ring = self._rings.setdefault(key, ([-1] * self.size, [0] * self.size))
+        epochs, counts = ring
+        index = bucket % self.size
+        if epochs[index] != bucket:
+            epochs[index] = bucket
+            counts[index] = 0
+        counts[index] += amount
+
+    def total(self, key: Hashable) -> int:
+        """Total da chave dentro da janela"""
+        ring = self._rings.get(key)
+        if ring is None:
+            return 0
+        oldest = self._current_bucket() - self.size + 1
+        epochs, counts = ring
+        return sum(count for epoch, count in zip(epochs, counts) if epoch >= oldest)
+
+    def totals(self) -> Dict[Hashable, int]:
+        """Totais de todas as chaves com eventos na janela (chaves inativas são descartadas)"""
+        oldest = self._current_bucket() - self.size + 1
+        result = {}
+        stale = []
+        for key, (epochs, counts) in list(self._rings.items()):
+            value = sum(count for epoch, count in zip(epochs, counts) if epoch >= oldest)
+            if value:
+                result[key] = value
+            elif max(epochs) < oldest:
+                stale.append(key)
+        if stale:
+            with self._lock:
+                for key in stale:
+                    self._rings.pop(key, None)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._rings.clear()
@@ -0,0 +1,634 @@
+"""
+Tracing leve de requisições (spans) com amostragem na raiz
+
+Um span raiz por requisição HTTP (TracingMiddleware) e spans filhos em volta
+do Supabase, da sessão SQLAlchemy, das chamadas OpenAI/langchain e dos
+clientes httpx dos conectores. A decisão de amostragem é tomada uma única vez
+na raiz e propagada via contextvars; traces não amostrados custam só um
+objeto no-op por requisição. Um header `traceparent` recebido dá o trace_id e
+o span pai, mas a flag "sampled" do cliente só é seguida com
+`trust_remote_sampled` (settings.TRACING_TRUST_REMOTE_SAMPLED): sem isso
+qualquer cliente forçaria a gravação de todas as suas requisições.
+"""
+
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.core.middleware import route_template
+
+logger = logging.getLogger(__name__)
+
+SPAN_KINDS = {'internal': 1, 'server': 2, 'client': 3}
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("milapp_current_span", default=None)
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """Header W3C `traceparent` -> (trace_id, parent_span_id, sampled)"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+        int(parts[1], 16)
+        int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class Span:
+    """Span gravado; use como context manager para torná-lo o span atual"""
+
+    __slots__ = (
+        'tracer', 'trace', 'name', 'kind', 'trace_id', 'span_id', 'parent_id',
+        'start_time_ns', '_start', 'duration', 'attributes', 'status', 'error', '_token'
+    )
+    sampled = True
+
+    def __init__(self, tracer: "Tracer", trace: "_Trace", name: str, kind: str,
+                 trace_id: str, parent_id: Optional[str], attributes: Optional[Dict[str, Any]]):
+        self.tracer = tracer
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes) if attributes else {}
+        self.status = 'ok'
+        self.error: Optional[str] = None
+        self.duration: Optional[float] = None
+        self._token = None
+        self.start_time_ns = time.time_ns()
+        self._start = time.perf_counter()
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        self.attributes.update(attributes)
+
+    def record_exception(self, exc: BaseException):
+        self.status = 'error'
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def end(self):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._start
+        self.tracer._on_end(self)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_exception(exc)
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+        self.end()
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_id,
+            'start_time_unix_nano': self.start_time_ns,
+            'duration_ms': round((self.duration or 0.0) * 1000, 3),
+            'attributes': self.attributes,
+            'status': self.status,
+            'error': self.error
+        }
+
+
+class _NoopSpan:
+    """Span não amostrado: mantém a decisão no contexto para os filhos"""
+
+    __slots__ = ('_token',)
+    sampled = False
+    trace_id = None
+    span_id = None
+    traceparent = None
+
+    def __init__(self):
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        pass
+
+    def record_exception(self, exc: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        if _current_span.get() is not _UNSAMPLED:
+            self._token = _current_span.set(_UNSAMPLED)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+        return False
+
+
+_UNSAMPLED = _NoopSpan()
+
+
+class _Trace:
+    """Spans finalizados de um trace, exportados quando a raiz local termina"""
+
+    __slots__ = ('root', 'spans', 'dropped')
+
+    def __init__(self):
+        self.root: Optional[Span] = None
+        self.spans: List[Span] = []
+        self.dropped = 0
+
+
+class RingExporter:
+    """Mantém os últimos N traces em memória (lidos via /monitoring/traces)"""
+
+    def __init__(self, capacity: int = 200):
+        self.capacity = capacity
+        self._traces: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]):
+        if not spans:
+            return
+        data = [span.to_dict() for span in spans]
+        trace_id = spans[0].trace_id
+        with self._lock:
+            entry = self._traces.setdefault(trace_id, {'root': None, 'spans': []})
+            entry['spans'].extend(data)
+            entry['root'] = data[-1]  # a raiz termina por último
+            self._traces.move_to_end(trace_id)
+            while len(self._traces) > self.capacity:
+                self._traces.popitem(last=False)
+
+    def traces(self, limit: int = 50, min_duration_ms: float = 0.0) -> List[Dict[str, Any]]:
+        """Resumo dos traces mais recentes (raiz, duração, quantidade de spans)"""
+        with self._lock:
+            items = list(self._traces.items())
+        summaries = []
+        for trace_id, entry in reversed(items):
+            root, spans = entry['root'], entry['spans']
+            if root['duration_ms'] < min_duration_ms:
+                continue
+            summaries.append({
+                'trace_id': trace_id,
+                'name': root['name'],
+                'start_time_unix_nano': root['start_time_unix_nano'],
+                'duration_ms': root['duration_ms'],
+                'span_count': len(spans),
+                'status': 'error' if any(s['status'] == 'error' for s in spans) else 'ok'
+            })
+            if len(summaries) >= limit:
+                break
+        return summaries
+
+    def get(self, trace_id: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._traces.get(trace_id)
+            return sorted(entry['spans'], key=lambda s: s['start_time_unix_nano']) if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class OTLPFileExporter:
+    """
+    Grava cada trace como uma linha OTLP/JSON (formato do file exporter do
+    OpenTelemetry Collector). A escrita acontece numa thread própria para não
+    bloquear o event loop.
+    """
+
+    def __init__(self, path: str, service_name: str = "milapp-backend"):
+        self.path = path
+        self.service_name = service_name
+        self._queue: "queue.SimpleQueue[Optional[str]]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]):
+        if not spans:
+            return
+        self._queue.put(json.dumps(self.encode(spans), separators=(',', ':')))
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="otlp-file-exporter", daemon=True)
+                    self._writer.start()
+
+    def encode(self, spans: List[Span]) -> Dict[str, Any]:
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.service_name}}]},
+                'scopeSpans': [{
+                    'scope': {'name': 'app.services.tracing'},
+                    'spans': [
+                        {
+                            'traceId': span.trace_id,
+                            'spanId': span.span_id,
+                            'parentSpanId': span.parent_id or '',
+                            'name': span.name,
+                            'kind': SPAN_KINDS.get(span.kind, 1),
+                            'startTimeUnixNano': str(span.start_time_ns),
+                            'endTimeUnixNano': str(span.start_time_ns + int((span.duration or 0.0) * 1e9)),
+                            'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in span.attributes.items()],
+                            'status': {'code': 2, 'message': span.error} if span.status == 'error' else {'code': 1}
+                        }
+                        for span in spans
+                    ]
+                }]
+            }]
+        }
+
+    def _write_loop(self):
+        while True:
+            line = self._queue.get()
+            if line is None:
+                return
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                    while True:
+                        try:
+                            line = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if line is None:
+                            return
+                        f.write(line + "\n")
+            except OSError as e:
+                logger.error(f"Falha ao gravar traces em {self.path}: {e}")
+
+    def shutdown(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join(timeout=2)
+            self._writer = None
+
+
+class Tracer:
+    """Cria spans e exporta cada trace quando o span raiz termina"""
+
+    def __init__(self, sample_rate: float = 1.0, exporters: Optional[List[Any]] = None,
+                 enabled: bool = True, max_spans_per_trace: int = 512,
+                 rng: Callable[[], float] = random.random, trust_remote_sampled: bool = False):
+        self.sample_rate = sample_rate
+        self.trust_remote_sampled = trust_remote_sampled
+        self.exporters = list(exporters or [])
+        self.enabled = enabled
+        self.max_spans_per_trace = max_spans_per_trace
+        self._rng = rng
+
+    def current_span(self):
+        return _current_span.get()
+
+    def start_span(self, name: str, kind: str = 'internal', attributes: Optional[Dict[str, Any]] = None,
+                   traceparent: Optional[str] = None, child_only: bool = False):
+        """
+        Cria um span filho do span atual (ou raiz, decidindo a amostragem).
+        Não o torna atual: use `with` para isso. Com `child_only`, nada é
+        gravado fora de um trace (ex.: queries de jobs em background).
+        """
+        parent = _current_span.get()
+        if parent is not None:
+            if not parent.sampled:
+                return _UNSAMPLED
+            return Span(self, parent.trace, name, kind, parent.trace_id, parent.span_id, attributes)
+
+        if not self.enabled or child_only:
+            return _NoopSpan()
+        trace_id, parent_id, sampled = parse_traceparent(traceparent) or (None, None, None)
+        if sampled is None or not self.trust_remote_sampled:
+            sampled = self.sample_rate >= 1.0 or self._rng() < self.sample_rate
+        if not sampled:
+            return _NoopSpan()
+        trace = _Trace()
+        span = trace.root = Span(self, trace, name, kind, trace_id or _new_id(16), parent_id, attributes)
+        span.attributes['sampling.rate'] = self.sample_rate
+        return span
+
+    def span(self, name: str, kind: str = 'internal', **attributes):
+        """Atalho: `with tracer.span("nome", chave=valor) as span:`"""
+        return self.start_span(name, kind, attributes)
+
+    def traced(self, name: Optional[str] = None, kind: str = 'internal'):
+        """Decorator que envolve uma função (sync ou async) num span"""
+        def decorator(func):
+            span_name = name or f"{func.__module__}.{func.__qualname__}"
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.start_span(span_name, kind):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.start_span(span_name, kind):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _on_end(self, span: Span):
+        trace = span.trace
+        if span is not trace.root:
+            if len(trace.spans) < self.max_spans_per_trace:
+                trace.spans.append(span)
+            else:
+                trace.dropped += 1
+            return
+        trace.spans.append(span)
+        if trace.dropped:
+            span.attributes['trace.dropped_spans'] = trace.dropped
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace.spans)
+            except Exception as e:
+                logger.error(f"Falha no exporter de traces: {e}")
+        trace.spans = []
+
+
+# ---------------------------------------------------------------------------
+# Instrumentação
+# ---------------------------------------------------------------------------
+
+class TracingMiddleware:
+    """Middleware ASGI: um span raiz (server) por requisição HTTP"""
+
+    def __init__(self, app, tracer: Optional[Tracer] = None):
+        self.app = app
+        self.tracer = tracer or globals()['tracer']
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        span = self.tracer.start_span(
+            f"HTTP {scope['method']}", 'server',
+            {'http.method': scope['method'], 'http.target': scope.get('path', '')},
+            traceparent=traceparent
+        )
+        if not span.sampled:
+            with span:
+                await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                span.attributes['http.status_code'] = status
+                if status >= 500:
+                    span.status = 'error'
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"traceparent", span.traceparent.encode())]
+            await send(message)
+
+        with span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                template = route_template(scope)
+                if template:
+                    span.attributes['http.route'] = template
+                    span.name = f"HTTP {scope['method']} {template}"
+
+
+class AsyncTracingTransport(httpx.AsyncBaseTransport):
+    """Transport httpx assíncrono: um span client por requisição + propagação W3C"""
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 tracer: Optional[Tracer] = None, peer: Optional[str] = None):
+        self._transport = transport or httpx.AsyncHTTPTransport()
+        self._tracer = tracer
+        self._peer = peer
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        span = _http_client_span(self._tracer or tracer, request, self._peer)
+        with span:
+            if span.sampled:
+                request.headers["traceparent"] = span.traceparent
+            response = await self._transport.handle_async_request(request)
+            _finish_http_span(span, response)
+            return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class TracingTransport(httpx.BaseTransport):
+    """Transport httpx síncrono (clientes OpenAI e Supabase)"""
+
+    def __init__(self, transport: Optional[httpx.BaseTransport] = None,
+                 tracer: Optional[Tracer] = None, peer: Optional[str] = None):
+        self._transport = transport or httpx.HTTPTransport()
+        self._tracer = tracer
+        self._peer = peer
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        span = _http_client_span(self._tracer or tracer, request, self._peer)
+        with span:
+            if span.sampled:
+                request.headers["traceparent"] = span.traceparent
+            response = self._transport.handle_request(request)
+            _finish_http_span(span, response)
+            return response
+
+    def close(self):
+        self._transport.close()
+
+
+def _http_client_span(active: Tracer, request: httpx.Request, peer: Optional[str]):
+    return active.start_span(
+        f"HTTP {request.method} {peer or request.url.host}", 'client',
+        {'http.method': request.method, 'http.url': str(request.url.copy_with(query=None)),
+         'peer.service': peer or request.url.host}
+    )
+
+
+def _finish_http_span(span, response: httpx.Response):
+    span.set_attribute('http.status_code', response.status_code)
+    if response.status_code >= 500 and span.sampled:
+        span.status = 'error'
+
+
+_SUPABASE_OPERATIONS = frozenset(("select", "insert", "update", "upsert", "delete"))
+
+
+class _SupabaseQuery:
+    """Proxy do query builder do postgrest: grava tabela/operação e traça `execute()`"""
+
+    __slots__ = ('_target', '_table', '_operation', '_filters')
+
+    def __init__(self, target, table: str, operation: Optional[str] = None, filters: int = 0):
+        self._target = target
+        self._table = table
+        self._operation = operation
+        self._filters = filters
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name == "execute":
+            return self._execute
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if name in _SUPABASE_OPERATIONS:
+                return _SupabaseQuery(result, self._table, name, self._filters)
+            return _SupabaseQuery(result, self._table, self._operation, self._filters + 1)
+        return call
+
+    def _execute(self, *args, **kwargs):
+        operation = self._operation or "rpc"
+        with tracer.span(f"supabase {operation} {self._table}", 'client',
+                         **{'db.system': 'postgrest', 'db.operation': operation,
+                            'db.table': self._table, 'db.filters': self._filters}) as span:
+            result = self._target.execute(*args, **kwargs)
+            data = getattr(result, "data", None)
+            if isinstance(data, list):
+                span.set_attribute('db.rows', len(data))
+            return result
+
+
+class _SupabaseAuth:
+    __slots__ = ('_target',)
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            with tracer.span(f"supabase auth.{name}", 'client', **{'db.system': 'gotrue'}):
+                return attr(*args, **kwargs)
+        return call
+
+
+class TracedSupabaseClient:
+    """Envolve o `supabase.Client`: `table()`/`rpc()` e `auth` geram spans"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name: str):
+        return _SupabaseQuery(self._client.table(name), name)
+
+    from_ = table
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None, *args, **kwargs):
+        return _SupabaseQuery(self._client.rpc(fn, params or {}, *args, **kwargs), f"rpc:{fn}", "rpc")
+
+    @property
+    def auth(self):
+        return _SupabaseAuth(self._client.auth)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def instrument_sqlalchemy(engine):
+    """Spans por statement via eventos do engine (before/after_cursor_execute)"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        span = tracer.start_span(
+            "db.query", 'client',
+            {'db.system': engine.dialect.name, 'db.statement': statement[:500]},
+            child_only=True
+        )
+        if span.sampled:
+            span.attributes['db.operation'] = statement.lstrip().split(" ", 1)[0].upper()
+        conn.info.setdefault("milapp_spans", []).append(span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("milapp_spans")
+        if spans:
+            span = spans.pop()
+            if span.sampled and cursor.rowcount is not None and cursor.rowcount >= 0:
+                span.set_attribute('db.rows', cursor.rowcount)
+            span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        spans = context.connection.info.get("milapp_spans") if context.connection is not None else None
+        if spans:
+            span = spans.pop()
+            span.record_exception(context.original_exception)
+            span.end()
+
+
+ring_exporter = RingExporter(settings.TRACING_RING_SIZE)
+tracer = Tracer(
+    sample_rate=settings.TRACING_SAMPLE_RATE,
+    exporters=[ring_exporter] + (
+        [OTLPFileExporter(settings.TRACING_OTLP_FILE, settings.TRACING_SERVICE_NAME)]
+        if settings.TRACING_OTLP_FILE else []
+    ),
+    enabled=settings.TRACING_ENABLED,
+    trust_remote_sampled=settings.TRACING_TRUST_REMOTE_SAMPLED
+)
@@ -0,0 +1,170 @@
+"""
+Aquecimento do cache na subida da aplicação
+
+Cada fonte registrada descobre seus alvos quentes (ex.: projetos alterados
+recentemente, usuários mais ativos) e pré-calcula o valor de cada um no
+cache. Tudo roda em background com concorrência limitada e prazo total; a
+aplicação só se declara pronta (`ready`) quando o aquecimento termina ou
+estoura o prazo, para o balanceador não mandar os primeiros usuários para um
+worker frio.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.services.monitoring_service import monitoring_service
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmupSource:
+    """Fonte de aquecimento: `discover(limit)` lista os alvos, `warm(alvo)` aquece um"""
+    name: str
+    discover: Callable[[int], Awaitable[Iterable[Any]]]
+    warm: Callable[[Any], Awaitable[Any]]
+    limit: int = 50
+    targets: int = 0
+    warmed: int = 0
+    failed: int = 0
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'targets': self.targets,
+            'warmed': self.warmed,
+            'failed': self.failed,
+            'error': self.error
+        }
+
+
+@dataclass
+class WarmupState:
+    status: str = "pending"  # pending | running | ready | timed_out | disabled
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    sources: List[WarmupSource] = field(default_factory=list)
+
+
+class CacheWarmer:
+    """Executa as fontes registradas com `concurrency` aquecimentos simultâneos"""
+
+    def __init__(self, concurrency: int = 8, timeout: float = 30.0, enabled: bool = True, registry=None):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.enabled = enabled
+        self.state = WarmupState(status="pending" if enabled else "disabled")
+        self._task: Optional[asyncio.Task] = None
+        self._done = asyncio.Event()
+        if not enabled:
+            self._done.set()
+
+        registry = registry or monitoring_service.registry
+        self.ready_gauge = registry.gauge(
+            'milapp_cache_warmup_ready', 'Aquecimento do cache concluído (1) ou em andamento (0)',
+            multiprocess_mode='min'
+        )
+        self.duration_gauge = registry.gauge(
+            'milapp_cache_warmup_duration_seconds', 'Duração do último aquecimento do cache'
+        )
+        self.targets_total = registry.counter(
+            'milapp_cache_warmup_targets_total', 'Alvos aquecidos por fonte e resultado', ('source', 'result')
+        )
+        self.ready_gauge.set(0 if enabled else 1)
+
+    def register(self, name: str, discover: Callable[[int], Awaitable[Iterable[Any]]],
+                 warm: Callable[[Any], Awaitable[Any]], limit: int = 50):
+        self.state.sources.append(WarmupSource(name, discover, warm, limit))
+
+    @property
+    def ready(self) -> bool:
+        return self.state.status in ("ready", "timed_out", "disabled")
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def start(self):
+        """Dispara o aquecimento em background (chamado no lifespan)"""
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self.run(), name="cache-warmup")
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def run(self) -> Dict[str, Any]:
+        state = self.state
+        state.status = "running"
+        state.started_at = time.time()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(self._run_source(source, semaphore) for source in state.sources)),
+                self.timeout
+            )
+            state.status = "ready"
+        except asyncio.TimeoutError:
+            state.status = "timed_out"
+            logger.warning(f"Aquecimento do cache excedeu {self.timeout}s; seguindo com cache parcial")
+        finally:
+            state.finished_at = time.time()
+            self.duration_gauge.set(state.finished_at - state.started_at)
+            self.ready_gauge.set(1)
+            self._done.set()
+        logger.info(f"Aquecimento do cache: {state.status} em {state.finished_at - state.started_at:.2f}s")
+        return self.status()
+
+    async def _run_source(self, source: WarmupSource, semaphore: asyncio.Semaphore):
+        try:
+            targets = list(await source.discover(source.limit))[:source.limit]
+        except Exception as e:
+            source.error = str(e)
+            logger.error(f"Falha ao listar alvos de aquecimento ({source.name}): {e}")
+            return
+        source.targets = len(targets)
+        warmed = self.targets_total.labels(source.name, 'warmed')
+        failed = self.targets_total.labels(source.name, 'failed')
+
+        async def warm_one(target):
+            async with semaphore:
+                try:
+                    await source.warm(target)
+                except Exception as e:
+                    source.failed += 1
+                    failed.inc()
+                    logger.warning(f"Falha ao aquecer {source.name}:{target}: {e}")
+                else:
+                    source.warmed += 1
+                    warmed.inc()
+
+        await asyncio.gather(*(warm_one(target) for target in targets))
+
+    def status(self) -> Dict[str, Any]:
+        state = self.state
+        duration = None
+        if state.started_at is not None:
+            duration = round((state.finished_at or time.time()) - state.started_at, 3)
+        return {
+            'status': state.status,
+            'ready': self.ready,
+            'duration_seconds': duration,
+            'sources': {source.name: source.to_dict() for source in state.sources}
+        }
+
+
+cache_warmer = CacheWarmer(
+    concurrency=settings.WARMUP_CONCURRENCY,
+    timeout=settings.WARMUP_TIMEOUT_SECONDS,
+    enabled=settings.WARMUP_ENABLED
+)
@@ -0,0 +1,56 @@
+"""
+Processo worker da fila de jobs
+
+    python -m app.worker --concurrency 8 --queues ai,reports
+
+Padrões em settings (JOB_WORKER_CONCURRENCY, JOB_WORKER_QUEUES). SIGTERM ou
+SIGINT param a reivindicação de novos jobs; os que estão em execução terminam
+antes de o processo sair. Para escalar, rode mais processos: a reivindicação
+com SKIP LOCKED não deixa dois workers pegarem o mesmo job.
+
+O worker também regrava os snapshots colunares dos dashboards customizados
+(COLUMNAR_SNAPSHOT_ENABLED), mantendo essa leitura pesada fora da API.
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+
+from app.core.config import settings
+from app.services import job_tasks  # noqa: F401 - registra as tarefas em job_queue
+from app.services.columnar_store import columnar_snapshot_job, columnar_store
+from app.services.job_queue import JobWorker, job_queue
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main(concurrency: int, queues: list) -> None:
+    worker = JobWorker(
+        job_queue,
+        queues=queues,
+        concurrency=concurrency,
+        poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+        visibility_timeout=settings.JOB_VISIBILITY_TIMEOUT_SECONDS
+    )
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    columnar_snapshot_job.start()
+    try:
+        processed = await worker.run()
+        logger.info(f"Worker {worker.worker_id} encerrado após {processed} job(s)")
+    finally:
+        await columnar_snapshot_job.stop()
+        await columnar_store.close()
+        await job_queue.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker da fila de jobs em background")
+    parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY)
+    parser.add_argument("--queues", default=settings.JOB_WORKER_QUEUES,
+                        help="Filas atendidas, separadas por vírgula")
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, [queue.strip() for queue in args.queues.split(",") if queue.strip()]))
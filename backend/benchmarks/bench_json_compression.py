@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Benchmark de serialização e compressão de uma lista grande de tasks
+
+Compara, para uma TaskListResponse com N tasks:
+- caminho padrão do FastAPI sem response_model (jsonable_encoder + json);
+- response_model pydantic (model_dump em modo JSON) + JSONResponse;
+- FastJSONResponse (orjson) com o dict cru e com o modelo;
+e os bytes transferidos sem compressão, com gzip e com brotli, passando
+a resposta pelo CompressionMiddleware.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.core.middleware import CompressionMiddleware, brotli
+from app.core.responses import FastJSONResponse
+from app.services.monitoring_service import MonitoringService
+
+STATUSES = ["backlog", "todo", "in_progress", "review", "testing", "done"]
+PRIORITIES = ["low", "medium", "high", "critical"]
+
+
+# Mesmo formato de TaskResponse/TaskListResponse (app/api/v1/endpoints/tasks.py)
+class TaskResponse(BaseModel):
+    id: str
+    title: str
+    description: Optional[str] = None
+    status: str
+    priority: str
+    type: str
+    assignee_id: Optional[str] = None
+    story_points: Optional[int] = None
+    due_date: Optional[datetime] = None
+    tags: List[str] = []
+    sprint_id: Optional[str] = None
+    project_id: str
+    created_by: str
+    created_at: datetime
+    updated_at: datetime
+    assignee: Optional[dict] = None
+    comments_count: int = 0
+    attachments_count: int = 0
+
+
+class TaskListResponse(BaseModel):
+    tasks: List[TaskResponse]
+    total: int
+    page: int
+    size: int
+    pages: int
+
+
+def build_tasks(count: int) -> dict:
+    base = datetime(2024, 1, 1, 9, 0, 0)
+    project_id = uuid.uuid4()
+    tasks = []
+    for i in range(count):
+        created = base + timedelta(minutes=i)
+        tasks.append({
+            "id": uuid.uuid4(),
+            "title": f"Automatizar conciliação de faturas lote {i}",
+            "description": "Robô RPA para leitura de faturas, validação no ERP e envio de relatório diário.",
+            "status": STATUSES[i % len(STATUSES)],
+            "priority": PRIORITIES[i % len(PRIORITIES)],
+            "type": "task",
+            "assignee_id": str(uuid.UUID(int=i % 40)),
+            "story_points": i % 13,
+            "due_date": created + timedelta(days=14),
+            "tags": ["rpa", "financeiro", f"sprint-{i % 10}"],
+            "sprint_id": f"sprint-{i % 10}",
+            "project_id": project_id,
+            "created_by": str(uuid.UUID(int=7)),
+            "created_at": created,
+            "updated_at": created + timedelta(hours=3),
+            "assignee": {"name": f"Analista {i % 40}", "hours": Decimal("7.50")},
+            "comments_count": i % 7,
+            "attachments_count": i % 3
+        })
+    return {"tasks": tasks, "total": count, "page": 1, "size": count, "pages": 1}
+
+
+def timed(func, repeat: int) -> float:
+    """Mediana em milissegundos"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def wire_bytes(body: bytes, accept_encoding: str, monitoring, repeat: int):
+    """Bytes e tempo (ms) da resposta passando pelo CompressionMiddleware"""
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    middleware = CompressionMiddleware(app, monitoring=monitoring)
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            sent.append(len(message["body"]))
+
+    samples = []
+    for _ in range(repeat):
+        sent.clear()
+        started = time.perf_counter()
+        await middleware(scope, receive, send)
+        samples.append((time.perf_counter() - started) * 1000)
+    return sum(sent), statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=15)
+    args = parser.parse_args()
+
+    raw = build_tasks(args.tasks)
+    # As rotas convertem ids com str() antes de montar o modelo
+    model = TaskListResponse.model_validate({
+        **raw,
+        "tasks": [{**task, "id": str(task["id"]), "project_id": str(task["project_id"])} for task in raw["tasks"]]
+    })
+
+    results = {
+        "jsonable_encoder + JSONResponse": lambda: JSONResponse(jsonable_encoder(raw)).body,
+        "response_model + JSONResponse": lambda: JSONResponse(model.model_dump(mode="json")).body,
+        "response_model + FastJSONResponse": lambda: FastJSONResponse(model.model_dump()).body,
+        "dict + FastJSONResponse": lambda: FastJSONResponse(raw).body,
+    }
+    print(f"tasks: {args.tasks}  rodadas: {args.repeat}")
+    print("serialização (mediana):")
+    for name, func in results.items():
+        print(f"  {name:<36} {timed(func, args.repeat):8.2f} ms")
+
+    body = FastJSONResponse(raw).body
+    monitoring = MonitoringService()
+    print("bytes transferidos:")
+    print(f"  {'identity':<10} {len(body):>10,} bytes")
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    for encoding in encodings:
+        size, elapsed = asyncio.run(wire_bytes(body, encoding, monitoring, args.repeat))
+        print(f"  {encoding:<10} {size:>10,} bytes  ({size / len(body):.1%})  compressão {elapsed:.2f} ms")
+    if brotli is None:
+        print("  (brotli não instalado)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark da renderização do /metrics (formato texto do Prometheus)
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.metrics_registry import MetricsRegistry
+
+
+def build_registry(routes: int, methods: int, statuses: int) -> MetricsRegistry:
+    """Popula um registro com séries equivalentes às do MonitoringService"""
+    registry = MetricsRegistry()
+    requests_total = registry.counter('http_requests_total', 'Total de requisições HTTP', ('method', 'route', 'status'))
+    duration = registry.histogram('http_request_duration_seconds', 'Latência das requisições HTTP', ('method', 'route'))
+    gauges = registry.gauge('milapp_gauge', 'Gauge de teste', ('name',))
+
+    method_names = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH'][:methods]
+    status_codes = [200, 201, 204, 400, 401, 404, 500][:statuses]
+    for route_index in range(routes):
+        route = f"/api/v1/resource_{route_index}/{{item_id}}"
+        for method in method_names:
+            for status in status_codes:
+                requests_total.labels(method, route, status).inc(random.randint(1, 10000))
+            child = duration.labels(method, route)
+            for _ in range(20):
+                child.observe(random.random() * 2)
+        gauges.labels(f"g{route_index}").set(random.random())
+    return registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--routes', type=int, default=100)
+    parser.add_argument('--methods', type=int, default=4)
+    parser.add_argument('--statuses', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--churn', type=float, default=0.1,
+                        help='fração das séries alteradas entre scrapes')
+    args = parser.parse_args()
+
+    registry = build_registry(args.routes, args.methods, args.statuses)
+    payload = registry.render()
+    lines = payload.count(b'\n')
+
+    # Séries atualizadas entre um scrape e outro (tráfego entre scrapes)
+    children = []
+    for name in ('http_requests_total', 'http_request_duration_seconds', 'milapp_gauge'):
+        children.extend(registry.get(name)._children.values())
+    changed = random.sample(children, int(len(children) * args.churn))
+
+    timings = []
+    for _ in range(args.iterations):
+        for child in changed:
+            if hasattr(child, 'observe'):
+                child.observe(random.random())
+            else:
+                child.inc()
+        start = time.perf_counter()
+        registry.render()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    print(f"Séries registradas: {registry.series_count()}")
+    print(f"Séries alteradas por scrape: {len(changed)}")
+    print(f"Linhas exportadas: {lines} ({len(payload) / 1024:.1f} KiB)")
+    print(f"Render mediana: {statistics.median(timings):.2f} ms")
+    print(f"Render p99: {timings[int(len(timings) * 0.99) - 1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark do custo por requisição do RequestMetricsMiddleware
+
+Chama o app ASGI diretamente (sem servidor nem cliente HTTP) com e sem o
+middleware e reporta a diferença por requisição.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+from app.core.middleware import RequestMetricsMiddleware
+from app.services.monitoring_service import MonitoringService
+
+
+def build_app(routes: int) -> FastAPI:
+    app = FastAPI()
+    for index in range(routes):
+        async def endpoint(item_id: str):
+            return PlainTextResponse("ok")
+        app.add_api_route(f"/api/v1/resource_{index}/{{item_id}}", endpoint, methods=["GET"])
+    return app
+
+
+async def bare_app(scope, receive, send):
+    """App ASGI mínimo: isola o custo do middleware do custo do roteamento"""
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def run(app, paths, iterations: int) -> float:
+    """Tempo médio por requisição em microssegundos"""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        path = paths[i % len(paths)]
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+            "root_path": "", "query_string": b"", "headers": [],
+            "client": ("127.0.0.1", 1234), "server": ("127.0.0.1", 8000)
+        }
+        await app(scope, receive, send)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main_async(args):
+    app = build_app(args.routes)
+    paths = [f"/api/v1/resource_{i % args.routes}/{i:08x}" for i in range(args.routes * 10)]
+    monitoring = MonitoringService()
+    instrumented = RequestMetricsMiddleware(app, monitoring=monitoring)
+
+    # Aquecimento (rotas compiladas, séries criadas)
+    await run(app, paths, 500)
+    await run(instrumented, paths, 500)
+
+    bare_instrumented = RequestMetricsMiddleware(bare_app, monitoring=monitoring)
+    results = {name: [] for name in ("fastapi", "fastapi+middleware", "asgi", "asgi+middleware")}
+    for _ in range(args.repeat):
+        results["fastapi"].append(await run(app, paths, args.iterations))
+        results["fastapi+middleware"].append(await run(instrumented, paths, args.iterations))
+        results["asgi"].append(await run(bare_app, paths, args.iterations))
+        results["asgi+middleware"].append(await run(bare_instrumented, paths, args.iterations))
+
+    medians = {name: statistics.median(values) for name, values in results.items()}
+    print(f"rotas: {args.routes}  requisições/rodada: {args.iterations}  rodadas: {args.repeat}")
+    for name, value in medians.items():
+        print(f"{name:<20} {value:8.2f} µs/req")
+    print(f"custo isolado do middleware: {medians['asgi+middleware'] - medians['asgi']:.2f} µs/req")
+    print(f"custo sobre rota FastAPI:    {medians['fastapi+middleware'] - medians['fastapi']:.2f} µs/req")
+    print(f"séries http_requests_total: {monitoring.http_requests_total.series_count()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--routes", type=int, default=30)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Testes do cache em dois níveis (app/services/cache_service.py)
+
+O Redis é o `fakeredis`; derrubar o servidor (`server.connected = False`)
+simula a queda do L2. O relógio é injetado para controlar expiração e o
+intervalo de nova tentativa sem dormir.
+"""
+
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.services.cache_service import ALL_TAG, CacheService, JSONSerializer, MsgpackSerializer, get_serializer
+from app.services.metrics_registry import MetricsRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_cache(server=None, clock=None, **kwargs) -> CacheService:
+    redis_client = fakeredis.FakeAsyncRedis(server=server or fakeredis.FakeServer())
+    kwargs.setdefault("ttl_jitter", 0)
+    return CacheService(redis_client=redis_client, registry=MetricsRegistry(), clock=clock or FakeClock(), **kwargs)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_l1_hit_after_set():
+    cache = make_cache()
+
+    async def scenario():
+        await cache.set("project:1", {"name": "MILAPP"})
+        return await cache.get("project:1")
+
+    assert run(scenario()) == {"name": "MILAPP"}
+    assert cache._l1_hit.value == 1
+    assert cache._l2_hit.value == 0
+
+
+def test_l2_hit_fills_l1_and_miss_returns_default():
+    server = fakeredis.FakeServer()
+    writer, reader = make_cache(server), make_cache(server)
+
+    async def scenario():
+        await writer.set("project:1", [1, 2, 3])
+        first = await reader.get("project:1")
+        second = await reader.get("project:1")
+        missing = await reader.get("project:2", default="nada")
+        return first, second, missing
+
+    assert run(scenario()) == ([1, 2, 3], [1, 2, 3], "nada")
+    assert reader._l2_hit.value == 1
+    assert reader._l1_hit.value == 1
+    assert reader._l2_miss.value == 1
+
+
+def test_l1_entry_expires_with_clock():
+    clock = FakeClock()
+    cache = make_cache(clock=clock, l1_ttl=5)
+    cache.redis_client = None  # Só L1
+
+    async def scenario():
+        await cache.set("k", "v")
+        before = await cache.get("k")
+        clock.now += 6
+        return before, await cache.get("k")
+
+    assert run(scenario()) == ("v", None)
+
+
+def test_ttl_jitter_stays_within_bounds():
+    cache = make_cache(ttl_jitter=0.1, default_ttl=100)
+    samples = [cache._ttl(None) for _ in range(2000)]
+    assert all(90 <= ttl <= 110 for ttl in samples)
+    assert max(samples) - min(samples) > 5  # Espalha de fato
+    assert make_cache(ttl_jitter=0)._ttl(60) == 60
+    assert cache._ttl(0) == 0
+
+
+def test_l2_ttl_includes_jitter():
+    server = fakeredis.FakeServer()
+    cache = make_cache(server, ttl_jitter=0.2)
+
+    async def scenario():
+        await cache.set("k", 1, ttl=100)
+        return await cache.redis_client.pttl("milapp:k#0")
+
+    assert 80_000 <= run(scenario()) <= 120_000
+
+
+def test_single_flight_runs_loader_once():
+    cache = make_cache()
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"total": 42}
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_set("kpis", loader) for _ in range(20)))
+
+    results = run(scenario())
+    assert calls == 1
+    assert results == [{"total": 42}] * 20
+    assert cache.coalesced_total.value == 19
+    assert cache._inflight == {}
+
+
+def test_single_flight_survives_cancelled_leader():
+    cache = make_cache()
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "pronto"
+
+    async def scenario():
+        leader = asyncio.create_task(cache.get_or_set("k", loader))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(cache.get_or_set("k", loader)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*waiters)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return results, await cache.get("k")
+
+    results, cached = run(scenario())
+    assert results == ["pronto"] * 3
+    assert cached == "pronto"
+    assert calls == 1
+
+
+def test_single_flight_propagates_loader_error_and_retries():
+    cache = make_cache()
+    attempts = 0
+
+    async def loader():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0.01)
+        if attempts == 1:
+            raise RuntimeError("banco fora")
+        return "ok"
+
+    async def scenario():
+        first = await asyncio.gather(*(cache.get_or_set("k", loader) for _ in range(3)), return_exceptions=True)
+        return first, await cache.get_or_set("k", loader)
+
+    first, second = run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in first)
+    assert second == "ok"
+    assert attempts == 2
+
+
+def test_redis_down_falls_back_to_l1_and_loader():
+    server = fakeredis.FakeServer()
+    clock = FakeClock()
+    cache = make_cache(server, clock=clock, retry_after=5)
+
+    async def scenario():
+        server.connected = False
+        value = await cache.get_or_set("k", lambda: "do banco")
+        assert not cache.is_available()
+        cached = await cache.get("k")
+        server.connected = True
+        clock.now += 6
+        assert cache.is_available()
+        await cache.set("k2", "de novo no redis")
+        return value, cached, await cache.redis_client.get("milapp:k2#0")
+
+    value, cached, raw = run(scenario())
+    assert (value, cached) == ("do banco", "do banco")
+    assert raw == b'"de novo no redis"'
+    assert cache._l2_error.value >= 1
+
+
+def test_invalidate_tags_changes_physical_key():
+    cache = make_cache()
+
+    async def scenario():
+        await cache.set("project:1", "v1", tags=["project:1"])
+        await cache.invalidate_tags("project:1")
+        stale = await cache.get("project:1", tags=["project:1"])
+        await cache.set("project:1", "v2", tags=["project:1"])
+        return stale, await cache.get("project:1", tags=["project:1"])
+
+    assert run(scenario()) == (None, "v2")
+
+
+def test_invalidation_while_redis_down_is_not_undone_on_reconnect():
+    server = fakeredis.FakeServer()
+    clock = FakeClock()
+    cache, peer = make_cache(server, clock=clock, l1_ttl=5, retry_after=5), make_cache(server, clock=clock)
+
+    async def scenario():
+        await cache.set("project:1", "v1", ttl=600, tags=["project:1"])
+        before = await peer.tag_versions(["project:1"])
+        server.connected = False
+        await cache.invalidate_tags("project:1")
+        server.connected = True
+        clock.now += 6  # Passa o retry_after e vence a geração em cache
+        stale = await cache.get("project:1", tags=["project:1"])
+        return before, stale, await peer.tag_versions(["project:1"]), await cache.tag_versions(["project:1"])
+
+    before, stale, peer_versions, own_versions = run(scenario())
+    assert stale is None
+    assert peer_versions["project:1"] == before["project:1"] + 1  # INCR repetido após a volta do Redis
+    assert own_versions["project:1"] >= peer_versions["project:1"]
+    assert cache.stats()["tags_unsynced"] == 0
+
+
+def test_repeated_invalidations_while_redis_down_are_all_replayed():
+    server = fakeredis.FakeServer()
+    clock = FakeClock()
+    cache, peer = make_cache(server, clock=clock, retry_after=5), make_cache(server, clock=clock)
+
+    async def scenario():
+        before = await peer.tag_versions(["project:1"])
+        server.connected = False
+        await cache.invalidate_tags("project:1")
+        await cache.invalidate_tags("project:1")
+        server.connected = True
+        clock.now += 6
+        own = await cache.tag_versions(["project:1"])
+        return before, own, await peer.tag_versions(["project:1"])
+
+    before, own, peer_versions = run(scenario())
+    assert own["project:1"] == peer_versions["project:1"] == before["project:1"] + 2
+
+
+def test_tag_versions_are_bounded_but_keep_pending_floors():
+    server = fakeredis.FakeServer()
+    clock = FakeClock()
+    cache = make_cache(server, clock=clock, tag_maxsize=4, retry_after=5)
+
+    async def scenario():
+        server.connected = False
+        await cache.invalidate_tags("project:pendente")
+        await cache.tag_versions(f"user:{i}" for i in range(50))
+        return await cache.tag_versions(["project:pendente"])
+
+    assert run(scenario()) == {"project:pendente": 1}
+    assert cache.stats()["tags_tracked"] <= 4
+    assert "project:pendente" in cache._tag_versions
+
+
+def test_too_many_pending_invalidations_fall_back_to_invalidate_all():
+    server = fakeredis.FakeServer()
+    clock = FakeClock()
+    cache = make_cache(server, clock=clock, max_unsynced=2, l1_ttl=5, retry_after=5)
+    peer = make_cache(server, clock=clock)
+
+    async def scenario():
+        await peer.set("project:9", "velho", ttl=600)
+        server.connected = False
+        await cache.invalidate_tags("project:1", "project:2", "project:3")
+        pending = dict(cache._unsynced)
+        server.connected = True
+        clock.now += 6
+        stale = await cache.get("project:9")
+        return pending, stale, await peer.tag_versions([ALL_TAG])
+
+    pending, stale, peer_versions = run(scenario())
+    assert pending == {ALL_TAG: 1}
+    assert stale is None  # Nem a chave sem tags sobrevive
+    assert peer_versions[ALL_TAG] == 1
+    assert cache.stats()["tags_unsynced"] == 0
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("json", JSONSerializer), ("orjson", JSONSerializer), ("msgpack", MsgpackSerializer),
+])
+def test_serializer_selection_round_trips(name, expected):
+    serializer = get_serializer(name)
+    assert isinstance(serializer, expected)
+    payload = {"id": 1, "tags": ["a", "b"], "roi": 1.5}
+    assert serializer.loads(serializer.dumps(payload)) == payload
+
+
+def test_json_serializer_without_orjson():
+    assert get_serializer("json").name == "json"
+    assert get_serializer("orjson").name == "orjson"
+
+
+def test_unknown_serializer_is_rejected():
+    with pytest.raises(ValueError):
+        get_serializer("pickle")
+
+
+def test_msgpack_values_survive_l2():
+    server = fakeredis.FakeServer()
+    writer, reader = make_cache(server, serializer="msgpack"), make_cache(server, serializer="msgpack")
+
+    async def scenario():
+        await writer.set("k", {"values": [1, 2, 3]})
+        return await reader.get("k")
+
+    assert run(scenario()) == {"values": [1, 2, 3]}
@@ -0,0 +1,76 @@
+"""
+Testes do executor de widgets (app/services/dashboard_executor.py)
+
+As sessões são falsas: a fábrica só conta quantas estão abertas ao mesmo
+tempo, o que basta para verificar o limite compartilhado do pool.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from app.services.dashboard_executor import DashboardExecutor, WidgetSpec
+from app.services.metrics_registry import MetricsRegistry
+
+
+class CountingSessions:
+    def __init__(self):
+        self.open = 0
+        self.peak = 0
+
+    @asynccontextmanager
+    async def __call__(self):
+        self.open += 1
+        self.peak = max(self.peak, self.open)
+        try:
+            yield self
+        finally:
+            self.open -= 1
+
+
+def widgets(count, delay, timeout=None):
+    async def provider(db, user_id):
+        await asyncio.sleep(delay)
+        return user_id
+
+    return [WidgetSpec(f"w{i}", "kpi", f"Widget {i}", provider, timeout) for i in range(count)]
+
+
+def test_sessions_are_capped_across_concurrent_dashboards():
+    sessions = CountingSessions()
+    executor = DashboardExecutor(sessions, max_concurrency=4, max_sessions=3, registry=MetricsRegistry())
+
+    async def scenario():
+        return await asyncio.gather(*(executor.run(widgets(4, 0.02), f"u{i}") for i in range(5)))
+
+    results = asyncio.run(scenario())
+    assert sessions.peak == 3
+    assert all(not result["partial"] for result in results)
+
+
+def test_waiting_for_a_pool_slot_counts_against_the_timeout():
+    sessions = CountingSessions()
+    executor = DashboardExecutor(sessions, max_concurrency=4, max_sessions=1, registry=MetricsRegistry())
+
+    async def scenario():
+        slow = asyncio.create_task(executor.run(widgets(1, 0.3), "lento"))
+        await asyncio.sleep(0.01)
+        waiting = await executor.run(widgets(1, 0.0, timeout=0.05), "espera")
+        return await slow, waiting
+
+    slow, waiting = asyncio.run(scenario())
+    assert slow["widgets"][0]["status"] == "ok"
+    assert waiting["widgets"][0]["status"] == "timeout"
+    assert waiting["widgets"][0]["elapsed_ms"] < 250
+
+
+def test_explicit_session_factory_does_not_use_pool_slots():
+    executor = DashboardExecutor(CountingSessions(), max_sessions=1, registry=MetricsRegistry())
+    own = CountingSessions()
+
+    async def scenario():
+        async with executor._pool_slots:  # Pool da aplicação ocupado
+            return await executor.run(widgets(3, 0.0, timeout=0.05), "u1", session_factory=own)
+
+    result = asyncio.run(scenario())
+    assert not result["partial"]
+    assert own.peak == 3
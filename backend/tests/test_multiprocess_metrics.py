@@ -0,0 +1,54 @@
+"""
+Testes da agregação de métricas entre workers (app/services/multiprocess_metrics.py)
+
+Dois agregadores no mesmo processo simulam um worker que morreu e outro que
+subiu com o mesmo pid: o segundo cria um segmento próprio em vez de truncar o
+do primeiro, e os counters do antecessor sobrevivem à compactação.
+"""
+
+import os
+
+from app.services.multiprocess_metrics import ARCHIVE_FILE, MultiprocessAggregator
+
+
+def counter_snapshot(value):
+    return lambda: {"families": [
+        ("milapp_requests_total", "Requisições", "counter", "sum", [("milapp_requests_total", {}, value)]),
+        ("milapp_inflight", "Em andamento", "gauge", "sum", [("milapp_inflight", {}, 1)]),
+    ]}
+
+
+def totals(aggregator):
+    return {name: samples[0][2] for name, _, _, _, samples in aggregator.merged_families()}
+
+
+def test_reused_pid_does_not_truncate_the_previous_segment(tmp_path):
+    previous = MultiprocessAggregator(str(tmp_path), counter_snapshot(7), segment_size=4096)
+    previous.publish()
+    previous.close()  # Worker morto sem compactar
+
+    current = MultiprocessAggregator(str(tmp_path), counter_snapshot(3), segment_size=4096)
+    current.publish()
+    assert current.path != previous.path
+    assert os.path.exists(previous.path)
+    assert totals(current) == {"milapp_requests_total": 10, "milapp_inflight": 1}
+
+    assert current.compact() == 1
+    assert not os.path.exists(previous.path)
+    assert os.path.exists(os.path.join(str(tmp_path), ARCHIVE_FILE))
+    assert totals(current) == {"milapp_requests_total": 10, "milapp_inflight": 1}
+    assert current.compact() == 0
+    current.close()
+
+
+def test_legacy_segment_with_own_pid_is_compacted(tmp_path):
+    legacy = MultiprocessAggregator(str(tmp_path), counter_snapshot(5), segment_size=4096)
+    legacy.publish()
+    legacy.close()
+    os.rename(legacy.path, os.path.join(str(tmp_path), f"worker-{os.getpid()}.seg"))
+
+    current = MultiprocessAggregator(str(tmp_path), counter_snapshot(1), segment_size=4096)
+    current.publish()
+    assert current.compact() == 1
+    assert totals(current)["milapp_requests_total"] == 6
+    current.close()
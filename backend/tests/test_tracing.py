@@ -0,0 +1,177 @@
+"""
+Testes do tracing leve (app/services/tracing.py)
+
+Cada teste usa um Tracer próprio, com `rng` fixo para a amostragem e o
+RingExporter para inspecionar os spans gravados; nada sai do processo.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.services.tracing import OTLPFileExporter, RingExporter, Tracer, parse_traceparent
+
+REMOTE_TRACE = "4bf92f3577b34da6a3ce929d0e0e4736"
+REMOTE_PARENT = "00f067aa0ba902b7"
+
+
+def make_tracer(sample_rate=1.0, rng=lambda: 0.0, **kwargs):
+    ring = RingExporter(capacity=10)
+    return Tracer(sample_rate=sample_rate, exporters=[ring], rng=rng, **kwargs), ring
+
+
+def test_head_sampling_follows_rate():
+    tracer, ring = make_tracer(sample_rate=0.25, rng=lambda: 0.1)
+    with tracer.span("sampled") as root:
+        with tracer.span("child") as child:
+            pass
+    assert root.sampled and child.trace_id == root.trace_id
+    assert root.attributes["sampling.rate"] == 0.25
+
+    dropped, dropped_ring = make_tracer(sample_rate=0.25, rng=lambda: 0.9)
+    with dropped.span("skipped") as root:
+        with dropped.span("child") as child:
+            assert dropped.current_span() is child
+    assert not root.sampled and not child.sampled
+    assert [t["name"] for t in ring.traces()] == ["sampled"]
+    assert dropped_ring.traces() == []
+
+
+def test_disabled_tracer_and_child_only_record_nothing():
+    tracer, ring = make_tracer(enabled=False)
+    with tracer.span("root") as span:
+        pass
+    assert not span.sampled
+
+    tracer, ring = make_tracer()
+    assert not tracer.start_span("db.query", child_only=True).sampled
+    assert ring.traces() == []
+
+
+def test_remote_sampled_flag_is_ignored_by_default():
+    tracer, ring = make_tracer(sample_rate=0.0)
+    span = tracer.start_span("HTTP GET", "server", traceparent=f"00-{REMOTE_TRACE}-{REMOTE_PARENT}-01")
+    assert not span.sampled
+
+    tracer, ring = make_tracer(sample_rate=1.0)
+    span = tracer.start_span("HTTP GET", "server", traceparent=f"00-{REMOTE_TRACE}-{REMOTE_PARENT}-00")
+    assert span.sampled  # Decisão local; o trace continua o do cliente
+    assert (span.trace_id, span.parent_id) == (REMOTE_TRACE, REMOTE_PARENT)
+
+
+@pytest.mark.parametrize("flags, expected", [("01", True), ("00", False)])
+def test_remote_sampled_flag_is_followed_when_trusted(flags, expected):
+    tracer, _ = make_tracer(sample_rate=0.5, rng=lambda: 0.9 if flags == "01" else 0.1, trust_remote_sampled=True)
+    span = tracer.start_span("HTTP GET", "server", traceparent=f"00-{REMOTE_TRACE}-{REMOTE_PARENT}-{flags}")
+    assert span.sampled is expected
+
+
+def test_malformed_traceparent_starts_a_new_trace():
+    assert parse_traceparent(f"00-{'0' * 32}-{REMOTE_PARENT}-01") is None
+    assert parse_traceparent("00-xyz-abc-01") is None
+    tracer, _ = make_tracer()
+    span = tracer.start_span("HTTP GET", "server", traceparent="lixo")
+    assert span.sampled and span.parent_id is None and span.trace_id != REMOTE_TRACE
+
+
+def test_context_propagates_across_await_and_tasks():
+    tracer, ring = make_tracer()
+
+    async def step(name):
+        with tracer.span(name) as span:
+            await asyncio.sleep(0.01)
+            with tracer.span(f"{name}.query") as query:
+                await asyncio.sleep(0)
+            return span, query
+
+    async def scenario():
+        with tracer.span("request") as root:
+            results = await asyncio.gather(step("a"), step("b"))
+            assert tracer.current_span() is root
+        assert tracer.current_span() is None
+        return root, results
+
+    root, results = asyncio.run(scenario())
+    for span, query in results:
+        assert span.parent_id == root.span_id
+        assert query.parent_id == span.span_id
+    spans = ring.get(root.trace_id)
+    assert len(spans) == 5
+    assert {s["trace_id"] for s in spans} == {root.trace_id}
+
+
+def test_unsampled_decision_propagates_to_tasks():
+    tracer, ring = make_tracer(sample_rate=0.0)
+
+    async def scenario():
+        with tracer.span("request"):
+            inner = await asyncio.gather(asyncio.create_task(child()))
+        return inner[0]
+
+    async def child():
+        with tracer.span("child") as span:
+            await asyncio.sleep(0)
+            return span
+
+    assert not asyncio.run(scenario()).sampled
+    assert ring.traces() == []
+
+
+def test_ring_exporter_summaries_and_capacity():
+    tracer, ring = make_tracer()
+    ring.capacity = 3
+    for index in range(5):
+        with tracer.span(f"op{index}") as root:
+            with tracer.span("child"):
+                pass
+            if index == 4:
+                root.record_exception(RuntimeError("falhou"))
+    summaries = ring.traces()
+    assert [s["name"] for s in summaries] == ["op4", "op3", "op2"]
+    assert summaries[0]["status"] == "error" and summaries[1]["status"] == "ok"
+    assert all(s["span_count"] == 2 for s in summaries)
+    assert ring.traces(min_duration_ms=10_000) == []
+    spans = ring.get(summaries[0]["trace_id"])
+    assert [s["name"] for s in spans] == ["op4", "child"]  # Ordem de início
+    assert ring.get("desconhecido") is None
+
+
+def test_spans_beyond_limit_are_counted_as_dropped():
+    tracer, ring = make_tracer(max_spans_per_trace=2)
+    with tracer.span("root") as root:
+        for _ in range(5):
+            with tracer.span("child"):
+                pass
+    assert len(ring.get(root.trace_id)) == 3
+    assert root.attributes["trace.dropped_spans"] == 3
+
+
+def test_otlp_file_exporter_writes_one_line_per_trace(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = OTLPFileExporter(str(path), service_name="milapp-test")
+    tracer = Tracer(exporters=[exporter])
+    for index in range(2):
+        with tracer.span("request", "server", route="/x", rows=index, ratio=0.5, cached=True) as root:
+            with tracer.span("db.query", "client"):
+                pass
+            if index:
+                root.record_exception(ValueError("ruim"))
+    exporter.shutdown()
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(lines) == 2
+    resource = lines[0]["resourceSpans"][0]
+    assert resource["resource"]["attributes"][0]["value"] == {"stringValue": "milapp-test"}
+    child, root = resource["scopeSpans"][0]["spans"]
+    assert child["parentSpanId"] == root["spanId"] and root["parentSpanId"] == ""
+    assert (root["kind"], child["kind"]) == (2, 3)
+    assert int(root["endTimeUnixNano"]) >= int(root["startTimeUnixNano"])
+    attributes = {a["key"]: a["value"] for a in root["attributes"]}
+    assert attributes["route"] == {"stringValue": "/x"}
+    assert attributes["rows"] == {"intValue": "0"}
+    assert attributes["ratio"] == {"doubleValue": 0.5}
+    assert attributes["cached"] == {"boolValue": True}
+    assert root["status"] == {"code": 1}
+    failed_root = lines[1]["resourceSpans"][0]["scopeSpans"][0]["spans"][-1]
+    assert failed_root["status"] == {"code": 2, "message": "ValueError: ruim"}
@@ -0,0 +1,86 @@
+"""
+Aquecimento do cache na subida (app/services/warmup_service.py, lifespan em app/main.py)
+
+O lifespan do app roda de verdade e /ready é chamado via ASGI; os serviços
+de background que dependem de Redis/Supabase são desligados e os dashboards
+são calculados por um executor falso sobre um cache com `fakeredis`. /ready
+só pode responder 200 com o dashboard executivo dos usuários mais ativos já
+no cache.
+"""
+
+import asyncio
+import os
+
+import fakeredis
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("supabase")
+pytest.importorskip("app.models.project")
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test.service.role")
+
+import httpx
+
+import app.main as main
+from app.services import analytics_service
+from app.services.cache_service import CacheService
+from app.services.dashboard_snapshots import DashboardSnapshotStore
+from app.services.metrics_registry import MetricsRegistry
+from app.services.warmup_service import CacheWarmer
+
+
+class SlowExecutor:
+    """Calcula cada widget com um atraso, para /ready ser consultado antes do fim"""
+
+    async def run(self, widgets, user_id, db=None):
+        await asyncio.sleep(0.2)
+        return {
+            "widgets": [{"id": spec.id, "type": spec.type, "title": spec.title, "data": user_id, "status": "ok"}
+                        for spec in widgets],
+            "partial": False
+        }
+
+
+async def noop(*args, **kwargs):
+    return None
+
+
+def test_executive_dashboard_is_cached_before_ready(monkeypatch):
+    registry = MetricsRegistry()
+    cache = CacheService(redis_client=fakeredis.FakeAsyncRedis(), registry=registry)
+    snapshots = DashboardSnapshotStore(cache=cache, executor=SlowExecutor(), registry=registry)
+    warmer = CacheWarmer(timeout=10, registry=registry)
+
+    async def most_active_users(db, limit):
+        return ["u1", "u2"]
+
+    monkeypatch.setattr(main, "cache_warmer", warmer)
+    monkeypatch.setattr(analytics_service, "dashboard_snapshots", snapshots)
+    monkeypatch.setattr(analytics_service.AnalyticsService, "_get_most_active_users", staticmethod(most_active_users))
+    monkeypatch.setattr(main.monitoring_service, "start_monitoring", noop)
+    monkeypatch.setattr(main.monitoring_service, "stop_monitoring", noop)
+    monkeypatch.setattr(main.analytics_rollup_job, "start", lambda: None)
+    monkeypatch.setattr(main.analytics_rollup_job, "stop", noop)
+
+    async def scenario():
+        statuses = []
+        async with main.lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                for _ in range(250):
+                    response = await client.get("/ready")
+                    statuses.append(response.status_code)
+                    if response.status_code == 200:
+                        break
+                    await asyncio.sleep(0.02)
+                warm = [await cache.get(snapshots._key("executive", user_id)) for user_id in ("u1", "u2")]
+        return statuses, response.json(), warm
+
+    statuses, ready, warm = asyncio.run(scenario())
+    assert statuses[0] == 503
+    assert statuses[-1] == 200
+    assert all(warm)
+    assert ready["sources"]["executive_dashboard"] == {"targets": 2, "warmed": 2, "failed": 0, "error": None}
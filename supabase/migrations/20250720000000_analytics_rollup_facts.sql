@@ -0,0 +1,221 @@
+-- =====================================================
+-- MILAPP MedSênior - Rollups diários/horários de analytics
+-- Tabelas fato mantidas incrementalmente a partir de analytics_events
+-- =====================================================
+
+-- =====================================================
+-- 1. TABELAS FATO
+-- =====================================================
+
+-- Dimensão ausente (evento sem usuário/projeto) vira o UUID zero,
+-- para que a chave primária cubra todas as linhas
+
+CREATE TABLE IF NOT EXISTS public.analytics_hourly_facts (
+    bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+    user_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    project_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    metric VARCHAR(100) NOT NULL,
+    value_sum NUMERIC NOT NULL DEFAULT 0,
+    value_count BIGINT NOT NULL DEFAULT 0,
+    value_min NUMERIC,
+    value_max NUMERIC,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (metric, user_id, project_id, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS public.analytics_daily_facts (
+    bucket DATE NOT NULL,
+    user_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    project_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    metric VARCHAR(100) NOT NULL,
+    value_sum NUMERIC NOT NULL DEFAULT 0,
+    value_count BIGINT NOT NULL DEFAULT 0,
+    value_min NUMERIC,
+    value_max NUMERIC,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (metric, user_id, project_id, bucket)
+);
+
+-- Consultas de tendência: usuário + métrica + intervalo de datas
+CREATE INDEX IF NOT EXISTS idx_analytics_hourly_facts_user ON public.analytics_hourly_facts(user_id, metric, bucket);
+CREATE INDEX IF NOT EXISTS idx_analytics_daily_facts_user ON public.analytics_daily_facts(user_id, metric, bucket);
+CREATE INDEX IF NOT EXISTS idx_analytics_daily_facts_project ON public.analytics_daily_facts(project_id, metric, bucket);
+
+-- Marca d'água: até onde analytics_events já foi agregado
+CREATE TABLE IF NOT EXISTS public.analytics_rollup_state (
+    source VARCHAR(50) PRIMARY KEY,
+    watermark TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT '-infinity',
+    events_processed BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+INSERT INTO public.analytics_rollup_state (source) VALUES ('analytics_events')
+ON CONFLICT (source) DO NOTHING;
+
+-- =====================================================
+-- 2. ATUALIZAÇÃO INCREMENTAL
+-- =====================================================
+
+-- Agrega os eventos novos (até NOW() - p_safety_lag, para dar tempo de
+-- transações em andamento gravarem) em no máximo p_batch_size eventos por
+-- chamada. Soma nas linhas existentes via ON CONFLICT, então cada execução
+-- custa proporcional ao número de eventos novos, não ao histórico.
+CREATE OR REPLACE FUNCTION public.refresh_analytics_rollups(
+    p_safety_lag INTERVAL DEFAULT INTERVAL '30 seconds',
+    p_batch_size INTEGER DEFAULT 50000
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_from TIMESTAMP WITH TIME ZONE;
+    v_to TIMESTAMP WITH TIME ZONE;
+    v_batch_end TIMESTAMP WITH TIME ZONE;
+    v_events BIGINT;
+    v_more BOOLEAN := false;
+BEGIN
+    -- Uma execução por vez, mesmo com vários workers chamando
+    PERFORM pg_advisory_xact_lock(hashtext('refresh_analytics_rollups'));
+
+    SELECT watermark INTO v_from
+    FROM public.analytics_rollup_state
+    WHERE source = 'analytics_events'
+    FOR UPDATE;
+
+    v_to := NOW() - p_safety_lag;
+
+    -- Limita o lote; empates no created_at de corte entram juntos
+    SELECT created_at INTO v_batch_end
+    FROM public.analytics_events
+    WHERE created_at > v_from AND created_at <= v_to
+    ORDER BY created_at
+    OFFSET p_batch_size - 1
+    LIMIT 1;
+
+    IF v_batch_end IS NOT NULL AND v_batch_end < v_to THEN
+        v_to := v_batch_end;
+        v_more := true;
+    END IF;
+
+    CREATE TEMP TABLE IF NOT EXISTS analytics_rollup_batch (
+        created_at TIMESTAMP WITH TIME ZONE,
+        user_id UUID,
+        project_id UUID,
+        metric VARCHAR(100),
+        value NUMERIC
+    ) ON COMMIT DROP;
+
+    INSERT INTO analytics_rollup_batch
+    SELECT
+        created_at,
+        COALESCE(user_id, '00000000-0000-0000-0000-000000000000'),
+        COALESCE(project_id, '00000000-0000-0000-0000-000000000000'),
+        event_type,
+        COALESCE(event_value, 1)
+    FROM public.analytics_events
+    WHERE created_at > v_from AND created_at <= v_to;
+
+    GET DIAGNOSTICS v_events = ROW_COUNT;
+
+    INSERT INTO public.analytics_hourly_facts AS f
+        (bucket, user_id, project_id, metric, value_sum, value_count, value_min, value_max)
+    SELECT date_trunc('hour', created_at), user_id, project_id, metric,
+           SUM(value), COUNT(*), MIN(value), MAX(value)
+    FROM analytics_rollup_batch
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (metric, user_id, project_id, bucket) DO UPDATE SET
+        value_sum = f.value_sum + EXCLUDED.value_sum,
+        value_count = f.value_count + EXCLUDED.value_count,
+        value_min = LEAST(f.value_min, EXCLUDED.value_min),
+        value_max = GREATEST(f.value_max, EXCLUDED.value_max),
+        updated_at = NOW();
+
+    INSERT INTO public.analytics_daily_facts AS f
+        (bucket, user_id, project_id, metric, value_sum, value_count, value_min, value_max)
+    SELECT (created_at AT TIME ZONE 'UTC')::DATE, user_id, project_id, metric,
+           SUM(value), COUNT(*), MIN(value), MAX(value)
+    FROM analytics_rollup_batch
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (metric, user_id, project_id, bucket) DO UPDATE SET
+        value_sum = f.value_sum + EXCLUDED.value_sum,
+        value_count = f.value_count + EXCLUDED.value_count,
+        value_min = LEAST(f.value_min, EXCLUDED.value_min),
+        value_max = GREATEST(f.value_max, EXCLUDED.value_max),
+        updated_at = NOW();
+
+    UPDATE public.analytics_rollup_state SET
+        watermark = GREATEST(watermark, v_to),
+        events_processed = events_processed + v_events,
+        updated_at = NOW()
+    WHERE source = 'analytics_events';
+
+    DROP TABLE analytics_rollup_batch;
+
+    RETURN jsonb_build_object(
+        'from', v_from,
+        'to', v_to,
+        'events', v_events,
+        'more', v_more
+    );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- =====================================================
+-- 3. MUDANÇAS DE PROJETO COMO EVENTOS
+-- =====================================================
+
+-- Criação, mudança de status, conclusão e atualização de ROI viram eventos,
+-- agregados pelo mesmo job. to_jsonb(NEW) evita depender do nome da coluna
+-- de ROI (roi_actual/actual_roi variam entre versões do schema).
+CREATE OR REPLACE FUNCTION public.track_project_analytics()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_new JSONB := to_jsonb(NEW);
+    v_old JSONB := CASE WHEN TG_OP = 'UPDATE' THEN to_jsonb(OLD) ELSE '{}'::JSONB END;
+    v_owner UUID := (v_new->>'created_by')::UUID;
+    v_roi NUMERIC := COALESCE(v_new->>'roi_actual', v_new->>'actual_roi')::NUMERIC;
+    v_old_roi NUMERIC := COALESCE(v_old->>'roi_actual', v_old->>'actual_roi')::NUMERIC;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO public.analytics_events (event_type, event_category, event_action, event_label, user_id, project_id, event_value)
+        VALUES ('project.created', 'project', 'create', v_new->>'status', v_owner, NEW.id, 1);
+    ELSIF (v_new->>'status') IS DISTINCT FROM (v_old->>'status') THEN
+        INSERT INTO public.analytics_events (event_type, event_category, event_action, event_label, user_id, project_id, event_value, event_data)
+        VALUES ('project.status_changed', 'project', 'status', v_new->>'status', v_owner, NEW.id, 1,
+                jsonb_build_object('from', v_old->>'status', 'to', v_new->>'status'));
+        IF (v_new->>'status') IN ('deployed', 'maintenance', 'producao') THEN
+            INSERT INTO public.analytics_events (event_type, event_category, event_action, event_label, user_id, project_id, event_value)
+            VALUES ('project.completed', 'project', 'complete', v_new->>'status', v_owner, NEW.id, 1);
+        END IF;
+    END IF;
+
+    IF v_roi IS NOT NULL AND v_roi IS DISTINCT FROM v_old_roi THEN
+        INSERT INTO public.analytics_events (event_type, event_category, event_action, user_id, project_id, event_value)
+        VALUES ('project.roi_updated', 'project', 'roi', v_owner, NEW.id, v_roi);
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DROP TRIGGER IF EXISTS trg_track_project_analytics ON public.projects;
+CREATE TRIGGER trg_track_project_analytics
+    AFTER INSERT OR UPDATE ON public.projects
+    FOR EACH ROW EXECUTE FUNCTION public.track_project_analytics();
+
+-- Carga inicial: projetos existentes entram como criados na data original
+INSERT INTO public.analytics_events (event_type, event_category, event_action, event_label, user_id, project_id, event_value, created_at)
+SELECT 'project.created', 'project', 'create', p.status::TEXT, p.created_by, p.id, 1, p.created_at
+FROM public.projects p
+WHERE NOT EXISTS (
+    SELECT 1 FROM public.analytics_events e
+    WHERE e.project_id = p.id AND e.event_type = 'project.created'
+);
+
+-- RLS: cada usuário lê só os próprios fatos
+ALTER TABLE public.analytics_hourly_facts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.analytics_daily_facts ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own hourly facts" ON public.analytics_hourly_facts
+    FOR SELECT USING (user_id = auth.uid());
+
+CREATE POLICY "Users can view own daily facts" ON public.analytics_daily_facts
+    FOR SELECT USING (user_id = auth.uid());
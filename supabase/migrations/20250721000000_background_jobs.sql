@@ -0,0 +1,58 @@
+-- =====================================================
+-- MILAPP MedSênior - Fila de jobs em background
+-- Workers reivindicam jobs com FOR UPDATE SKIP LOCKED (app/services/job_queue.py)
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS public.background_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    queue VARCHAR(50) NOT NULL DEFAULT 'default',
+    task VARCHAR(100) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    priority INTEGER NOT NULL DEFAULT 100,  -- menor sai primeiro
+    status VARCHAR(20) NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),  -- próxima tentativa (atraso de retentativa)
+    locked_by VARCHAR(200),
+    locked_until TIMESTAMP WITH TIME ZONE,  -- prazo de visibilidade do job em execução
+    result JSONB,
+    error TEXT,
+    created_by UUID REFERENCES auth.users(id) ON DELETE SET NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Reivindicação: só jobs na fila, na ordem prioridade/run_at
+CREATE INDEX IF NOT EXISTS idx_background_jobs_claim
+    ON public.background_jobs(queue, priority, run_at) WHERE status = 'queued';
+
+-- Busca de jobs com visibilidade expirada
+CREATE INDEX IF NOT EXISTS idx_background_jobs_running
+    ON public.background_jobs(locked_until) WHERE status = 'running';
+
+CREATE INDEX IF NOT EXISTS idx_background_jobs_created_by
+    ON public.background_jobs(created_by, created_at DESC);
+
+-- Jobs mudam de status várias vezes: deixa espaço na página para updates HOT
+ALTER TABLE public.background_jobs SET (fillfactor = 70);
+
+-- Limpeza: jobs finalizados há mais de p_retention
+CREATE OR REPLACE FUNCTION public.purge_background_jobs(p_retention INTERVAL DEFAULT INTERVAL '7 days')
+RETURNS INTEGER AS $$
+DECLARE
+    v_deleted INTEGER;
+BEGIN
+    DELETE FROM public.background_jobs
+    WHERE status IN ('succeeded', 'failed') AND finished_at < NOW() - p_retention;
+    GET DIAGNOSTICS v_deleted = ROW_COUNT;
+    RETURN v_deleted;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- RLS: o usuário acompanha os próprios jobs; workers usam a conexão direta (service role)
+ALTER TABLE public.background_jobs ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own background jobs" ON public.background_jobs
+    FOR SELECT USING (created_by = auth.uid());
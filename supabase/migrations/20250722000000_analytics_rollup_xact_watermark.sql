@@ -0,0 +1,156 @@
+-- =====================================================
+-- MILAPP MedSênior - Marca d'água do rollup por transação
+-- A marca d'água em created_at (NOW() = início da transação) perdia eventos
+-- de transações que confirmavam mais de p_safety_lag depois de começar
+-- (inclusive os inseridos por trg_track_project_analytics). O rollup passa
+-- a avançar pelo id da transação que gravou o evento.
+-- =====================================================
+
+-- =====================================================
+-- 1. ID DA TRANSAÇÃO EM CADA EVENTO
+-- =====================================================
+
+-- Sem default no ADD COLUMN: as linhas existentes ficam NULL sem reescrever
+-- a tabela. As que o rollup por created_at já agregou permanecem NULL (fora
+-- do novo filtro); as pendentes recebem o id desta migração e entram na
+-- primeira execução da nova função.
+ALTER TABLE public.analytics_events ADD COLUMN IF NOT EXISTS rollup_xact_id BIGINT;
+
+ALTER TABLE public.analytics_rollup_state
+    ADD COLUMN IF NOT EXISTS xact_watermark BIGINT;
+
+UPDATE public.analytics_events e SET rollup_xact_id = pg_current_xact_id()::TEXT::BIGINT
+FROM public.analytics_rollup_state s
+WHERE s.source = 'analytics_events'
+  AND e.rollup_xact_id IS NULL
+  AND e.created_at > s.watermark;
+
+-- Transações abaixo do xmin do snapshot já terminaram; as demais (inclusive
+-- esta) ainda serão vistas pelo rollup
+UPDATE public.analytics_rollup_state
+SET xact_watermark = pg_snapshot_xmin(pg_current_snapshot())::TEXT::BIGINT
+WHERE source = 'analytics_events' AND xact_watermark IS NULL;
+
+ALTER TABLE public.analytics_events
+    ALTER COLUMN rollup_xact_id SET DEFAULT pg_current_xact_id()::TEXT::BIGINT;
+
+CREATE INDEX IF NOT EXISTS idx_analytics_events_rollup_xact
+    ON public.analytics_events(rollup_xact_id) WHERE rollup_xact_id IS NOT NULL;
+
+-- =====================================================
+-- 2. ATUALIZAÇÃO INCREMENTAL POR TRANSAÇÃO
+-- =====================================================
+
+-- Agrega os eventos das transações com id em [xact_watermark, xmin), onde
+-- xmin é o menor id ainda em andamento no snapshot atual: todas essas
+-- transações já confirmaram (ou abortaram), então nenhum evento chega
+-- depois com id abaixo da nova marca. Uma transação longa só atrasa o
+-- rollup, não perde eventos. p_safety_lag deixou de ser necessário e fica
+-- só pela compatibilidade da assinatura.
+--
+-- 'to' continua um timestamp (o created_at do evento pendente mais antigo,
+-- ou NOW() sem pendências), usado para o atraso do rollup em /metrics.
+CREATE OR REPLACE FUNCTION public.refresh_analytics_rollups(
+    p_safety_lag INTERVAL DEFAULT INTERVAL '30 seconds',
+    p_batch_size INTEGER DEFAULT 50000
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_from BIGINT;
+    v_to BIGINT;
+    v_batch_end BIGINT;
+    v_events BIGINT;
+    v_more BOOLEAN := false;
+    v_pending_since TIMESTAMP WITH TIME ZONE;
+BEGIN
+    -- Uma execução por vez, mesmo com vários workers chamando
+    PERFORM pg_advisory_xact_lock(hashtext('refresh_analytics_rollups'));
+
+    SELECT xact_watermark INTO v_from
+    FROM public.analytics_rollup_state
+    WHERE source = 'analytics_events'
+    FOR UPDATE;
+
+    v_to := pg_snapshot_xmin(pg_current_snapshot())::TEXT::BIGINT;
+
+    -- Limita o lote; os eventos da transação de corte entram juntos
+    SELECT rollup_xact_id INTO v_batch_end
+    FROM public.analytics_events
+    WHERE rollup_xact_id >= v_from AND rollup_xact_id < v_to
+    ORDER BY rollup_xact_id
+    OFFSET p_batch_size - 1
+    LIMIT 1;
+
+    IF v_batch_end IS NOT NULL AND v_batch_end + 1 < v_to THEN
+        v_to := v_batch_end + 1;
+        v_more := true;
+    END IF;
+
+    CREATE TEMP TABLE IF NOT EXISTS analytics_rollup_batch (
+        created_at TIMESTAMP WITH TIME ZONE,
+        user_id UUID,
+        project_id UUID,
+        metric VARCHAR(100),
+        value NUMERIC
+    ) ON COMMIT DROP;
+
+    INSERT INTO analytics_rollup_batch
+    SELECT
+        created_at,
+        COALESCE(user_id, '00000000-0000-0000-0000-000000000000'),
+        COALESCE(project_id, '00000000-0000-0000-0000-000000000000'),
+        event_type,
+        COALESCE(event_value, 1)
+    FROM public.analytics_events
+    WHERE rollup_xact_id >= v_from AND rollup_xact_id < v_to;
+
+    GET DIAGNOSTICS v_events = ROW_COUNT;
+
+    INSERT INTO public.analytics_hourly_facts AS f
+        (bucket, user_id, project_id, metric, value_sum, value_count, value_min, value_max)
+    SELECT date_trunc('hour', created_at), user_id, project_id, metric,
+           SUM(value), COUNT(*), MIN(value), MAX(value)
+    FROM analytics_rollup_batch
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (metric, user_id, project_id, bucket) DO UPDATE SET
+        value_sum = f.value_sum + EXCLUDED.value_sum,
+        value_count = f.value_count + EXCLUDED.value_count,
+        value_min = LEAST(f.value_min, EXCLUDED.value_min),
+        value_max = GREATEST(f.value_max, EXCLUDED.value_max),
+        updated_at = NOW();
+
+    INSERT INTO public.analytics_daily_facts AS f
+        (bucket, user_id, project_id, metric, value_sum, value_count, value_min, value_max)
+    SELECT (created_at AT TIME ZONE 'UTC')::DATE, user_id, project_id, metric,
+           SUM(value), COUNT(*), MIN(value), MAX(value)
+    FROM analytics_rollup_batch
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (metric, user_id, project_id, bucket) DO UPDATE SET
+        value_sum = f.value_sum + EXCLUDED.value_sum,
+        value_count = f.value_count + EXCLUDED.value_count,
+        value_min = LEAST(f.value_min, EXCLUDED.value_min),
+        value_max = GREATEST(f.value_max, EXCLUDED.value_max),
+        updated_at = NOW();
+
+    SELECT MIN(created_at) INTO v_pending_since
+    FROM public.analytics_events
+    WHERE rollup_xact_id >= v_to;
+
+    UPDATE public.analytics_rollup_state SET
+        xact_watermark = GREATEST(xact_watermark, v_to),
+        watermark = GREATEST(watermark, COALESCE(v_pending_since, NOW())),
+        events_processed = events_processed + v_events,
+        updated_at = NOW()
+    WHERE source = 'analytics_events';
+
+    DROP TABLE analytics_rollup_batch;
+
+    RETURN jsonb_build_object(
+        'from', v_from,
+        'to', COALESCE(v_pending_since, NOW()),
+        'xact_watermark', v_to,
+        'events', v_events,
+        'more', v_more
+    );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;